@@ -0,0 +1,254 @@
+from datetime import timedelta
+from sqlalchemy import select, func, case, cast, and_, or_, Float, literal
+
+from models import (db, User, Attendance, ArchivedAttendance, AttendanceDailySummary, AttendanceWeeklySummary,
+                    AttendanceMonthlySummary)
+from stats import percentage
+from summaries import STATUSES, attendance_records, period_start, week_start, month_start
+from caching import cached_result, cohort_scope
+
+# Everything here is computed with grouped and windowed SQL over the whole
+# cohort at once, mostly from the rollup tables; Python only shapes the
+# result rows. The rollups count archived days too, and so do the queries
+# over the records themselves, which read them through attendance_records().
+
+PERIODS = ('week', 'month')
+
+# Per-student rollup table and period start function of each period
+STUDENT_ROLLUPS = {
+    'week': (AttendanceWeeklySummary, week_start),
+    'month': (AttendanceMonthlySummary, month_start),
+}
+
+
+def default_range(today, days):
+    # The ``days`` days ending today
+    return today - timedelta(days=days - 1), today
+
+
+def _counts(present, absent, late):
+    total = present + absent + late
+    return {
+        'present': present,
+        'absent': absent,
+        'late': late,
+        'total': total,
+        'rate': percentage(present, total),
+        'late_rate': percentage(late, total),
+    }
+
+
+def _rate_row(period, present, absent, late):
+    return {'period': str(period), **_counts(present, absent, late)}
+
+
+def _total(model):
+    return model.present + model.absent + model.late
+
+
+def _weeks_since(column, origin, dialect_name):
+    # Weeks from ``origin`` to a date column, as a float
+    if dialect_name == 'sqlite':
+        return (func.julianday(column) - func.julianday(origin)) / 7.0
+    return cast(column - origin, Float) / 7.0
+
+
+def cohort_rates(period, date_from, date_to, cohort_id=None):
+    """Attendance rate of all students together per week or month, from the daily rollup.
+
+    With ``cohort_id``, of that cohort's live and archived records only,
+    counted over the (cohort_id, date, status) indexes as the rollup covers
+    every cohort.
+    """
+    dialect_name = db.session.get_bind().dialect.name
+    if cohort_id is None:
+        start = period_start(AttendanceDailySummary.date, period, dialect_name).label('period')
+        query = (select(start, *[func.sum(getattr(AttendanceDailySummary, status)) for status in STATUSES])
+                 .where(AttendanceDailySummary.date.between(date_from, date_to)))
+    else:
+        records = attendance_records(
+            lambda model: (model.cohort_id == cohort_id, model.date.between(date_from, date_to)),
+            'date', 'status')
+        start = period_start(records.c.date, period, dialect_name).label('period')
+        query = select(start, *[func.count(case((records.c.status == status, 1))) for status in STATUSES])
+    rows = db.session.execute(query.group_by(start).order_by(start))
+    return [_rate_row(*row) for row in rows]
+
+
+def student_rates(period, date_from, date_to, student_ids=None):
+    """Attendance rate per student per week or month, from the per-student rollups.
+
+    Covers the whole weeks or months overlapping the range. Returns
+    ``{student_id: [period rows, oldest first]}`` for every student with
+    attendance in the range, or only for ``student_ids``.
+    """
+    model, start_of = STUDENT_ROLLUPS[period]
+    start = getattr(model, period)
+    query = (
+        select(model.student_id, start, model.present, model.absent, model.late)
+        .where(start.between(start_of(date_from), start_of(date_to)), _total(model) > 0)
+        .order_by(model.student_id, start)
+    )
+    if student_ids is not None:
+        query = query.where(model.student_id.in_(student_ids))
+    rates = {}
+    for student_id, *counts in db.session.execute(query):
+        rates.setdefault(student_id, []).append(_rate_row(*counts))
+    return rates
+
+
+def student_summaries(date_from, date_to, cohort_id=None):
+    """Totals, rates and late-arrival trend of every active student, from
+    the weekly rollup, or from the records of ``cohort_id``.
+
+    Covers the whole weeks overlapping the range. ``late_trend`` is the
+    least-squares slope of the weekly late rate, in percentage points per
+    week: positive means the student is arriving late more and more often.
+    It is None with fewer than two weeks of data.
+    """
+    dialect_name = db.session.get_bind().dialect.name
+    first_week = week_start(date_from)
+    if cohort_id is None:
+        rollup = AttendanceWeeklySummary
+        weekly = (
+            select(rollup.student_id, rollup.present, rollup.absent, rollup.late,
+                   _total(rollup).label('total'),
+                   # The trend's x axis, counted from the first week of the range
+                   _weeks_since(rollup.week, first_week, dialect_name).label('x'))
+            .where(rollup.week.between(first_week, week_start(date_to)), _total(rollup) > 0)
+        )
+    else:
+        # The rollup does not know cohorts; like cohort_rates and
+        # absence_streaks, count the records marked in the cohort, so a
+        # student who moved on is counted the same way throughout the report
+        last_day = week_start(date_to) + timedelta(days=6)
+        records = attendance_records(
+            lambda model: (model.cohort_id == cohort_id, model.date.between(first_week, last_day)),
+            'student_id', 'date', 'status')
+        week = period_start(records.c.date, 'week', dialect_name)
+        weekly = (
+            select(records.c.student_id,
+                   *[func.count(case((records.c.status == status, 1))).label(status) for status in STATUSES],
+                   func.count().label('total'),
+                   _weeks_since(week, first_week, dialect_name).label('x'))
+            .group_by(records.c.student_id, week)
+        )
+    weekly = weekly.cte('weekly')
+    x = weekly.c.x
+    y = literal(100.0) * weekly.c.late / weekly.c.total
+    n = cast(func.count(), Float)
+    denominator = n * func.sum(x * x) - func.sum(x) * func.sum(x)
+    slope = case(
+        (denominator != 0, (n * func.sum(x * y) - func.sum(x) * func.sum(y)) / denominator),
+        else_=None,
+    )
+    rows = db.session.execute(
+        select(weekly.c.student_id, User.full_name, User.username,
+               *[func.sum(weekly.c[status]) for status in STATUSES],
+               cast(slope, Float))
+        .join(User, User.id == weekly.c.student_id)
+        .where(User.role == 'student', User.is_active == True)
+        .group_by(weekly.c.student_id, User.full_name, User.username)
+    )
+    return [{
+        'student_id': student_id,
+        'full_name': full_name,
+        'username': username,
+        **_counts(present, absent, late),
+        'late_trend': round(late_trend, 2) if late_trend is not None else None,
+    } for student_id, full_name, username, present, absent, late, late_trend in rows]
+
+
+def absence_streaks(date_from, date_to, cohort_id=None):
+    """Longest and current run of consecutive absences per student.
+
+    Runs are counted in school days, i.e. days on which attendance was
+    marked for anyone, so weekends and holidays do not break a run but a
+    school day without a record for the student does. A run is current
+    when the student has no record after it.
+
+    Solved as gaps and islands over the absences alone (read from an
+    index): the school day number minus the absence's row number per
+    student is the same for every absence of a run. Archived records
+    count, so a range reaching back into a closed term is complete.
+    """
+    daily = AttendanceDailySummary
+    school_days = (
+        select(daily.date, func.row_number().over(order_by=daily.date).label('n'))
+        .where(daily.date.between(date_from, date_to), _total(daily) > 0)
+        .cte('school_days')
+    )
+
+    def absent(model):
+        criteria = (model.status == 'absent', model.date.between(date_from, date_to))
+        return criteria if cohort_id is None else (*criteria, model.cohort_id == cohort_id)
+
+    records = attendance_records(absent, 'student_id', 'date')
+    absences = (
+        select(records.c.student_id, records.c.date,
+               (school_days.c.n - func.row_number().over(partition_by=records.c.student_id,
+                                                         order_by=records.c.date)).label('island'))
+        .join(school_days, school_days.c.date == records.c.date)
+        .cte('absences')
+    )
+    runs = (
+        select(absences.c.student_id, func.count().label('length'), func.max(absences.c.date).label('ended'))
+        .group_by(absences.c.student_id, absences.c.island)
+        .cte('runs')
+    )
+    latest = (
+        select(runs.c.student_id, func.max(runs.c.length).label('longest'), func.max(runs.c.ended).label('ended'))
+        .group_by(runs.c.student_id)
+        .cte('latest')
+    )
+    # One correlated check per table, each a seek on its (student_id, date) index
+    marked_later = or_(*[
+        select(model.date).where(
+            model.student_id == latest.c.student_id,
+            model.date > latest.c.ended,
+            model.date <= date_to,
+        ).exists()
+        for model in (Attendance, ArchivedAttendance)
+    ])
+    rows = db.session.execute(
+        select(latest.c.student_id, latest.c.longest, case((marked_later, 0), else_=runs.c.length))
+        .join(runs, and_(runs.c.student_id == latest.c.student_id, runs.c.ended == latest.c.ended))
+    )
+    return {student_id: {'longest': longest, 'current': current} for student_id, longest, current in rows}
+
+
+def _build_report(date_from, date_to, threshold, cohort_id):
+    streaks = absence_streaks(date_from, date_to, cohort_id)
+    students = student_summaries(date_from, date_to, cohort_id)
+    for student in students:
+        streak = streaks.get(student['student_id'], {'longest': 0, 'current': 0})
+        student['longest_absence_streak'] = streak['longest']
+        student['current_absence_streak'] = streak['current']
+        student['at_risk'] = student['rate'] < threshold
+    students.sort(key=lambda student: (student['rate'], student['full_name']))
+    return {
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'threshold': threshold,
+        'cohort_id': cohort_id,
+        'weekly': cohort_rates('week', date_from, date_to, cohort_id),
+        'monthly': cohort_rates('month', date_from, date_to, cohort_id),
+        'students': students,
+        'at_risk': [student['student_id'] for student in students if student['at_risk']],
+    }
+
+
+def attendance_report(date_from, date_to, threshold, cohort_id=None):
+    """Cohort attendance report, cached until attendance or students change.
+
+    The range is widened to whole weeks (Monday to Sunday). Holds the
+    cohort's weekly and monthly rates and, per student (lowest rate
+    first), totals, rates, late trend, absence streaks and whether the
+    rate is below ``threshold`` percent. The cohort is every student, or
+    the students and records of ``cohort_id``.
+    """
+    date_from, date_to = week_start(date_from), week_start(date_to) + timedelta(days=6)
+    scopes = ('attendance', 'students') if cohort_id is None else (cohort_scope(cohort_id),)
+    return cached_result('attendance_report', date_from, date_to, threshold, cohort_id,
+                         scopes=scopes,
+                         compute=lambda: _build_report(date_from, date_to, threshold, cohort_id))
@@ -0,0 +1,970 @@
+import json
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import wraps
+from flask import Blueprint, Response, jsonify, request, current_app, abort, stream_with_context, url_for
+from flask_login import current_user, login_user, logout_user
+from sqlalchemy import select, insert
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import HTTPException
+
+from models import db, User, Task, Attendance, Job, TaskDeadline, ArchivedAttendance, ArchivedTask
+from pagination import keyset_paginate
+from bulk import active_student_ids, bulk_mark_attendance
+from caching import mark_changed, student_scope
+from cohorts import stamp_cohorts, cohort_options
+from changes import record_changes, latest_cursor, oldest_cursor, changes_since
+from database import read_only
+from stats import check_in_counts
+from analytics import PERIODS, attendance_report, cohort_rates, student_rates, default_range
+from summaries import STATUSES
+from exports import EXPORT_FORMATS
+from jobs import enqueue
+from deadlines import DEADLINE_KINDS, OPEN_STATUSES
+from search import search_students, search_tasks
+from archive import cohort_terms, term_archives, term_closed
+from attendance_calendar import STATUS_CODES, NO_RECORD, attendance_calendars, calendar_counts
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+USER_FIELDS = ('id', 'username', 'email', 'full_name', 'role', 'is_active', 'cohort_id', 'created_at', 'updated_at')
+TASK_FIELDS = ('id', 'title', 'description', 'due_date', 'status', 'priority', 'student_id', 'cohort_id',
+               'created_by', 'created_at', 'updated_at')
+ATTENDANCE_FIELDS = ('id', 'date', 'student_id', 'cohort_id', 'status', 'remarks', 'marked_by', 'marked_at',
+                     'updated_at')
+COHORT_FIELDS = ('id', 'name', 'term')
+ARCHIVED_TASK_FIELDS = TASK_FIELDS + ('term',)
+ARCHIVED_ATTENDANCE_FIELDS = ATTENDANCE_FIELDS + ('term',)
+JOB_FIELDS = ('id', 'kind', 'status', 'progress', 'message', 'attempts', 'max_attempts',
+              'created_at', 'started_at', 'finished_at')
+
+TASK_STATUSES = ('pending', 'in_progress', 'completed')
+PRIORITIES = ('low', 'medium', 'high')
+
+
+@api.errorhandler(HTTPException)
+def handle_http_error(error):
+    return jsonify({'error': error.description}), error.code
+
+
+@api.before_request
+def refuse_cross_site_writes():
+    # The API authenticates with the session cookie alone, which the browser
+    # also sends with a form another site posts here. Such a request can
+    # carry neither a JSON content type nor a custom header without a CORS
+    # preflight, which this app never answers, so writes need one of them.
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    if not request.is_json and not request.headers.get('X-Requested-With'):
+        abort(403, 'Send writes as JSON (Content-Type: application/json) or with an X-Requested-With header.')
+    return None
+
+
+def api_login_required(f):
+    # Like login_required, but answers 401 JSON instead of redirecting to the login page
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            abort(401, 'Authentication required.')
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def api_admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            abort(401, 'Authentication required.')
+        if not current_user.is_admin():
+            abort(403, 'Admin privileges required.')
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def serialize(row, fields):
+    return {field: _json_value(getattr(row, field)) for field in fields}
+
+
+def selected_fields(allowed):
+    """Fields named in ``?fields=a,b`` (sparse fieldset), or all of ``allowed``."""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(allowed)
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}.")
+    # The id is always returned so rows can be matched up
+    return ['id'] + [field for field in dict.fromkeys(fields) if field != 'id']
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = _parse_date(value)
+    if parsed is None:
+        abort(400, f'{name} must be given as YYYY-MM-DD.')
+    return parsed
+
+
+def _updated_since():
+    # Both are inclusive. If-Modified-Since has one second resolution, so
+    # rows of that second are sent again; clients match rows up by id
+    value = request.args.get('updated_since')
+    if value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            abort(400, 'updated_since must be an ISO 8601 datetime.')
+    if request.if_modified_since:
+        return request.if_modified_since.replace(tzinfo=None)
+    return None
+
+
+def paginated_response(model, query, fields):
+    """Return one page of ``query`` as JSON, ordered by (updated_at, id).
+
+    Supports ``?cursor=``, ``?limit=``, ``?updated_since=`` and the
+    ``If-Modified-Since`` header, which gets a 304 when nothing changed.
+    Only the selected columns are loaded.
+    """
+    since = _updated_since()
+    if since is not None:
+        query = query.filter(model.updated_at >= since)
+        if request.if_modified_since and not request.args.get('cursor'):
+            if not db.session.query(query.exists()).scalar():
+                return '', 304
+
+    per_page = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['API_MAX_PAGE_SIZE']))
+    columns = {field: getattr(model, field) for field in (*fields, 'updated_at')}
+    page = keyset_paginate(query.with_entities(*columns.values()), model.updated_at, model.id,
+                           cursor=request.args.get('cursor'), per_page=per_page, descending=False)
+
+    response = jsonify({
+        'data': [serialize(row, fields) for row in page.items],
+        'next_cursor': page.next_cursor,
+    })
+    if page.items and not page.has_next:
+        # What the client should send as If-Modified-Since on its next sync.
+        # Rows written in the last API_SYNC_WINDOW seconds may share the last
+        # row's second or still be committing, so those seconds are sent again.
+        settled = datetime.utcnow() - timedelta(seconds=current_app.config['API_SYNC_WINDOW'])
+        response.last_modified = min(page.items[-1].updated_at, settled)
+    return response
+
+
+def batch_items(key):
+    payload = request.get_json(silent=True)
+    items = payload.get(key) if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        abort(400, f'Request body must be a JSON object with a non-empty "{key}" list of objects.')
+    limit = current_app.config['API_MAX_BATCH']
+    if len(items) > limit:
+        abort(400, f'At most {limit} {key} per request.')
+    return payload, items
+
+
+def validation_errors(errors, status=422):
+    # errors holds one dict per batch item; only the failing ones are reported
+    return jsonify({'errors': [{'index': index, 'errors': item_errors}
+                               for index, item_errors in enumerate(errors) if item_errors]}), status
+
+
+def batch_ids(items):
+    """The ``id`` of each batch item, or a 400 response naming the items whose id is not an integer."""
+    ids = [item.get('id') for item in items]
+    errors = [{} if isinstance(item_id, int) and not isinstance(item_id, bool) else {'id': 'id must be an integer.'}
+              for item_id in ids]
+    if any(errors):
+        return None, validation_errors(errors, 400)
+    return ids, None
+
+
+def _validate_task(item, errors, partial=False):
+    # Mirrors TaskForm; with partial=True only the given fields are checked
+    values = {}
+    if not partial or 'title' in item:
+        title = str(item.get('title') or '').strip()
+        if not 5 <= len(title) <= 200:
+            errors['title'] = 'Title must be between 5 and 200 characters.'
+        values['title'] = title
+    if 'description' in item:
+        description = str(item.get('description') or '') or None
+        if description and len(description) > 500:
+            errors['description'] = 'Description cannot be longer than 500 characters.'
+        values['description'] = description
+    if not partial or 'due_date' in item:
+        due_date = _parse_date(item.get('due_date'))
+        if due_date is None:
+            errors['due_date'] = 'Due date must be given as YYYY-MM-DD.'
+        values['due_date'] = due_date
+    if not partial or 'priority' in item:
+        values['priority'] = item.get('priority') or 'medium'
+        if values['priority'] not in PRIORITIES:
+            errors['priority'] = 'Priority must be low, medium or high.'
+    if not partial or 'status' in item:
+        values['status'] = item.get('status') or 'pending'
+        if values['status'] not in TASK_STATUSES:
+            errors['status'] = 'Status must be pending, in_progress or completed.'
+    if not partial or 'student_id' in item:
+        values['student_id'] = item.get('student_id')
+    return values
+
+
+# Session
+
+@api.route('/login', methods=['POST'])
+def login():
+    payload = request.get_json(silent=True) or {}
+    password = str(payload.get('password') or '')
+    user = User.query.filter_by(username=str(payload.get('username') or '')).first()
+    if not user or not user.check_password(password) or not user.is_active:
+        abort(401, 'Invalid username or password.')
+    if user.rehash_password(password):
+        db.session.commit()
+    login_user(user, remember=True)
+    return jsonify({'data': serialize(user, USER_FIELDS)})
+
+
+@api.route('/logout', methods=['POST'])
+def logout():
+    logout_user()
+    return '', 204
+
+
+@api.route('/me')
+@api_login_required
+def me():
+    return jsonify({'data': serialize(current_user, selected_fields(USER_FIELDS))})
+
+
+# Users
+
+@api.route('/users')
+@api_admin_required
+@read_only
+def list_users():
+    query = db.session.query(User)
+    if request.args.get('role'):
+        query = query.filter(User.role == request.args['role'])
+    if request.args.get('is_active') in ('true', 'false'):
+        query = query.filter(User.is_active == (request.args['is_active'] == 'true'))
+    if request.args.get('cohort_id', type=int):
+        query = query.filter(User.cohort_id == request.args.get('cohort_id', type=int))
+    return paginated_response(User, query, selected_fields(USER_FIELDS))
+
+
+@api.route('/users/<int:user_id>')
+@api_login_required
+@read_only
+def get_user(user_id):
+    if user_id != current_user.id and not current_user.is_admin():
+        abort(403, 'You can only read your own account.')
+    user = db.session.get(User, user_id) or abort(404, 'User not found.')
+    return jsonify({'data': serialize(user, selected_fields(USER_FIELDS))})
+
+
+# Cohorts
+
+@api.route('/cohorts')
+@api_admin_required
+@read_only
+def list_cohorts():
+    """Every cohort by name; their ids filter the users, tasks, attendance and analytics lists."""
+    return jsonify({'data': [dict(zip(COHORT_FIELDS, row)) for row in cohort_options()]})
+
+
+# Tasks
+
+@api.route('/tasks')
+@api_login_required
+@read_only
+def list_tasks():
+    query = db.session.query(Task)
+    if not current_user.is_admin():
+        query = query.filter(Task.student_id == current_user.id)
+    elif request.args.get('student_id', type=int):
+        query = query.filter(Task.student_id == request.args.get('student_id', type=int))
+    if current_user.is_admin() and request.args.get('cohort_id', type=int):
+        query = query.filter(Task.cohort_id == request.args.get('cohort_id', type=int))
+    if request.args.get('status'):
+        query = query.filter(Task.status == request.args['status'])
+    if request.args.get('priority'):
+        query = query.filter(Task.priority == request.args['priority'])
+    return paginated_response(Task, query, selected_fields(TASK_FIELDS))
+
+
+@api.route('/tasks', methods=['POST'])
+@api_admin_required
+def create_tasks():
+    """Create up to API_MAX_BATCH tasks in one INSERT; all or nothing."""
+    _, items = batch_items('tasks')
+    rows, errors = [], []
+    for item in items:
+        item_errors = {}
+        rows.append(_validate_task(item, item_errors))
+        errors.append(item_errors)
+
+    valid_students = active_student_ids([row['student_id'] for row in rows if isinstance(row['student_id'], int)])
+    for row, item_errors in zip(rows, errors):
+        if row['student_id'] not in valid_students:
+            item_errors['student_id'] = 'Not an active student.'
+    if any(errors):
+        return validation_errors(errors)
+
+    now = datetime.utcnow()
+    for row in rows:
+        row.update(description=row.get('description'), created_by=current_user.id, created_at=now, updated_at=now)
+    cohort_scopes = stamp_cohorts(rows)
+    ids = list(db.session.scalars(insert(Task).returning(Task.id, sort_by_parameter_order=True), rows))
+    # Core insert, so the change log and caches are told explicitly
+    record_changes(db.session.connection(), 'task', 'insert', zip(ids, [row['student_id'] for row in rows]))
+    mark_changed(db.session, 'tasks', *cohort_scopes, *{student_scope(row['student_id']) for row in rows})
+    db.session.commit()
+    return jsonify({'created': ids}), 201
+
+
+@api.route('/tasks', methods=['PATCH'])
+@api_login_required
+def update_tasks():
+    """Update many tasks in one transaction; all or nothing.
+
+    Admins may change any field; students may only change the status of
+    their own tasks.
+    """
+    _, items = batch_items('tasks')
+    ids, error = batch_ids(items)
+    if error:
+        return error
+    tasks = {task.id: task for task in Task.query.filter(Task.id.in_(ids))}
+
+    updates, errors = [], []
+    for item in items:
+        item_errors = {}
+        task = tasks.get(item.get('id'))
+        if task is None:
+            item_errors['id'] = 'Task not found.'
+        elif not current_user.is_admin() and (task.student_id != current_user.id or set(item) - {'id', 'status'}):
+            item_errors['id'] = 'Students can only change the status of their own tasks.'
+        values = _validate_task(item, item_errors, partial=True)
+        updates.append((task, values))
+        errors.append(item_errors)
+
+    new_students = {values['student_id'] for _, values in updates if 'student_id' in values}
+    valid_students = active_student_ids([s for s in new_students if isinstance(s, int)])
+    for (_, values), item_errors in zip(updates, errors):
+        if 'student_id' in values and values['student_id'] not in valid_students:
+            item_errors['student_id'] = 'Not an active student.'
+    if any(errors):
+        return validation_errors(errors)
+
+    for task, values in updates:
+        for field, value in values.items():
+            setattr(task, field, value)
+    db.session.commit()
+    return jsonify({'updated': [task.id for task, _ in updates]})
+
+
+# Attendance
+
+@api.route('/attendance')
+@api_login_required
+@read_only
+def list_attendance():
+    query = db.session.query(Attendance)
+    if not current_user.is_admin():
+        query = query.filter(Attendance.student_id == current_user.id)
+    elif request.args.get('student_id', type=int):
+        query = query.filter(Attendance.student_id == request.args.get('student_id', type=int))
+    if current_user.is_admin() and request.args.get('cohort_id', type=int):
+        query = query.filter(Attendance.cohort_id == request.args.get('cohort_id', type=int))
+    date_from, date_to = _date_arg('from'), _date_arg('to')
+    if date_from:
+        query = query.filter(Attendance.date >= date_from)
+    if date_to:
+        query = query.filter(Attendance.date <= date_to)
+    if request.args.get('status'):
+        query = query.filter(Attendance.status == request.args['status'])
+    return paginated_response(Attendance, query, selected_fields(ATTENDANCE_FIELDS))
+
+
+@api.route('/attendance', methods=['POST'])
+@api_admin_required
+def mark_attendance():
+    """Mark attendance for many students, possibly on several dates.
+
+    Records are ``{"student_id", "date" (default today), "status", "remarks"}``;
+    with ``"overwrite": true`` existing records are updated. Each date is
+    written in one transaction by ``bulk_mark_attendance``.
+    """
+    payload, items = batch_items('records')
+    by_date = defaultdict(list)
+    report = {'inserted': [], 'updated': [], 'skipped': []}
+    for item in items:
+        day = _parse_date(item['date']) if item.get('date') else date.today()
+        if day is None:
+            report['skipped'].append({'student_id': item.get('student_id'), 'date': item.get('date'),
+                                      'reason': 'date must be given as YYYY-MM-DD'})
+            continue
+        by_date[day].append(item)
+
+    for day, records in sorted(by_date.items()):
+        result = bulk_mark_attendance(day, records, current_user.id, overwrite=bool(payload.get('overwrite')))
+        report['inserted'].extend({'student_id': student_id, 'date': day.isoformat()} for student_id in result['inserted'])
+        report['updated'].extend({'student_id': student_id, 'date': day.isoformat()} for student_id in result['updated'])
+        report['skipped'].extend({**skipped, 'date': day.isoformat()} for skipped in result['skipped'])
+
+    return jsonify(report), 201 if report['inserted'] else 200
+
+
+@api.route('/attendance', methods=['PATCH'])
+@api_admin_required
+def update_attendance():
+    """Change the status or remarks of many attendance records; all or nothing."""
+    _, items = batch_items('records')
+    ids, error = batch_ids(items)
+    if error:
+        return error
+    records = {record.id: record for record in Attendance.query.filter(Attendance.id.in_(ids))}
+
+    errors = []
+    for item in items:
+        item_errors = {}
+        if item.get('id') not in records:
+            item_errors['id'] = 'Attendance record not found.'
+        if 'status' in item and item['status'] not in STATUSES:
+            item_errors['status'] = 'Status must be present, absent or late.'
+        if item.get('remarks') and len(str(item['remarks'])) > 200:
+            item_errors['remarks'] = 'Remarks cannot be longer than 200 characters.'
+        errors.append(item_errors)
+    if any(errors):
+        return validation_errors(errors)
+
+    # ORM updates, so the attendance rollups and caches follow via the flush hooks
+    for item in items:
+        record = records[item['id']]
+        if 'status' in item:
+            record.status = item['status']
+        if 'remarks' in item:
+            record.remarks = str(item['remarks'] or '').strip() or None
+        record.marked_by = current_user.id
+    db.session.commit()
+    return jsonify({'updated': [item['id'] for item in items]})
+
+
+# Check-in
+
+def _check_in_status(now):
+    late_after = current_app.config['CHECK_IN_LATE_AFTER']
+    return 'late' if late_after and now.time() > late_after else 'present'
+
+
+def _todays_record(student_id, day):
+    # One lookup through the unique (student_id, date) index
+    return db.session.execute(
+        select(Attendance.date, Attendance.status, Attendance.marked_at)
+        .where(Attendance.student_id == student_id, Attendance.date == day)
+    ).first()
+
+
+def _check_in_response(record, created):
+    data = serialize(record, ('date', 'status', 'marked_at'))
+    data['created'] = created
+    return jsonify(data), 201 if created else 200
+
+
+@api.route('/check-in', methods=['POST'])
+@api_login_required
+def check_in():
+    """Check the current student in for today: present, or late after CHECK_IN_LATE_AFTER.
+
+    Meant for the rush at the start of a session: a repeated check-in
+    answers 200 with the existing record after a single lookup, so clients
+    may retry freely, and a new one is one short transaction. When the
+    database stays locked past its busy timeout the answer is 503 with
+    Retry-After instead of an error page.
+    """
+    if current_user.is_admin():
+        abort(403, 'Only students check in.')
+    now = datetime.now()
+    record = _todays_record(current_user.id, now.date())
+    if record is not None:
+        return _check_in_response(record, False)
+    closes = current_app.config['CHECK_IN_CLOSES']
+    if closes and now.time() > closes:
+        abort(409, 'Check-in is closed for today.')
+    try:
+        # A second request of the same student that got there first leaves
+        # this one skipped, and its record is returned below
+        report = bulk_mark_attendance(now.date(), [{'student_id': current_user.id, 'status': _check_in_status(now)}],
+                                      current_user.id)
+    except OperationalError:
+        db.session.rollback()
+        response = jsonify({'error': 'The server is busy. Please try again.'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    record = _todays_record(current_user.id, now.date())
+    if record is None:
+        abort(403, 'Your account is not active.')
+    return _check_in_response(record, bool(report['inserted']))
+
+
+@api.route('/check-in')
+@api_login_required
+@read_only
+def check_in_summary():
+    """Students: their record of today, or null before they check in.
+    Admins: today's active students and attendance counts so far, of
+    everyone or of ``?cohort_id=``."""
+    today = date.today()
+    if not current_user.is_admin():
+        record = _todays_record(current_user.id, today)
+        return jsonify({'date': today.isoformat(),
+                        'record': serialize(record, ('status', 'marked_at')) if record else None})
+    counts = check_in_counts(today, request.args.get('cohort_id', type=int))
+    return jsonify({
+        'date': today.isoformat(),
+        'students': counts['total_students'],
+        'checked_in': counts['total_days'],
+        **{status: counts[f'{status}_days'] for status in STATUSES},
+    })
+
+
+@api.route('/attendance/calendar')
+@api_login_required
+@read_only
+def attendance_calendar():
+    """Attendance history of one or more students as one character per day.
+
+    The range is ``?year=`` or ``?from=`` / ``?to=``, this year by default.
+    Admins name up to CALENDAR_MAX_STUDENTS students with repeated
+    ``?student_id=``, e.g. to compare them; students get their own.
+    """
+    config = current_app.config
+    year = request.args.get('year', type=int)
+    if year is not None:
+        if not 1 <= year <= 9999:
+            abort(400, 'year is out of range.')
+        date_from, date_to = date(year, 1, 1), date(year, 12, 31)
+    else:
+        this_year = date.today().year
+        date_from = _date_arg('from') or date(this_year, 1, 1)
+        date_to = _date_arg('to') or date(this_year, 12, 31)
+    if date_to < date_from:
+        abort(400, 'to must not be before from.')
+    if (date_to - date_from).days >= config['CALENDAR_MAX_DAYS']:
+        abort(400, f"At most {config['CALENDAR_MAX_DAYS']} days per request.")
+
+    if current_user.is_admin():
+        student_ids = request.args.getlist('student_id', type=int)
+        if not student_ids:
+            abort(400, 'Give at least one student_id.')
+        if len(set(student_ids)) > config['CALENDAR_MAX_STUDENTS']:
+            abort(400, f"At most {config['CALENDAR_MAX_STUDENTS']} students per request.")
+    else:
+        student_ids = [current_user.id]
+
+    calendars = attendance_calendars(student_ids, date_from, date_to)
+    return jsonify({
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'codes': {**{code: status for status, code in STATUS_CODES.items()}, NO_RECORD: None},
+        'data': [{'student_id': student_id, 'days': calendar, **calendar_counts(calendar)}
+                 for student_id, calendar in calendars.items()],
+    })
+
+
+# Attendance analytics
+
+def _report_range():
+    default_from, default_to = default_range(date.today(), current_app.config['ANALYTICS_DEFAULT_DAYS'])
+    return _date_arg('from') or default_from, _date_arg('to') or default_to
+
+
+@api.route('/analytics/attendance')
+@api_admin_required
+@read_only
+def attendance_analytics():
+    """Cohort attendance report: weekly and monthly rates plus per-student
+    rates, late trends, absence streaks and the at-risk list. Covers every
+    student, or those of ``?cohort_id=``."""
+    date_from, date_to = _report_range()
+    threshold = request.args.get('threshold', current_app.config['ATTENDANCE_RISK_THRESHOLD'], type=float)
+    return jsonify(attendance_report(date_from, date_to, threshold, request.args.get('cohort_id', type=int)))
+
+
+@api.route('/analytics/attendance/rates')
+@api_login_required
+@read_only
+def attendance_rates():
+    """Attendance rate per ``?period=week|month`` for one student, or for
+    the whole cohort (all students or ``?cohort_id=``) when an admin gives
+    no ``student_id``."""
+    period = request.args.get('period', 'week')
+    if period not in PERIODS:
+        abort(400, 'period must be week or month.')
+    date_from, date_to = _report_range()
+    student_id = request.args.get('student_id', type=int) if current_user.is_admin() else current_user.id
+    if student_id is None:
+        rates = cohort_rates(period, date_from, date_to, request.args.get('cohort_id', type=int))
+    else:
+        rates = student_rates(period, date_from, date_to, [student_id]).get(student_id, [])
+    return jsonify({'period': period, 'student_id': student_id, 'data': rates})
+
+
+
+# Deadlines
+
+@api.route('/deadlines')
+@api_login_required
+@read_only
+def list_deadlines():
+    """Open overdue and due-soon tasks from the last deadline scan, soonest due first.
+
+    Students get their own; admins get everyone's or ``?student_id=``'s.
+    ``?kind=overdue|due_soon`` narrows the list.
+    """
+    query = (db.session.query(TaskDeadline.id, TaskDeadline.task_id, TaskDeadline.student_id,
+                              TaskDeadline.kind, TaskDeadline.due_date, TaskDeadline.notified_at,
+                              Task.title, Task.status, Task.priority)
+             .join(Task, Task.id == TaskDeadline.task_id)
+             .filter(Task.status.in_(OPEN_STATUSES)))
+    kind = request.args.get('kind')
+    if kind is not None:
+        if kind not in DEADLINE_KINDS:
+            abort(400, 'kind must be overdue or due_soon.')
+        query = query.filter(TaskDeadline.kind == kind)
+    student_id = request.args.get('student_id', type=int) if current_user.is_admin() else current_user.id
+    if student_id is not None:
+        query = query.filter(TaskDeadline.student_id == student_id)
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    page = keyset_paginate(query, TaskDeadline.due_date, TaskDeadline.id, request.args.get('cursor'),
+                           max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE'])), descending=False)
+    fields = ('task_id', 'student_id', 'kind', 'due_date', 'title', 'status', 'priority', 'notified_at')
+    return jsonify({'data': [serialize(row, fields) for row in page.items], 'next_cursor': page.next_cursor})
+
+
+# Archive of closed terms
+
+@api.route('/archive')
+@api_admin_required
+@read_only
+def list_archived_terms():
+    """Every cohort term with its last day, whether it has ended, and the totals
+    archived of it so far (null until it is archived)."""
+    archives = term_archives()
+    return jsonify({'data': [
+        {'term': term, 'cohorts': cohorts, 'ends_on': _json_value(ends_on), 'closed': term_closed(ends_on),
+         'archived': {key: _json_value(value) for key, value in archives[term].items()} if term in archives else None}
+        for term, cohorts, ends_on in cohort_terms()
+    ]})
+
+
+@api.route('/archive', methods=['POST'])
+@api_admin_required
+def archive_term():
+    """Queue the archiving of a closed term, ``{"term": ...}``; answers 202 with the job to poll."""
+    payload = request.get_json(silent=True) or {}
+    term = payload.get('term')
+    if term not in {term for term, _, ends_on in cohort_terms() if term_closed(ends_on)}:
+        return jsonify({'errors': {'term': 'term must be the term of a cohort that has ended.'}}), 422
+    job = enqueue('archive_term', {'term': term}, current_user.id)
+    response = jsonify(serialize_job(job))
+    response.headers['Location'] = url_for('api.get_job', job_id=job.id)
+    return response, 202
+
+
+def _archive_query(model):
+    # Like the live lists: students see their own rows, admins may narrow
+    # to a student or cohort; ?term= narrows to one term
+    query = db.session.query(model)
+    if not current_user.is_admin():
+        query = query.filter(model.student_id == current_user.id)
+    elif request.args.get('student_id', type=int):
+        query = query.filter(model.student_id == request.args.get('student_id', type=int))
+    if current_user.is_admin() and request.args.get('cohort_id', type=int):
+        query = query.filter(model.cohort_id == request.args.get('cohort_id', type=int))
+    if request.args.get('term'):
+        query = query.filter(model.term == request.args['term'])
+    if request.args.get('status'):
+        query = query.filter(model.status == request.args['status'])
+    return query
+
+
+@api.route('/archive/tasks')
+@api_login_required
+@read_only
+def list_archived_tasks():
+    return paginated_response(ArchivedTask, _archive_query(ArchivedTask), selected_fields(ARCHIVED_TASK_FIELDS))
+
+
+@api.route('/archive/attendance')
+@api_login_required
+@read_only
+def list_archived_attendance():
+    query = _archive_query(ArchivedAttendance)
+    date_from, date_to = _date_arg('from'), _date_arg('to')
+    if date_from:
+        query = query.filter(ArchivedAttendance.date >= date_from)
+    if date_to:
+        query = query.filter(ArchivedAttendance.date <= date_to)
+    return paginated_response(ArchivedAttendance, query, selected_fields(ARCHIVED_ATTENDANCE_FIELDS))
+
+
+# Search
+
+def _search_limit():
+    limit = request.args.get('limit', current_app.config['SEARCH_LIMIT'], type=int)
+    return max(1, min(limit, current_app.config['SEARCH_MAX_LIMIT']))
+
+
+@api.route('/search/students')
+@api_admin_required
+@read_only
+def autocomplete_students():
+    """Students whose name, username or email has words starting with those of ``?q=``.
+
+    Returns at most ``?limit=`` students by name, for pickers; ``?active=true``
+    leaves out deactivated ones and ``?cohort_id=`` those of other cohorts.
+    Without ``q`` the first students by name.
+    """
+    rows = search_students(request.args.get('q', ''), _search_limit(),
+                           active_only=request.args.get('active') == 'true',
+                           cohort_id=request.args.get('cohort_id', type=int))
+    return jsonify({'data': [serialize(row, ('id', 'full_name', 'username', 'email', 'is_active'))
+                             for row in rows]})
+
+
+@api.route('/search/tasks')
+@api_login_required
+@read_only
+def autocomplete_tasks():
+    """Tasks whose title or description has words starting with those of ``?q=``, latest due first.
+
+    Students search their own tasks; admins everyone's or ``?student_id=``'s.
+    """
+    student_id = request.args.get('student_id', type=int) if current_user.is_admin() else current_user.id
+    rows = search_tasks(request.args.get('q', ''), _search_limit(), student_id)
+    return jsonify({'data': [serialize(row, ('id', 'title', 'status', 'priority', 'due_date', 'student_id'))
+                             for row in rows]})
+
+
+# Change feed
+
+CHANGE_ENTITIES = {'task': (Task, TASK_FIELDS), 'attendance': (Attendance, ATTENDANCE_FIELDS)}
+
+
+def _change_cursor(value, name):
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        abort(400, f'{name} must be a change cursor returned by this API.')
+    oldest = oldest_cursor()
+    if oldest is not None and cursor < oldest - 1:
+        abort(410, 'Changes after this cursor have been pruned; resync and continue from the current cursor.')
+    return cursor
+
+
+def _feed_filters():
+    # Admins may follow everything; students only their own rows
+    student_id = None if current_user.is_admin() else current_user.id
+    entity = request.args.get('entity')
+    if entity is not None and entity not in CHANGE_ENTITIES:
+        abort(400, 'entity must be task or attendance.')
+    return student_id, entity
+
+
+def serialize_changes(entries, student_id=None):
+    """Change log entries with the current state of each row under ``data``.
+
+    ``data`` is null for deleted rows and for rows that no longer belong
+    to ``student_id``. Rows are loaded with one query per entity.
+    """
+    current = {}
+    for entity, (model, fields) in CHANGE_ENTITIES.items():
+        ids = {entry.entity_id for entry in entries if entry.entity == entity and entry.action != 'delete'}
+        if ids:
+            rows = db.session.execute(select(*[getattr(model, field) for field in fields])
+                                      .where(model.id.in_(ids)))
+            current.update({(entity, row.id): row for row in rows})
+
+    changes = []
+    for entry in entries:
+        row = current.get((entry.entity, entry.entity_id)) if entry.action != 'delete' else None
+        if row is not None and student_id is not None and row.student_id != student_id:
+            row = None
+        changes.append({
+            'cursor': entry.id,
+            'entity': entry.entity,
+            'id': entry.entity_id,
+            'student_id': entry.student_id,
+            'action': entry.action,
+            'changed_at': entry.changed_at.isoformat(),
+            'data': serialize(row, CHANGE_ENTITIES[entry.entity][1]) if row is not None else None,
+        })
+    return changes
+
+
+@api.route('/changes')
+@api_login_required
+@read_only
+def list_changes():
+    """Task and attendance changes after ``?since=<cursor>``, oldest first.
+
+    Without ``since`` only the current cursor is returned, to start
+    following the feed after a full sync. ``?entity=`` limits the feed to
+    tasks or attendance. A 410 means the cursor is older than the kept
+    history and the client has to resync.
+    """
+    student_id, entity = _feed_filters()
+    if request.args.get('since') is None:
+        return jsonify({'changes': [], 'cursor': latest_cursor(student_id), 'has_more': False})
+
+    cursor = _change_cursor(request.args['since'], 'since')
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+    entries = changes_since(cursor, limit + 1, student_id, entity)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return jsonify({
+        'changes': serialize_changes(entries, student_id),
+        'cursor': entries[-1].id if entries else cursor,
+        'has_more': has_more,
+    })
+
+
+@api.route('/changes/stream')
+@api_login_required
+def stream_changes():
+    """Server-Sent Events stream of the change feed.
+
+    Each event is one change with its cursor as the event id, so a
+    reconnecting EventSource resumes from ``Last-Event-ID``. The stream
+    starts at ``?since=`` or at the current cursor, sends a comment every
+    CHANGE_FEED_HEARTBEAT seconds to keep proxies from closing it and ends
+    after CHANGE_FEED_STREAM_TIMEOUT seconds; the browser then reconnects.
+    Every open stream holds a server worker, so this needs threaded or
+    async workers in production.
+    """
+    student_id, entity = _feed_filters()
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    cursor = _change_cursor(since, 'since') if since is not None else latest_cursor(student_id)
+    config = current_app.config
+    poll_interval, heartbeat = config['CHANGE_FEED_POLL_INTERVAL'], config['CHANGE_FEED_HEARTBEAT']
+    batch = config['API_PAGE_SIZE']
+    # Release the connection; the stream checks out one per poll
+    db.session.close()
+
+    def events(cursor):
+        deadline = time.monotonic() + config['CHANGE_FEED_STREAM_TIMEOUT']
+        last_sent = time.monotonic()
+        yield f'retry: {int(poll_interval * 1000)}\n\n'
+        while time.monotonic() < deadline:
+            entries = changes_since(cursor, batch, student_id, entity)
+            changes = serialize_changes(entries, student_id)
+            db.session.close()
+            for change in changes:
+                yield f"id: {change['cursor']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+            if changes:
+                cursor, last_sent = changes[-1]['cursor'], time.monotonic()
+                if len(changes) == batch:
+                    continue
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            time.sleep(poll_interval)
+
+    response = Response(stream_with_context(events(cursor)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# Background jobs
+
+def serialize_job(job):
+    data = serialize(job, JOB_FIELDS)
+    data['result'] = json.loads(job.result) if job.result else None
+    # Only the last line of the traceback: the exception and its message
+    data['error'] = job.error.strip().splitlines()[-1] if job.error else None
+    if data['result'] and 'file' in data['result']:
+        data['result'].pop('file')
+        data['download_url'] = url_for('main.download_job_result', job_id=job.id)
+    return data
+
+
+@api.route('/jobs')
+@api_admin_required
+def list_jobs():
+    """The current admin's most recent background jobs, newest first."""
+    query = select(Job).where(Job.created_by == current_user.id)
+    status = request.args.get('status')
+    if status:
+        query = query.where(Job.status == status)
+    jobs = db.session.scalars(query.order_by(Job.id.desc()).limit(current_app.config['JOBS_PER_PAGE']))
+    return jsonify({'data': [serialize_job(job) for job in jobs]})
+
+
+@api.route('/jobs/<int:job_id>')
+@api_admin_required
+def get_job(job_id):
+    """Status and progress of a job, with its result once it has succeeded."""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        abort(404, 'Job not found.')
+    return jsonify(serialize_job(job))
+
+
+@api.route('/exports', methods=['POST'])
+@api_admin_required
+def create_export():
+    """Queue an attendance or task export; answers 202 with the job to poll.
+
+    Takes ``{"kind": ..., "format": ..., "filters": {...}}`` with the
+    filters of the export command (dates as YYYY-MM-DD).
+    """
+    payload = request.get_json(silent=True) or {}
+    kind, fmt = payload.get('kind'), payload.get('format', 'csv')
+    filters = payload.get('filters') or {}
+    errors = {}
+    if kind not in ('attendance', 'tasks'):
+        errors['kind'] = 'kind must be attendance or tasks.'
+    if fmt not in EXPORT_FORMATS:
+        errors['format'] = f"format must be one of {', '.join(EXPORT_FORMATS)}."
+    allowed = ({'date_from', 'date_to', 'student_id', 'cohort_id', 'status', 'term'}
+               | ({'priority', 'q'} if kind == 'tasks' else set()))
+    if not isinstance(filters, dict) or set(filters) - allowed:
+        errors['filters'] = f"filters may only contain {', '.join(sorted(allowed))}."
+    else:
+        for key in ('date_from', 'date_to'):
+            if filters.get(key) and _parse_date(filters[key]) is None:
+                errors[key] = 'Dates must be given as YYYY-MM-DD.'
+        for key in ('student_id', 'cohort_id'):
+            if filters.get(key) is not None and not isinstance(filters[key], int):
+                errors[key] = f'{key} must be an integer.'
+        for key in ('q', 'term'):
+            if filters.get(key) is not None and not isinstance(filters[key], str):
+                errors[key] = f'{key} must be a string.'
+    if errors:
+        return jsonify({'errors': errors}), 422
+    job = enqueue('export', {'kind': kind, 'format': fmt, 'filters': filters}, current_user.id)
+    response = jsonify(serialize_job(job))
+    response.headers['Location'] = url_for('api.get_job', job_id=job.id)
+    return response, 202
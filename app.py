@@ -1,110 +1,409 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
+from flask import Flask, Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context, abort, current_app, send_file
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash
 from datetime import datetime, date, timedelta
 from sqlalchemy import func, and_
+from sqlalchemy.orm import joinedload
+import click
+import json
 import os
 
 from config import Config
-from models import db, User, Task, Attendance
-from forms import LoginForm, StudentRegistrationForm, TaskForm, TaskUpdateForm, AttendanceForm, ChangePasswordForm, EditProfileForm, ForgotPasswordForm
+from models import db, Cohort, User, Task, Attendance, AttendanceDailySummary, Job, TaskDeadline
+from forms import LoginForm, StudentRegistrationForm, TaskForm, BulkTaskForm, TaskUpdateForm, AttendanceForm, BulkAttendanceForm, ImportForm, ChangePasswordForm, EditProfileForm, ForgotPasswordForm, CohortForm, AssignCohortForm, ArchiveTermForm, CloseTermForm
+from pagination import keyset_paginate
+from stats import admin_dashboard_stats, student_dashboard_stats, attendance_status_counts
+from summaries import rebuild_attendance_summaries
+from bulk import bulk_mark_attendance, bulk_assign_task, all_active_student_ids
+from exports import export_stream, export_filename, EXPORT_FORMATS
+from imports import csv_rows, run_import, IMPORT_KINDS, DEFAULT_BATCH_SIZE
+from jobs import enqueue, new_job_file, job_file_path, start_in_process_workers, start_workers_on_first_request, run_worker, prune_jobs
+from passwords import hash_password
+from instrumentation import init_instrumentation
+from database import init_database, read_only
+from identity import init_identity_cache, load_user as load_cached_user
+from caching import init_page_cache, cached_page, student_scope, cohort_scope
+from cohorts import current_cohort_id, select_cohort, cohort_options, cohort_names, cohort_counts, assign_students
+from archive import archive_term, close_term, term_closed, cohort_terms, term_archives
+from changes import latest_cursor, prune_changes
+from analytics import attendance_report, default_range
+from deadlines import DEADLINE_KINDS, OPEN_STATUSES, scan_deadlines, send_deadline_reminders, deadline_counts, student_deadlines
+from attendance_calendar import attendance_calendars, calendar_days
+from search import apply_search, student_names, rebuild_search_index, fts_enabled, SEARCH_INDEXES
+from api import api
+from datagen import generate_data
+from benchmark import run_benchmark, capture_statements, write_results, compare_results, SCENARIOS
+from loadtest import load_test_users, run_load_test, compare_load_results
+from migrations import upgrade, pending_migrations, MIGRATIONS
+from query_plans import check_query_plans
 
-def create_app():
+# Extensions and the blueprint are bound to an app only in create_app(), which
+# does no database work; the schema and admin account come from init-db / seed
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+login_manager.login_message = 'Please log in to access this page.'
+login_manager.login_message_category = 'info'
+
+# cli_group=None puts the blueprint's commands at the top level (flask init-db)
+main = Blueprint('main', __name__, cli_group=None)
+
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
     
     # Initialize extensions
     db.init_app(app)
-    
-    # Initialize Flask-Login
-    login_manager = LoginManager()
+    init_database(app, db)
     login_manager.init_app(app)
-    login_manager.login_view = 'auth.login'
-    login_manager.login_message = 'Please log in to access this page.'
-    login_manager.login_message_category = 'info'
+    init_identity_cache(app)
+    init_page_cache(app)
+    init_instrumentation(app)
+    start_workers_on_first_request(app)
     
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    return app
+
+@login_manager.user_loader
+def load_user(user_id):
+    return load_cached_user(int(user_id))
+
+@main.cli.command('init-db')
+def init_db_command():
+    """Create the database tables and apply pending migrations."""
+    db.create_all()
+    upgrade()
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-        
-        # Create default admin user if not exists
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
-            admin = User(
-                username='admin',
-                email='admin@example.com',
-                full_name='System Administrator',
-                role='admin'
-            )
-            admin.set_password('admin123')
-            db.session.add(admin)
-            db.session.commit()
-            print("Default admin user created: username='admin', password='admin123'")
+    # Backfill the attendance rollups for databases created before they existed
+    if AttendanceDailySummary.query.first() is None and Attendance.query.first() is not None:
+        rebuild_attendance_summaries()
+        print('Attendance summaries rebuilt.')
+    print('Database initialized.')
+
+@main.cli.command('seed')
+@click.option('--username', default='admin', help='Admin username.')
+@click.option('--password', default='admin123', help='Admin password.')
+@click.option('--email', default='admin@example.com', help='Admin email address.')
+def seed_command(username, password, email):
+    """Create the admin account if it does not exist yet."""
+    if User.query.filter_by(username=username).first():
+        print(f"User '{username}' already exists.")
+        return
+    admin = User(
+        username=username,
+        email=email,
+        full_name='System Administrator',
+        role='admin'
+    )
+    admin.set_password(password)
+    db.session.add(admin)
+    db.session.commit()
+    print(f"Admin user created: username='{username}'")
+
+@main.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    """Rebuild the attendance rollup tables from raw attendance records."""
+    rebuild_attendance_summaries()
+    print('Attendance summaries rebuilt.')
+
+@main.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Re-index every student and task in the full-text search tables."""
+    if not fts_enabled():
+        print('Search uses LIKE on this database; there is no index to rebuild.')
+        return
+    with db.engine.begin() as connection:
+        for name, _ in SEARCH_INDEXES.values():
+            rebuild_search_index(connection, name)
+    print('Search index rebuilt.')
+
+@main.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    if not upgrade():
+        print('Database schema is up to date.')
+
+@main.cli.command('db-status')
+def db_status_command():
+    """List schema migrations and whether they have been applied."""
+    pending = {entry[0] for entry in pending_migrations()}
+    for version, description, _ in MIGRATIONS:
+        print(f"{version:>4}  {'pending' if version in pending else 'applied':<8} {description}")
+
+@main.cli.command('prune-changes')
+@click.option('--days', type=int, default=None, help='Days of change history to keep (default CHANGE_FEED_RETENTION_DAYS).')
+def prune_changes_command(days):
+    """Delete change feed entries older than the retention period."""
+    days = current_app.config['CHANGE_FEED_RETENTION_DAYS'] if days is None else days
+    deleted = prune_changes(datetime.utcnow() - timedelta(days=days))
+    print(f'Deleted {deleted} change feed entries older than {days} days.')
+
+@main.cli.command('worker')
+@click.option('--concurrency', type=click.IntRange(min=1), default=2, help='Jobs run at the same time.')
+@click.option('--poll-interval', type=float, default=None, help='Seconds between checks for new jobs (default JOB_POLL_INTERVAL).')
+def worker_command(concurrency, poll_interval):
+    """Run queued background jobs until stopped with Ctrl+C or SIGTERM."""
+    print(f'Working the job queue with {concurrency} threads.')
+    run_worker(current_app._get_current_object(), concurrency, poll_interval)
+    print('Worker stopped.')
+
+@main.cli.command('prune-jobs')
+@click.option('--days', type=int, default=None, help='Days to keep finished jobs and their files (default JOB_RETENTION_DAYS).')
+def prune_jobs_command(days):
+    """Delete finished background jobs and their files after the retention period."""
+    days = current_app.config['JOB_RETENTION_DAYS'] if days is None else days
+    deleted = prune_jobs(datetime.utcnow() - timedelta(days=days))
+    print(f'Deleted {deleted} jobs finished more than {days} days ago.')
+
+@main.cli.command('scan-deadlines')
+@click.option('--days', type=click.IntRange(min=0), default=None, help='Days ahead that count as due soon (default DEADLINE_DUE_SOON_DAYS).')
+@click.option('--remind/--no-remind', default=True, help='Mail the students their new overdue and due-soon tasks.')
+def scan_deadlines_command(days, remind):
+    """Refresh the overdue and due-soon task list, e.g. from cron."""
+    days = current_app.config['DEADLINE_DUE_SOON_DAYS'] if days is None else days
+    result = scan_deadlines(date.today(), days)
+    print(f"{result['overdue']} overdue and {result['due_soon']} due-soon tasks "
+          f"({result['added']} new, {result['updated']} changed, {result['removed']} cleared).")
+    if remind:
+        sent = send_deadline_reminders()
+        print(f"Sent {sent['mails']} reminder mails about {sent['tasks']} tasks.")
+
+@main.cli.command('export')
+@click.argument('kind', type=click.Choice(['attendance', 'tasks']))
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', help='Output format.')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), help='First date to include.')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), help='Last date to include.')
+@click.option('--student', 'student_id', type=int, help='Only export this student id.')
+@click.option('--cohort', 'cohort_id', type=int, help='Only export records of this cohort id.')
+@click.option('--term', help='Export the archived records of this term instead.')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='File to write (default: stdout).')
+def export_command(kind, fmt, date_from, date_to, student_id, cohort_id, term, output):
+    """Stream attendance or task records as CSV or JSONL."""
+    chunks = export_stream(kind, fmt,
+                           date_from=date_from.date() if date_from else None,
+                           date_to=date_to.date() if date_to else None,
+                           student_id=student_id,
+                           cohort_id=cohort_id,
+                           term=term)
+    for chunk in chunks:
+        output.write(chunk)
+
+@main.cli.command('close-term')
+@click.argument('term')
+@click.option('--on', 'ends_on', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='Last day of the term, YYYY-MM-DD.')
+def close_term_command(term, ends_on):
+    """Set the last day of a term's cohorts, so it can be archived after that day."""
+    try:
+        close_term(term, ends_on.date())
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    print(f'{term} ends on {ends_on.date().isoformat()}.')
+
+@main.cli.command('archive-term')
+@click.argument('term')
+@click.option('--batch-size', type=click.IntRange(min=1), default=None, help='Rows moved per transaction (default ARCHIVE_BATCH_SIZE).')
+def archive_term_command(term, batch_size):
+    """Move a closed term's attendance and completed tasks to the archive tables."""
+    try:
+        moved = archive_term(term, batch_size)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    print(f"Archived {moved['attendance']} attendance records and {moved['tasks']} tasks of {term}.")
+
+@main.cli.command('import-csv')
+@click.argument('kind', type=click.Choice(IMPORT_KINDS))
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--batch-size', type=click.IntRange(min=1), default=DEFAULT_BATCH_SIZE, help='Rows per INSERT/commit.')
+@click.option('--default-password', help='Password for student rows without one.')
+@click.option('--as-user', 'username', default='admin', help='Admin recorded as creator/marker of imported rows.')
+def import_csv_command(kind, csv_file, batch_size, default_password, username):
+    """Import students, tasks or historical attendance from a CSV file."""
+    admin = User.query.filter_by(username=username, role='admin').first()
+    if admin is None:
+        raise click.ClickException(f'No admin user named {username!r}.')
     
-    return app
+    report = run_import(kind, csv_rows(csv_file), admin.id, batch_size, default_password).to_dict()
+    for error in report['errors']:
+        print(f"line {error['line']}: {' '.join(error['errors'])}")
+    print(f"Imported {report['imported']} {kind}, {len(report['errors'])} rows rejected.")
+
+@main.cli.command('generate-data')
+@click.option('--students', type=click.IntRange(min=1), default=1000, help='Number of students to create.')
+@click.option('--days', type=click.IntRange(min=1), default=180, help='Days of attendance history.')
+@click.option('--tasks', 'tasks_per_student', type=click.IntRange(min=0), default=20, help='Tasks per student.')
+@click.option('--seed', type=int, default=42, help='Random seed, for reproducible data.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=5000, help='Rows per INSERT.')
+@click.option('--cohorts', type=click.IntRange(min=0), default=0, help='Cohorts to spread the students over.')
+def generate_data_command(students, days, tasks_per_student, seed, batch_size, cohorts):
+    """Fill the database with synthetic students, tasks and attendance."""
+    generate_data(students, days, tasks_per_student, seed, batch_size, cohorts=cohorts)
 
-app = create_app()
+@main.cli.command('benchmark')
+@click.option('--iterations', type=click.IntRange(min=1), default=50, help='Timed requests per scenario.')
+@click.option('--warmup', type=click.IntRange(min=0), default=5, help='Untimed requests per scenario.')
+@click.option('--only', multiple=True, type=click.Choice([scenario[0] for scenario in SCENARIOS]), help='Run only these scenarios.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write results as JSON to this file.')
+@click.option('--compare', type=click.File('r'), help='Earlier results JSON to compare against.')
+def benchmark_command(iterations, warmup, only, output, compare):
+    """Time every route through the test client and report latency, queries and memory."""
+    report = run_benchmark(current_app._get_current_object(), iterations, warmup, only)
+    if output:
+        write_results(report, output)
+        print(f'Results written to {output}')
+    if compare:
+        print()
+        for scenario, metric, before, after in compare_results(json.load(compare), report):
+            change = f'{(after - before) / before * 100:+.1f}%' if before else 'n/a'
+            print(f'{scenario:<24} {metric:<20} {before:>10} -> {after:>10}  ({change})')
+
+@main.cli.command('load-test')
+@click.option('--url', default='http://127.0.0.1:8000', show_default=True, help='Server to load, e.g. gunicorn or `python main.py` (port 5000).')
+@click.option('--users', type=click.IntRange(min=1), default=200, help='Generated students that log in and check in.')
+@click.option('--concurrency', type=click.IntRange(min=1), default=50, help='Requests in flight at a time.')
+@click.option('--reset', is_flag=True, help="Delete today's records of the generated students first.")
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write results as JSON to this file.')
+@click.option('--compare', type=click.File('r'), help='Earlier results JSON to compare against.')
+def load_test_command(url, users, concurrency, reset, output, compare):
+    """Log generated students in and check them in concurrently against a running server."""
+    usernames = load_test_users(users, reset)
+    if not usernames:
+        raise click.ClickException('No generated student left to check in today; '
+                                   'run generate-data, or pass --reset.')
+    print(f'{len(usernames)} students, {concurrency} at a time, against {url}')
+    report = run_load_test(url, usernames, concurrency)
+    if output:
+        write_results(report, output)
+        print(f'Results written to {output}')
+    if compare:
+        print()
+        for phase, metric, before, after in compare_load_results(json.load(compare), report):
+            change = f'{(after - before) / before * 100:+.1f}%' if before else 'n/a'
+            print(f'{phase:<20} {metric:<20} {before:>10} -> {after:>10}  ({change})')
+
+@main.cli.command('check-query-plans')
+@click.option('--only', multiple=True, type=click.Choice([scenario[0] for scenario in SCENARIOS]), help='Check only these scenarios.')
+def check_query_plans_command(only):
+    """EXPLAIN every query the benchmark scenarios run and fail on full table scans."""
+    problems = check_query_plans(db.engine, capture_statements(current_app._get_current_object(), only))
+    for scenario, tables, statement in problems:
+        print(f"{scenario}: full scan of {', '.join(tables)}")
+        print(f"    {' '.join(statement.split())}")
+    if problems:
+        raise SystemExit(1)
+    print('No full table scans.')
 
 # Add date to template context
-@app.context_processor
+@main.app_context_processor
 def inject_date():
     return {'date': date}
 
+# The selected cohort is read by the navigation bar and the student picker macro
+main.add_app_template_global(current_cohort_id)
+main.add_app_template_global(cohort_options)
+
 # Helper function to check admin role
 def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or not current_user.is_admin():
             flash('Access denied. Admin privileges required.', 'error')
-            return redirect(url_for('student.dashboard'))
+            return redirect(url_for('main.student_dashboard'))
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+# Helper function to read an optional YYYY-MM-DD query parameter
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+# Helper function to validate a JSON bulk task request (mirrors TaskForm rules)
+def parse_bulk_task_payload(payload):
+    errors = {}
+    
+    title = str(payload.get('title') or '').strip()
+    if not 5 <= len(title) <= 200:
+        errors['title'] = 'Title must be between 5 and 200 characters.'
+    
+    description = str(payload.get('description') or '') or None
+    if description and len(description) > 500:
+        errors['description'] = 'Description cannot be longer than 500 characters.'
+    
+    priority = payload.get('priority') or 'medium'
+    if priority not in ('low', 'medium', 'high'):
+        errors['priority'] = 'Priority must be low, medium or high.'
+    
+    due_date = None
+    try:
+        due_date = datetime.strptime(str(payload.get('due_date') or ''), '%Y-%m-%d').date()
+        if due_date < date.today():
+            errors['due_date'] = 'Due date cannot be in the past.'
+    except ValueError:
+        errors['due_date'] = 'Due date must be given as YYYY-MM-DD.'
+    
+    student_ids = []
+    if payload.get('all_students'):
+        student_ids = all_active_student_ids(current_cohort_id())
+    else:
+        raw_ids = payload.get('student_ids')
+        if not isinstance(raw_ids, list) or not raw_ids:
+            errors['student_ids'] = 'Give a list of student ids or set all_students.'
+        else:
+            try:
+                student_ids = [int(student_id) for student_id in raw_ids]
+            except (TypeError, ValueError):
+                errors['student_ids'] = 'Student ids must be integers.'
+    
+    values = {'title': title, 'description': description, 'due_date': due_date, 'priority': priority}
+    return values, student_ids, errors
+
 # Authentication Routes
-@app.route('/')
+@main.route('/')
 def index():
     if current_user.is_authenticated:
         if current_user.is_admin():
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
         else:
-            return redirect(url_for('student_dashboard'))
-    return redirect(url_for('login'))
+            return redirect(url_for('main.student_dashboard'))
+    return redirect(url_for('main.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user and user.check_password(form.password.data) and user.is_active:
+            # Upgrade hashes made with older hashing settings
+            if user.rehash_password(form.password.data):
+                db.session.commit()
             login_user(user, remember=True)
             flash(f'Welcome back, {user.full_name}!', 'success')
             next_page = request.args.get('next')
             if next_page:
                 return redirect(next_page)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('Invalid username or password.', 'error')
     
     return render_template('auth/login.html', form=form)
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('You have been logged out successfully.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/forgot-password', methods=['GET', 'POST'])
+@main.route('/forgot-password', methods=['GET', 'POST'])
 def forgot_password():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     form = ForgotPasswordForm()
     if form.validate_on_submit():
@@ -119,101 +418,259 @@ def forgot_password():
             user.set_password(form.new_password.data)
             db.session.commit()
             flash('Your password has been reset successfully! You can now login with your new password.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         else:
             flash('Username and email combination not found.', 'error')
     
     return render_template('auth/forgot_password.html', form=form)
 
 # Admin Routes
-@app.route('/admin/dashboard')
+@main.route('/admin/dashboard')
 @login_required
 @admin_required
+@cached_page(lambda: ('tasks', 'attendance', 'students', 'cohorts') if current_cohort_id() is None
+             else (cohort_scope(current_cohort_id()), 'cohorts'))
+@read_only
 def admin_dashboard():
-    # Get statistics
-    total_students = User.query.filter_by(role='student', is_active=True).count()
-    total_tasks = Task.query.count()
-    completed_tasks = Task.query.filter_by(status='completed').count()
-    
-    # Calculate task completion percentage
-    task_completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-    
-    # Get attendance statistics for today
+    # Get statistics (all counters in a single aggregate query)
     today = date.today()
-    present_today = Attendance.query.filter_by(date=today, status='present').count()
-    total_attendance_today = Attendance.query.filter_by(date=today).count()
-    attendance_rate = (present_today / total_attendance_today * 100) if total_attendance_today > 0 else 0
+    cohort_id = current_cohort_id()
+    stats = admin_dashboard_stats(today, cohort_id)
     
     # Recent activities
-    recent_tasks = Task.query.order_by(Task.created_at.desc()).limit(5).all()
-    recent_attendance = Attendance.query.filter_by(date=today).order_by(Attendance.marked_at.desc()).limit(5).all()
+    recent_tasks = Task.query.options(joinedload(Task.assigned_student))
+    recent_attendance = Attendance.query.options(joinedload(Attendance.student)).filter_by(date=today)
+    if cohort_id is not None:
+        recent_tasks = recent_tasks.filter(Task.cohort_id == cohort_id)
+        recent_attendance = recent_attendance.filter(Attendance.cohort_id == cohort_id)
+    recent_tasks = recent_tasks.order_by(Task.created_at.desc()).limit(5).all()
+    recent_attendance = recent_attendance.order_by(Attendance.marked_at.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html',
-                         total_students=total_students,
-                         total_tasks=total_tasks,
-                         completed_tasks=completed_tasks,
-                         task_completion_rate=round(task_completion_rate, 1),
-                         attendance_rate=round(attendance_rate, 1),
+                         total_students=stats['total_students'],
+                         total_tasks=stats['total_tasks'],
+                         completed_tasks=stats['completed_tasks'],
+                         task_completion_rate=stats['task_completion_rate'],
+                         attendance_rate=stats['attendance_rate'],
                          recent_tasks=recent_tasks,
                          recent_attendance=recent_attendance)
 
-@app.route('/admin/students')
+@main.route('/admin/students')
 @login_required
 @admin_required
+@read_only
 def admin_students():
-    students = User.query.filter_by(role='student').order_by(User.full_name).all()
-    return render_template('admin/students.html', students=students)
+    q = request.args.get('q', '').strip()
+    query = User.query.filter_by(role='student')
+    if current_cohort_id() is not None:
+        query = query.filter(User.cohort_id == current_cohort_id())
+    query = apply_search(query, User, q)
+    page = keyset_paginate(query, User.full_name, User.id,
+                           cursor=request.args.get('cursor'),
+                           per_page=current_app.config['STUDENTS_PER_PAGE'],
+                           descending=False)
+    return render_template('admin/students.html', students=page.items, page=page, q=q,
+                         cohort_names=cohort_names())
 
-@app.route('/admin/students/create', methods=['GET', 'POST'])
+@main.route('/admin/students/create', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def create_student():
     form = StudentRegistrationForm()
+    form.cohort_id.choices = [(0, 'No cohort')] + [(cohort_id, name) for cohort_id, name, _ in cohort_options()]
+    if request.method == 'GET':
+        form.cohort_id.data = current_cohort_id() or 0
     if form.validate_on_submit():
         student = User(
             username=form.username.data,
             email=form.email.data,
             full_name=form.full_name.data,
-            role='student'
+            role='student',
+            cohort_id=form.cohort_id.data or None
         )
         student.set_password(form.password.data)
         db.session.add(student)
         db.session.commit()
         flash(f'Student account created successfully for {student.full_name}!', 'success')
-        return redirect(url_for('admin_students'))
+        return redirect(url_for('main.admin_students'))
     
     return render_template('admin/create_student.html', form=form)
 
-@app.route('/admin/students/<int:student_id>/toggle')
+@main.route('/admin/students/<int:student_id>/toggle')
 @login_required
 @admin_required
 def toggle_student_status(student_id):
     student = User.query.get_or_404(student_id)
     if student.role != 'student':
         flash('Invalid operation.', 'error')
-        return redirect(url_for('admin_students'))
+        return redirect(url_for('main.admin_students'))
     
     student.is_active = not student.is_active
     db.session.commit()
     status = 'activated' if student.is_active else 'deactivated'
     flash(f'Student {student.full_name} has been {status}.', 'success')
-    return redirect(url_for('admin_students'))
+    return redirect(url_for('main.admin_students'))
 
-@app.route('/admin/tasks')
+@main.route('/admin/cohorts', methods=['GET', 'POST'])
 @login_required
 @admin_required
+def admin_cohorts():
+    form = CohortForm()
+    if form.validate_on_submit():
+        cohort = Cohort(name=form.name.data, term=form.term.data or None)
+        db.session.add(cohort)
+        db.session.commit()
+        flash(f'Cohort {cohort.name} created.', 'success')
+        return redirect(url_for('main.admin_cohorts'))
+    
+    assign_form = AssignCohortForm()
+    assign_form.cohort_id.choices = [(cohort_id, name) for cohort_id, name, _ in cohort_options()] + [(0, 'No cohort')]
+    return render_template('admin/cohorts.html', form=form, assign_form=assign_form,
+                         cohorts=cohort_options(), counts=cohort_counts())
+
+@main.route('/admin/cohorts/assign', methods=['POST'])
+@login_required
+@admin_required
+def assign_cohort():
+    form = AssignCohortForm()
+    form.cohort_id.choices = [(cohort_id, name) for cohort_id, name, _ in cohort_options()] + [(0, 'No cohort')]
+    if form.validate_on_submit():
+        moved = assign_students(form.cohort_id.data or None, form.student_ids.data)
+        flash(f'{moved} students moved.', 'success')
+    else:
+        for errors in form.errors.values():
+            flash(' '.join(errors), 'error')
+    return redirect(url_for('main.admin_cohorts'))
+
+@main.route('/admin/cohorts/select')
+@login_required
+@admin_required
+def choose_cohort():
+    # Narrows the admin pages to one cohort for the rest of the session
+    cohort_id = request.args.get('cohort_id', type=int)
+    if cohort_id is not None and cohort_id not in cohort_names():
+        abort(404)
+    select_cohort(cohort_id)
+    next_page = request.args.get('next')
+    if next_page and next_page.startswith('/') and not next_page.startswith('//'):
+        return redirect(next_page)
+    return redirect(url_for('main.admin_dashboard'))
+
+@main.route('/admin/archive', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_archive():
+    terms = cohort_terms()
+    form = ArchiveTermForm()
+    form.term.choices = [(term, term) for term, _, ends_on in terms if term_closed(ends_on)]
+    close_form = CloseTermForm(prefix='close')
+    close_form.term.choices = [(term, term) for term, _, ends_on in terms if not term_closed(ends_on)]
+    if form.validate_on_submit():
+        job = enqueue('archive_term', {'term': form.term.data}, current_user.id)
+        flash(f'Archiving {form.term.data}. Its records stay readable from the archive.', 'info')
+        return redirect(url_for('main.admin_job', job_id=job.id))
+    return render_template('admin/archive.html', form=form, close_form=close_form, terms=terms,
+                         archives=term_archives(), term_closed=term_closed)
+
+@main.route('/admin/archive/close', methods=['POST'])
+@login_required
+@admin_required
+def close_archive_term():
+    form = CloseTermForm(prefix='close')
+    form.term.choices = [(term, term) for term, _, ends_on in cohort_terms() if not term_closed(ends_on)]
+    if form.validate_on_submit():
+        close_term(form.term.data, form.ends_on.data)
+        flash(f'{form.term.data} ends on {form.ends_on.data.strftime("%Y-%m-%d")}; '
+              f'it can be archived from the day after.', 'success')
+    else:
+        for errors in form.errors.values():
+            flash(' '.join(errors), 'error')
+    return redirect(url_for('main.admin_archive'))
+
+@main.route('/admin/tasks')
+@login_required
+@admin_required
+@read_only
 def admin_tasks():
-    tasks = Task.query.order_by(Task.due_date.desc()).all()
-    return render_template('admin/tasks.html', tasks=tasks)
+    filters = {
+        'student': request.args.get('student', type=int),
+        'status': request.args.get('status', 'all'),
+        'priority': request.args.get('priority', 'all'),
+        'from': request.args.get('from', ''),
+        'to': request.args.get('to', ''),
+        'q': request.args.get('q', '').strip(),
+    }
+    date_from = parse_date_arg('from')
+    date_to = parse_date_arg('to')
+    
+    # Load the assigned student in the same query to avoid one SELECT per row
+    query = Task.query.options(joinedload(Task.assigned_student))
+    if current_cohort_id() is not None:
+        query = query.filter(Task.cohort_id == current_cohort_id())
+    if filters['student']:
+        query = query.filter(Task.student_id == filters['student'])
+    if filters['status'] != 'all':
+        query = query.filter(Task.status == filters['status'])
+    if filters['priority'] != 'all':
+        query = query.filter(Task.priority == filters['priority'])
+    if date_from:
+        query = query.filter(Task.due_date >= date_from)
+    if date_to:
+        query = query.filter(Task.due_date <= date_to)
+    query = apply_search(query, Task, filters['q'])
+    
+    page = keyset_paginate(query, Task.due_date, Task.id,
+                           cursor=request.args.get('cursor'),
+                           per_page=current_app.config['TASKS_PER_PAGE'])
+    
+    return render_template('admin/tasks.html',
+                         tasks=page.items,
+                         page=page,
+                         filters=filters,
+                         selected_student=student_names([filters['student']]))
 
-@app.route('/admin/tasks/create', methods=['GET', 'POST'])
+@main.route('/admin/deadlines')
+@login_required
+@admin_required
+@read_only
+def admin_deadlines():
+    kind = request.args.get('kind')
+    if kind not in DEADLINE_KINDS:
+        kind = 'overdue'
+    # Read from the deadline table kept by the scan, not from all tasks
+    query = (db.session.query(TaskDeadline.id, TaskDeadline.due_date, TaskDeadline.notified_at,
+                              Task.id.label('task_id'), Task.title, Task.status, Task.priority,
+                              User.full_name.label('student_name'))
+             .join(Task, Task.id == TaskDeadline.task_id)
+             .join(User, User.id == TaskDeadline.student_id)
+             .filter(TaskDeadline.kind == kind, Task.status.in_(OPEN_STATUSES)))
+    if current_cohort_id() is not None:
+        query = query.filter(Task.cohort_id == current_cohort_id())
+    page = keyset_paginate(query, TaskDeadline.due_date, TaskDeadline.id,
+                           cursor=request.args.get('cursor'),
+                           per_page=current_app.config['TASKS_PER_PAGE'],
+                           descending=False)
+    last_scan = (Job.query.filter_by(kind='scan_deadlines', status='succeeded')
+                 .order_by(Job.run_after.desc()).first())
+    return render_template('admin/deadlines.html', kind=kind, deadlines=page.items, page=page,
+                         counts=deadline_counts(current_cohort_id()), last_scan=last_scan)
+
+@main.route('/admin/deadlines/<action>')
+@login_required
+@admin_required
+def run_deadline_job(action):
+    kinds = {'scan': 'scan_deadlines', 'remind': 'deadline_reminders'}
+    if action not in kinds:
+        abort(404)
+    job = enqueue(kinds[action], created_by=current_user.id)
+    flash('Deadline scan started.' if action == 'scan' else 'Sending reminders.', 'info')
+    return redirect(url_for('main.admin_job', job_id=job.id))
+
+@main.route('/admin/tasks/create', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def create_task():
     form = TaskForm()
-    # Populate student choices
-    students = User.query.filter_by(role='student', is_active=True).all()
-    form.student_id.choices = [(s.id, s.full_name) for s in students]
     
     if form.validate_on_submit():
         task = Task(
@@ -227,33 +684,126 @@ def create_task():
         db.session.add(task)
         db.session.commit()
         flash('Task created successfully!', 'success')
-        return redirect(url_for('admin_tasks'))
+        return redirect(url_for('main.admin_tasks'))
     
-    return render_template('admin/create_task.html', form=form)
+    return render_template('admin/create_task.html', form=form,
+                         selected_student=student_names([form.student_id.data]))
 
-@app.route('/admin/attendance')
+@main.route('/admin/tasks/bulk', methods=['GET', 'POST'])
 @login_required
 @admin_required
+def create_task_bulk():
+    # JSON clients post the task fields plus "student_ids": [...] or "all_students": true
+    if request.method == 'POST' and request.is_json:
+        payload = request.get_json(silent=True) or {}
+        values, student_ids, errors = parse_bulk_task_payload(payload)
+        if errors:
+            return jsonify({'errors': errors}), 400
+        
+        report = bulk_assign_task(values, student_ids, current_user.id)
+        return jsonify(report), 201 if report['assigned'] else 200
+    
+    form = BulkTaskForm()
+    
+    if form.validate_on_submit():
+        student_ids = all_active_student_ids(current_cohort_id()) if form.assign_all.data else form.student_ids.data
+        values = {
+            'title': form.title.data,
+            'description': form.description.data,
+            'due_date': form.due_date.data,
+            'priority': form.priority.data,
+        }
+        report = bulk_assign_task(values, student_ids, current_user.id)
+        message = f"Task assigned to {len(report['assigned'])} students."
+        if report['skipped']:
+            message += f" {len(report['skipped'])} skipped."
+        flash(message, 'success')
+        return redirect(url_for('main.admin_tasks'))
+    
+    return render_template('admin/bulk_create_task.html', form=form,
+                         selected_students=student_names(form.student_ids.data or []))
+
+@main.route('/admin/attendance')
+@login_required
+@admin_required
+@read_only
 def admin_attendance():
-    # Get attendance for today by default
-    selected_date = request.args.get('date', date.today().strftime('%Y-%m-%d'))
-    selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
+    # Get attendance for today by default, or for a date range if one is given
+    selected_date = parse_date_arg('date') or date.today()
+    filters = {
+        'date': selected_date.strftime('%Y-%m-%d'),
+        'student': request.args.get('student', type=int),
+        'status': request.args.get('status', 'all'),
+        'from': request.args.get('from', ''),
+        'to': request.args.get('to', ''),
+    }
+    date_from = parse_date_arg('from')
+    date_to = parse_date_arg('to')
+    is_range = bool(date_from or date_to)
+    if not is_range:
+        date_from = date_to = selected_date
+    
+    cohort_id = current_cohort_id()
+    base_query = Attendance.query
+    if cohort_id is not None:
+        base_query = base_query.filter(Attendance.cohort_id == cohort_id)
+    if date_from:
+        base_query = base_query.filter(Attendance.date >= date_from)
+    if date_to:
+        base_query = base_query.filter(Attendance.date <= date_to)
+    if filters['student']:
+        base_query = base_query.filter(Attendance.student_id == filters['student'])
+    
+    # Summary counts come from the daily rollup, or from one grouped query
+    # when narrowed to a single student. Loaded from the template, only when
+    # its cached summary fragment is missing.
+    def status_counts():
+        if filters['student']:
+            return dict(
+                base_query.with_entities(Attendance.status, func.count(Attendance.id))
+                .group_by(Attendance.status).all()
+            )
+        return attendance_status_counts(date_from, date_to, cohort_id)
     
-    attendance_records = Attendance.query.filter_by(date=selected_date).all()
-    students = User.query.filter_by(role='student', is_active=True).all()
+    query = base_query.options(joinedload(Attendance.student), joinedload(Attendance.marker))
+    if filters['status'] != 'all':
+        query = query.filter(Attendance.status == filters['status'])
+    
+    page = keyset_paginate(query, Attendance.date, Attendance.id,
+                           cursor=request.args.get('cursor'),
+                           per_page=current_app.config['ATTENDANCE_PER_PAGE'])
+    
+    # Active students with no record on the selected day (single-day view
+    # only), likewise loaded from a cached template fragment
+    def unmarked_students():
+        marked_ids = db.session.query(Attendance.student_id).filter(Attendance.date == selected_date)
+        query = db.session.query(User.id, User.full_name).filter(
+            User.role == 'student',
+            User.is_active == True,
+            ~User.id.in_(marked_ids)
+        )
+        if cohort_id is not None:
+            query = query.filter(User.cohort_id == cohort_id)
+        return query.order_by(User.full_name).all()
     
     return render_template('admin/attendance.html', 
-                         attendance_records=attendance_records,
-                         students=students,
-                         selected_date=selected_date)
+                         attendance_records=page.items,
+                         page=page,
+                         filters=filters,
+                         is_range=is_range,
+                         date_from=date_from,
+                         date_to=date_to,
+                         status_counts=status_counts,
+                         unmarked_students=unmarked_students,
+                         selected_student=student_names([filters['student']]),
+                         selected_date=selected_date,
+                         cohort_id=cohort_id)
 
-@app.route('/admin/attendance/mark', methods=['GET', 'POST'])
+@main.route('/admin/attendance/mark', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def mark_attendance():
     form = AttendanceForm()
-    students = User.query.filter_by(role='student', is_active=True).all()
-    form.student_id.choices = [(s.id, s.full_name) for s in students]
     
     if form.validate_on_submit():
         # Check if attendance already exists for this student and date
@@ -276,11 +826,190 @@ def mark_attendance():
             db.session.commit()
             flash('Attendance marked successfully!', 'success')
         
-        return redirect(url_for('admin_attendance'))
+        return redirect(url_for('main.admin_attendance'))
+    
+    return render_template('admin/mark_attendance.html', form=form,
+                         selected_student=student_names([form.student_id.data]))
+
+@main.route('/admin/attendance/bulk', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def mark_attendance_bulk():
+    # JSON clients post {"date": "YYYY-MM-DD", "overwrite": false, "records": [...]}
+    if request.method == 'POST' and request.is_json:
+        payload = request.get_json(silent=True) or {}
+        try:
+            day = datetime.strptime(payload.get('date', ''), '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return jsonify({'error': 'date must be given as YYYY-MM-DD'}), 400
+        records = payload.get('records')
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            return jsonify({'error': 'records must be a list of objects'}), 400
+        
+        report = bulk_mark_attendance(day, records, current_user.id,
+                                      overwrite=bool(payload.get('overwrite')))
+        return jsonify({'date': day.isoformat(), **report})
+    
+    form = BulkAttendanceForm()
+    if request.method == 'GET':
+        form.date.data = parse_date_arg('date') or date.today()
+    
+    roster = db.session.query(User.id, User.full_name).filter_by(role='student', is_active=True)
+    if current_cohort_id() is not None:
+        roster = roster.filter(User.cohort_id == current_cohort_id())
+    
+    if form.validate_on_submit():
+        students = roster.all()
+        records = [
+            {'student_id': s.id,
+             'status': request.form.get(f'status_{s.id}'),
+             'remarks': request.form.get(f'remarks_{s.id}')}
+            for s in students if request.form.get(f'status_{s.id}')
+        ]
+        report = bulk_mark_attendance(form.date.data, records, current_user.id,
+                                      overwrite=form.overwrite.data)
+        flash(f"Attendance saved: {len(report['inserted'])} marked, "
+              f"{len(report['updated'])} updated, {len(report['skipped'])} skipped.", 'success')
+        return redirect(url_for('main.admin_attendance', date=form.date.data.strftime('%Y-%m-%d')))
+    
+    # Roster for the selected date with any statuses already marked
+    selected_date = form.date.data or date.today()
+    students = roster.order_by(User.full_name).all()
+    marked = dict(db.session.query(Attendance.student_id, Attendance.status).filter_by(date=selected_date).all())
     
-    return render_template('admin/mark_attendance.html', form=form)
+    return render_template('admin/bulk_attendance.html', form=form, students=students,
+                         marked=marked, selected_date=selected_date)
 
-@app.route('/admin/edit-profile', methods=['GET', 'POST'])
+# Helper function for the export filters shared by direct and background exports
+def export_filters(kind):
+    # A single ?date= (as used by the attendance page) exports just that day
+    single_date = parse_date_arg('date')
+    filters = {
+        'date_from': parse_date_arg('from') or single_date,
+        'date_to': parse_date_arg('to') or single_date,
+        'student_id': request.args.get('student', type=int),
+    }
+    status = request.args.get('status', 'all')
+    if status != 'all':
+        filters['status'] = status
+    priority = request.args.get('priority', 'all')
+    if kind == 'tasks' and priority != 'all':
+        filters['priority'] = priority
+    if kind == 'tasks' and request.args.get('q'):
+        filters['q'] = request.args['q']
+    if current_cohort_id() is not None:
+        filters['cohort_id'] = current_cohort_id()
+    # ?term= exports from the archive of a closed term
+    if request.args.get('term'):
+        filters['term'] = request.args['term']
+    return filters
+
+@main.route('/admin/export/<kind>')
+@login_required
+@admin_required
+@read_only
+def export_data(kind):
+    if kind not in ('attendance', 'tasks'):
+        abort(404)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    
+    # Rows are written to the response as they are read from the database
+    return Response(stream_with_context(export_stream(kind, fmt, **export_filters(kind))),
+                    mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={export_filename(kind, fmt)}'})
+
+@main.route('/admin/export/<kind>/job')
+@login_required
+@admin_required
+def export_job(kind):
+    if kind not in ('attendance', 'tasks'):
+        abort(404)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    filters = {key: value.isoformat() if isinstance(value, date) else value
+               for key, value in export_filters(kind).items()}
+    job = enqueue('export', {'kind': kind, 'format': fmt, 'filters': filters}, current_user.id)
+    flash('Your export is being prepared. It will be ready to download on this page.', 'info')
+    return redirect(url_for('main.admin_job', job_id=job.id))
+
+@main.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_data():
+    form = ImportForm()
+    if form.validate_on_submit():
+        # The upload is saved and imported by a background job
+        name = new_job_file('.csv')
+        form.file.data.save(job_file_path(name))
+        payload = {'kind': form.kind.data, 'file': name, 'batch_size': form.batch_size.data}
+        if form.default_password.data:
+            payload['default_hash'] = hash_password(form.default_password.data)
+        job = enqueue('import', payload, current_user.id)
+        flash('Import started. Rows are imported in the background; this page shows the progress.', 'info')
+        return redirect(url_for('main.admin_job', job_id=job.id))
+    
+    return render_template('admin/import.html', form=form)
+
+@main.route('/admin/jobs')
+@login_required
+@admin_required
+def admin_jobs():
+    jobs = (Job.query.filter_by(created_by=current_user.id)
+            .order_by(Job.id.desc()).limit(current_app.config['JOBS_PER_PAGE']).all())
+    if any(job.status == 'queued' for job in jobs):
+        start_in_process_workers(current_app._get_current_object())
+    return render_template('admin/jobs.html', jobs=jobs)
+
+@main.route('/admin/jobs/<int:job_id>')
+@login_required
+@admin_required
+def admin_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.status == 'queued':
+        start_in_process_workers(current_app._get_current_object())
+    result = json.loads(job.result) if job.result else None
+    return render_template('admin/job.html', job=job, result=result)
+
+@main.route('/admin/jobs/<int:job_id>/download')
+@login_required
+@admin_required
+def download_job_result(job_id):
+    job = Job.query.get_or_404(job_id)
+    result = json.loads(job.result) if job.result else {}
+    if job.status != 'succeeded' or 'file' not in result:
+        abort(404)
+    path = job_file_path(result['file'])
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype=result['mimetype'], as_attachment=True, download_name=result['filename'])
+
+@main.route('/admin/analytics')
+@login_required
+@admin_required
+@read_only
+def admin_analytics():
+    default_from, default_to = default_range(date.today(), current_app.config['ANALYTICS_DEFAULT_DAYS'])
+    date_from = parse_date_arg('from') or default_from
+    date_to = parse_date_arg('to') or default_to
+    threshold = request.args.get('threshold', current_app.config['ATTENDANCE_RISK_THRESHOLD'], type=float)
+    report = attendance_report(date_from, date_to, threshold, current_cohort_id())
+    at_risk = [student for student in report['students'] if student['at_risk']]
+    rising_late = sorted((student for student in report['students'] if (student['late_trend'] or 0) > 0),
+                         key=lambda student: student['late_trend'], reverse=True)[:10]
+    return render_template('admin/analytics.html', report=report, at_risk=at_risk, rising_late=rising_late)
+
+@main.route('/admin/metrics')
+@login_required
+@admin_required
+def admin_metrics():
+    metrics = current_app.extensions.get('metrics')
+    rows = metrics.summary() if metrics else []
+    return render_template('admin/metrics.html', enabled=metrics is not None, rows=rows)
+
+@main.route('/admin/edit-profile', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_edit_profile():
@@ -291,7 +1020,7 @@ def admin_edit_profile():
         current_user.email = form.email.data
         db.session.commit()
         flash('Your profile has been updated successfully!', 'success')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     elif request.method == 'GET':
         form.full_name.data = current_user.full_name
         form.username.data = current_user.username
@@ -299,7 +1028,7 @@ def admin_edit_profile():
     
     return render_template('admin/edit_profile.html', form=form)
 
-@app.route('/admin/change-password', methods=['GET', 'POST'])
+@main.route('/admin/change-password', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_change_password():
@@ -314,50 +1043,43 @@ def admin_change_password():
         current_user.set_password(form.new_password.data)
         db.session.commit()
         flash('Your password has been changed successfully!', 'success')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
     return render_template('admin/change_password.html', form=form)
 
 # Student Routes
-@app.route('/student/dashboard')
+@main.route('/student/dashboard')
 @login_required
+@cached_page(lambda: (student_scope(current_user.id),))
+@read_only
 def student_dashboard():
     if current_user.is_admin():
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
-    # Get student's tasks
-    pending_tasks = Task.query.filter_by(student_id=current_user.id, status='pending').count()
-    in_progress_tasks = Task.query.filter_by(student_id=current_user.id, status='in_progress').count()
-    completed_tasks = Task.query.filter_by(student_id=current_user.id, status='completed').count()
+    # Get task and current month attendance counters in a single aggregate query
+    current_month = date.today().replace(day=1)
+    stats = student_dashboard_stats(current_user.id, current_month)
     
     # Get recent tasks
     recent_tasks = Task.query.filter_by(student_id=current_user.id).order_by(Task.created_at.desc()).limit(5).all()
     
-    # Get attendance summary for current month
-    current_month = date.today().replace(day=1)
-    attendance_records = Attendance.query.filter(
-        and_(Attendance.student_id == current_user.id,
-             Attendance.date >= current_month)
-    ).all()
-    
-    present_days = len([a for a in attendance_records if a.status == 'present'])
-    total_days = len(attendance_records)
-    attendance_rate = (present_days / total_days * 100) if total_days > 0 else 0
-    
     return render_template('student/dashboard.html',
-                         pending_tasks=pending_tasks,
-                         in_progress_tasks=in_progress_tasks,
-                         completed_tasks=completed_tasks,
+                         deadlines=student_deadlines(current_user.id),
+                         pending_tasks=stats['pending_tasks'],
+                         in_progress_tasks=stats['in_progress_tasks'],
+                         completed_tasks=stats['completed_tasks'],
                          recent_tasks=recent_tasks,
-                         attendance_rate=round(attendance_rate, 1),
-                         present_days=present_days,
-                         total_days=total_days)
+                         attendance_rate=stats['attendance_rate'],
+                         present_days=stats['present_days'],
+                         total_days=stats['total_days'],
+                         change_cursor=latest_cursor(current_user.id))
 
-@app.route('/student/tasks')
+@main.route('/student/tasks')
 @login_required
+@read_only
 def student_tasks():
     if current_user.is_admin():
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
     status_filter = request.args.get('status', 'all')
     
@@ -369,7 +1091,7 @@ def student_tasks():
     
     return render_template('student/tasks.html', tasks=tasks, status_filter=status_filter)
 
-@app.route('/student/tasks/<int:task_id>/update', methods=['GET', 'POST'])
+@main.route('/student/tasks/<int:task_id>/update', methods=['GET', 'POST'])
 @login_required
 def update_task_status(task_id):
     task = Task.query.get_or_404(task_id)
@@ -377,7 +1099,7 @@ def update_task_status(task_id):
     # Ensure student can only update their own tasks
     if task.student_id != current_user.id:
         flash('Access denied.', 'error')
-        return redirect(url_for('student_tasks'))
+        return redirect(url_for('main.student_tasks'))
     
     form = TaskUpdateForm()
     if form.validate_on_submit():
@@ -385,16 +1107,17 @@ def update_task_status(task_id):
         task.updated_at = datetime.utcnow()
         db.session.commit()
         flash('Task status updated successfully!', 'success')
-        return redirect(url_for('student_tasks'))
+        return redirect(url_for('main.student_tasks'))
     
     form.status.data = task.status
     return render_template('student/update_task.html', form=form, task=task)
 
-@app.route('/student/attendance')
+@main.route('/student/attendance')
 @login_required
+@read_only
 def student_attendance():
     if current_user.is_admin():
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
     # Get attendance records for current month by default
     month = request.args.get('month', date.today().strftime('%Y-%m'))
@@ -407,21 +1130,30 @@ def student_attendance():
     else:
         last_day = date(year, month_num + 1, 1) - timedelta(days=1)
     
-    attendance_records = Attendance.query.filter(
+    # Only the columns the page shows, without building Attendance objects
+    attendance_records = db.session.query(
+        Attendance.date, Attendance.status, Attendance.remarks, Attendance.marked_at
+    ).filter(
         and_(Attendance.student_id == current_user.id,
              Attendance.date >= first_day,
              Attendance.date <= last_day)
     ).order_by(Attendance.date.desc()).all()
     
+    # The whole year as a heatmap, from the compact calendar encoding
+    year_start = date(year, 1, 1)
+    year_calendar = attendance_calendars([current_user.id], year_start, date(year, 12, 31))[current_user.id]
+    
     return render_template('student/attendance.html', 
                          attendance_records=attendance_records,
-                         selected_month=month)
+                         selected_month=month,
+                         year=year,
+                         year_days=calendar_days(year_calendar, year_start))
 
-@app.route('/student/change-password', methods=['GET', 'POST'])
+@main.route('/student/change-password', methods=['GET', 'POST'])
 @login_required
 def change_password():
     if current_user.is_admin():
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
     form = ChangePasswordForm()
     if form.validate_on_submit():
@@ -434,15 +1166,15 @@ def change_password():
         current_user.set_password(form.new_password.data)
         db.session.commit()
         flash('Your password has been changed successfully!', 'success')
-        return redirect(url_for('student_dashboard'))
+        return redirect(url_for('main.student_dashboard'))
     
     return render_template('student/change_password.html', form=form)
 
-@app.route('/student/edit-profile', methods=['GET', 'POST'])
+@main.route('/student/edit-profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
     if current_user.is_admin():
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
     form = EditProfileForm(current_user.username, current_user.email)
     if form.validate_on_submit():
@@ -451,7 +1183,7 @@ def edit_profile():
         current_user.email = form.email.data
         db.session.commit()
         flash('Your profile has been updated successfully!', 'success')
-        return redirect(url_for('student_dashboard'))
+        return redirect(url_for('main.student_dashboard'))
     elif request.method == 'GET':
         form.full_name.data = current_user.full_name
         form.username.data = current_user.username
@@ -460,4 +1192,4 @@ def edit_profile():
     return render_template('student/edit_profile.html', form=form)
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
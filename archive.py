@@ -0,0 +1,178 @@
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import select, insert, update, delete, literal, func, case
+
+from models import db, Cohort, Task, Attendance, TaskDeadline, ArchivedAttendance, ArchivedTask, TermArchive
+from summaries import STATUSES
+from caching import mark_changed, cohort_scope, student_scope
+from changes import record_changes
+from jobs import job_handler
+
+# Archiving a closed term moves the attendance records and completed tasks
+# of its cohorts out of the live tables into archive tables of the same
+# shape, so the pages that read the live tables stay at the size of the
+# running terms. The rows are removed with Core statements, which the
+# rollup hook does not see, so the daily, weekly and monthly rollups keep
+# counting archived days and dashboards, rates and student counters are
+# unchanged. Archived rows are read through the archive API and exports,
+# and leave the change feed as deletes; the calendars and the reports
+# over the records themselves read them together with the live ones. Only
+# a closed term is archived: one whose cohorts all have an end date before
+# today, so nothing is moved while it is still being marked.
+
+# Open tasks stay where their students can still work on them
+ARCHIVED_TASK_STATUS = 'completed'
+
+
+def term_cohort_ids(term):
+    return list(db.session.scalars(select(Cohort.id).where(Cohort.term == term).order_by(Cohort.id)))
+
+
+def cohort_terms():
+    """``(term, number of cohorts, ends_on)`` of every term given to a cohort, by term.
+
+    ``ends_on`` is the last end date of the term's cohorts, or None while
+    any of them has none.
+    """
+    ends_on = case((func.count(Cohort.ends_on) == func.count(), func.max(Cohort.ends_on)), else_=None)
+    return db.session.execute(
+        select(Cohort.term, func.count(), ends_on).where(Cohort.term.isnot(None))
+        .group_by(Cohort.term).order_by(Cohort.term)
+    ).all()
+
+
+def term_closed(ends_on, today=None):
+    return ends_on is not None and ends_on < (today or date.today())
+
+
+def close_term(term, ends_on):
+    """Set the last day of every cohort of ``term``; it can be archived from the day after."""
+    if not term_cohort_ids(term):
+        raise ValueError(f'No cohort has the term {term!r}.')
+    db.session.execute(update(Cohort).where(Cohort.term == term).values(ends_on=ends_on))
+    # Core update, so the cohort caches are told here
+    mark_changed(db.session, 'cohorts')
+    db.session.commit()
+
+
+def term_archives():
+    """``{term: totals}`` of everything archived so far, summed over the term's cohorts."""
+    rows = db.session.execute(
+        select(TermArchive.term, func.min(TermArchive.first_date), func.max(TermArchive.last_date),
+               *[func.sum(getattr(TermArchive, status)) for status in STATUSES],
+               func.sum(TermArchive.tasks), func.max(TermArchive.archived_at))
+        .group_by(TermArchive.term)
+    )
+    return {
+        term: {'first_date': first_date, 'last_date': last_date, 'present': present, 'absent': absent,
+               'late': late, 'tasks': tasks, 'archived_at': archived_at}
+        for term, first_date, last_date, present, absent, late, tasks, archived_at in rows
+    }
+
+
+def _next_batch(model, criteria, key, after, batch_size, *columns):
+    # About batch_size rows past ``after`` in ``key`` order. A batch ends at
+    # a key value, so with a date key all rows of its last day come along;
+    # each batch is a range scan of the index behind ``criteria`` and ``key``.
+    if after is not None:
+        criteria = (*criteria, key > after)
+    bound = db.session.scalar(select(key).where(*criteria).order_by(key).offset(batch_size - 1).limit(1))
+    if bound is not None:
+        criteria = (*criteria, key <= bound)
+    return db.session.execute(select(model.id, key.label('key'), *columns).where(*criteria)).all()
+
+
+def _move(model, archive_model, entity, rows, term, now):
+    source = model.__table__
+    ids = [row.id for row in rows]
+    db.session.execute(insert(archive_model.__table__).from_select(
+        [column.name for column in source.c] + ['term', 'archived_at'],
+        select(*source.c, literal(term), literal(now)).where(source.c.id.in_(ids))
+    ))
+    db.session.execute(delete(source).where(source.c.id.in_(ids)))
+    # Feed and delta sync clients see the rows leave the live tables
+    record_changes(db.session.connection(), entity, 'delete', [(row.id, row.student_id) for row in rows])
+
+
+def _term_archive(term, cohort_id):
+    summary = db.session.scalar(select(TermArchive).filter_by(term=term, cohort_id=cohort_id))
+    if summary is None:
+        summary = TermArchive(term=term, cohort_id=cohort_id, present=0, absent=0, late=0, tasks=0)
+        db.session.add(summary)
+    return summary
+
+
+def _archive_attendance(term, cohort_id, summary, batch_size):
+    moved, after = 0, None
+    while True:
+        rows = _next_batch(Attendance, (Attendance.cohort_id == cohort_id,), Attendance.date, after,
+                           batch_size, Attendance.student_id, Attendance.status)
+        if not rows:
+            return moved
+        now = datetime.utcnow()
+        _move(Attendance, ArchivedAttendance, 'attendance', rows, term, now)
+        after = max(row.key for row in rows)
+        first = min(row.key for row in rows)
+        summary.first_date = min(summary.first_date or first, first)
+        summary.last_date = max(summary.last_date or after, after)
+        for status in STATUSES:
+            setattr(summary, status, getattr(summary, status) + sum(row.status == status for row in rows))
+        summary.archived_at = now
+        mark_changed(db.session, 'attendance', cohort_scope(cohort_id),
+                     *{student_scope(row.student_id) for row in rows})
+        db.session.commit()
+        moved += len(rows)
+
+
+def _archive_tasks(term, cohort_id, summary, batch_size):
+    moved, after = 0, None
+    while True:
+        rows = _next_batch(Task, (Task.cohort_id == cohort_id, Task.status == ARCHIVED_TASK_STATUS), Task.id,
+                           after, batch_size, Task.student_id)
+        if not rows:
+            return moved
+        now = datetime.utcnow()
+        ids = [row.id for row in rows]
+        # A task completed since the last deadline scan may still be listed
+        db.session.execute(delete(TaskDeadline.__table__).where(TaskDeadline.task_id.in_(ids)))
+        _move(Task, ArchivedTask, 'task', rows, term, now)
+        summary.tasks += len(rows)
+        summary.archived_at = now
+        mark_changed(db.session, 'tasks', cohort_scope(cohort_id),
+                     *{student_scope(row.student_id) for row in rows})
+        db.session.commit()
+        after = max(ids)
+        moved += len(rows)
+
+
+def archive_term(term, batch_size=None, job=None):
+    """Move the attendance records and completed tasks of a term's cohorts to the archive.
+
+    Rows go in batches of ARCHIVE_BATCH_SIZE, each committed together with
+    the TermArchive totals it adds, so an interrupted run can simply be
+    started again; so can a run for records made after the term was
+    archived. Returns the numbers of attendance records and tasks moved.
+    Raises ValueError for a term that is unknown or has not ended.
+    """
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    cohort_ids = term_cohort_ids(term)
+    if not cohort_ids:
+        raise ValueError(f'No cohort has the term {term!r}.')
+    ends_on = {name: ends for name, _, ends in cohort_terms()}.get(term)
+    if not term_closed(ends_on):
+        raise ValueError(f'The term {term!r} has not ended; close it with its last day first.')
+    moved = {'attendance': 0, 'tasks': 0}
+    for done, cohort_id in enumerate(cohort_ids, start=1):
+        summary = _term_archive(term, cohort_id)
+        moved['attendance'] += _archive_attendance(term, cohort_id, summary, batch_size)
+        moved['tasks'] += _archive_tasks(term, cohort_id, summary, batch_size)
+        # Every cohort of the term keeps a summary row, even an empty one
+        db.session.commit()
+        if job:
+            job.progress(done * 100 // len(cohort_ids), f'{done} of {len(cohort_ids)} cohorts archived')
+    return moved
+
+
+@job_handler('archive_term')
+def archive_term_job(job, payload):
+    return archive_term(payload['term'], job=job)
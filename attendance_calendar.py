@@ -0,0 +1,60 @@
+from datetime import timedelta
+from sqlalchemy import select, func, cast, Integer
+
+from models import db, Attendance
+from summaries import attendance_records
+from caching import cached_result, student_scope
+
+# A calendar is a string with one character per day of the range, so a year
+# of one student is 365 bytes of JSON instead of 365 serialized records
+STATUS_CODES = {'present': 'P', 'absent': 'A', 'late': 'L'}
+NO_RECORD = '.'
+
+
+def _day_offset(column, origin, dialect_name):
+    # Days from ``origin`` to a date column, computed by the database so no
+    # date is parsed in Python
+    if dialect_name == 'sqlite':
+        return cast(func.julianday(column) - func.julianday(origin), Integer)
+    return cast(column - origin, Integer)
+
+
+def _build_calendars(student_ids, date_from, date_to):
+    days = (date_to - date_from).days + 1
+    calendars = {student_id: bytearray(NO_RECORD.encode() * days) for student_id in student_ids}
+    codes = {status: ord(code) for status, code in STATUS_CODES.items()}
+    records = attendance_records(
+        lambda model: (model.student_id.in_(student_ids), model.date.between(date_from, date_to)),
+        'student_id', 'date', 'status')
+    offset = _day_offset(records.c.date, date_from, db.session.get_bind(clause=select(Attendance.id)).dialect.name)
+    rows = db.session.execute(select(records.c.student_id, offset, records.c.status))
+    for student_id, day, status in rows:
+        calendars[student_id][day] = codes.get(status, ord(NO_RECORD))
+    # A list in student order, as cached results may go through JSON
+    return [calendars[student_id].decode() for student_id in student_ids]
+
+
+def attendance_calendars(student_ids, date_from, date_to):
+    """Attendance of each student from ``date_from`` to ``date_to`` as a day string.
+
+    Day ``n`` of the range is character ``n``: P, A or L for present,
+    absent or late, "." for no record, archived days included. Read with
+    one column query over the (student_id, date) indexes of the live and
+    archived records, and cached until one of the students' attendance
+    changes. Returns ``{student_id: string}``.
+    """
+    student_ids = sorted(set(student_ids))
+    calendars = cached_result('attendance_calendar', date_from, date_to, *student_ids,
+                              scopes=[student_scope(student_id) for student_id in student_ids],
+                              compute=lambda: _build_calendars(student_ids, date_from, date_to))
+    return dict(zip(student_ids, calendars))
+
+
+def calendar_counts(calendar):
+    return {status: calendar.count(code) for status, code in STATUS_CODES.items()}
+
+
+def calendar_days(calendar, date_from):
+    # (date, status or None) pairs, for rendering a calendar in Python
+    statuses = {code: status for status, code in STATUS_CODES.items()}
+    return [(date_from + timedelta(days=n), statuses.get(code)) for n, code in enumerate(calendar)]
@@ -0,0 +1,273 @@
+import contextvars
+import json
+import platform
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime
+from sqlalchemy import event, func, select
+
+from models import db, User, Task, Attendance
+from instrumentation import percentile
+
+# Requests traced for peak memory per scenario
+MEMORY_ITERATIONS = 3
+
+# (name, role, method, url) - url may be a callable taking the benchmark
+# context so each iteration can target a different record. The
+# 'cohort_admin' role is an admin with one cohort selected.
+SCENARIOS = [
+    ('admin_dashboard', 'admin', 'GET', '/admin/dashboard'),
+    ('admin_students', 'admin', 'GET', '/admin/students'),
+    ('admin_tasks', 'admin', 'GET', '/admin/tasks'),
+    ('admin_tasks_filtered', 'admin', 'GET', '/admin/tasks?status=pending&priority=high'),
+    ('admin_attendance', 'admin', 'GET', '/admin/attendance'),
+    ('create_task_form', 'admin', 'GET', '/admin/tasks/create'),
+    ('mark_attendance_form', 'admin', 'GET', '/admin/attendance/mark'),
+    ('mark_attendance', 'admin', 'POST', '/admin/attendance/mark'),
+    ('student_dashboard', 'student', 'GET', '/student/dashboard'),
+    ('student_tasks', 'student', 'GET', '/student/tasks'),
+    ('student_attendance', 'student', 'GET', '/student/attendance'),
+    ('admin_analytics', 'admin', 'GET', '/admin/analytics'),
+    ('admin_jobs', 'admin', 'GET', '/admin/jobs'),
+    ('admin_deadlines', 'admin', 'GET', '/admin/deadlines'),
+    ('api_tasks', 'admin', 'GET', '/api/v1/tasks?limit=100'),
+    ('api_attendance_sync', 'admin', 'GET', '/api/v1/attendance?limit=100&updated_since=2000-01-01T00:00:00'),
+    ('api_student_tasks', 'student', 'GET', '/api/v1/tasks?fields=title,status,due_date'),
+    ('api_changes', 'admin', 'GET', '/api/v1/changes?since=0'),
+    ('api_student_changes', 'student', 'GET', '/api/v1/changes?since=0'),
+    ('api_jobs', 'admin', 'GET', '/api/v1/jobs'),
+    ('api_student_deadlines', 'student', 'GET', '/api/v1/deadlines'),
+    ('admin_students_search', 'admin', 'GET', '/admin/students?q=student%2000'),
+    ('admin_tasks_search', 'admin', 'GET', '/admin/tasks?q=assign'),
+    ('api_search_students', 'admin', 'GET', '/api/v1/search/students?q=stu&active=true'),
+    ('api_student_search_tasks', 'student', 'GET', '/api/v1/search/tasks?q=assign'),
+    ('api_student_calendar', 'student', 'GET', '/api/v1/attendance/calendar'),
+    ('api_calendar_compare', 'admin', 'GET',
+     lambda context: '/api/v1/attendance/calendar?from=2000-01-01&to=2009-12-31&'
+     + '&'.join(f'student_id={student_id}' for student_id in context['student_ids'][:20])),
+    # The first check-in of a run creates the record, the others find it
+    ('api_check_in', 'student', 'POST', '/api/v1/check-in'),
+    ('api_check_in_status', 'student', 'GET', '/api/v1/check-in'),
+    ('api_check_in_counts', 'admin', 'GET', '/api/v1/check-in'),
+    ('cohort_dashboard', 'cohort_admin', 'GET', '/admin/dashboard'),
+    ('cohort_students', 'cohort_admin', 'GET', '/admin/students'),
+    ('cohort_tasks', 'cohort_admin', 'GET', '/admin/tasks'),
+    ('cohort_attendance', 'cohort_admin', 'GET', '/admin/attendance'),
+    ('cohort_analytics', 'cohort_admin', 'GET', '/admin/analytics'),
+]
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self)
+
+
+def _login(client, user_id, cohort_id=None):
+    # Log in through the Flask-Login session keys, skipping password hashing
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+        if cohort_id is not None:
+            session['cohort_id'] = cohort_id
+
+
+def _post_data(name, context):
+    if name == 'mark_attendance':
+        return {
+            'date': date.today().strftime('%Y-%m-%d'),
+            'student_id': context['rng'].choice(context['student_ids']),
+            'status': 'present',
+            'remarks': '',
+        }
+    return None
+
+
+def _table_counts():
+    return {
+        model.__tablename__: db.session.execute(select(func.count()).select_from(model)).scalar()
+        for model in (User, Task, Attendance)
+    }
+
+
+@contextmanager
+def _without_page_cache(app):
+    # Cached pages would be timed as cache hits that run no queries, so the
+    # scenarios always build their pages
+    cache = app.extensions.pop('page_cache', None)
+    try:
+        yield
+    finally:
+        if cache is not None:
+            app.extensions['page_cache'] = cache
+
+
+def _prepare(app, seed):
+    # Log one test client in as the admin and one as a student
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+        student_ids = list(db.session.execute(
+            select(User.id).where(User.role == 'student', User.is_active == True).limit(1000)
+        ).scalars())
+        if admin is None or not student_ids:
+            raise RuntimeError('The database needs an admin and active students; run generate-data first.')
+        # Without cohorts the cohort admin sees everything, like the admin
+        cohort_id = db.session.execute(
+            select(User.cohort_id).where(User.role == 'student', User.cohort_id.isnot(None)).limit(1)
+        ).scalar()
+        table_counts = _table_counts()
+        engine = db.engine
+
+    rng = random.Random(seed)
+    context = {'rng': rng, 'student_ids': student_ids}
+    clients = {'admin': app.test_client(), 'student': app.test_client(), 'cohort_admin': app.test_client()}
+    for client in clients.values():
+        # As the API's own clients do, so API writes are not refused as cross-site
+        client.environ_base['HTTP_X_REQUESTED_WITH'] = 'XMLHttpRequest'
+    _login(clients['admin'], admin.id)
+    _login(clients['cohort_admin'], admin.id, cohort_id)
+    _login(clients['student'], rng.choice(student_ids))
+    return clients, context, engine, table_counts
+
+
+def _scenarios(only):
+    for name, role, method, url in SCENARIOS:
+        if not only or name in only:
+            yield name, role, method, url
+
+
+def run_benchmark(app, iterations=50, warmup=5, only=None, seed=42, log=print):
+    """Drive every scenario through the Flask test client and collect timings.
+
+    Returns a JSON-serialisable dict with per-scenario latency percentiles
+    (ms), queries per request and peak traced memory (KiB), plus the table
+    sizes the run was made against. The page cache is left out, so every
+    request does the full work of its page.
+    """
+    # Run in an empty context: inside an active app context (as flask CLI
+    # commands are) every request would share one context, session and ``g``
+    with _without_page_cache(app):
+        return contextvars.Context().run(_run_benchmark, app, iterations, warmup, only, seed, log)
+
+
+def _run_benchmark(app, iterations, warmup, only, seed, log):
+    clients, context, engine, table_counts = _prepare(app, seed)
+
+    results = []
+    for name, role, method, url in _scenarios(only):
+        client = clients[role]
+        request_url = url(context) if callable(url) else url
+
+        for _ in range(warmup):
+            client.open(request_url, method=method, data=_post_data(name, context))
+
+        durations, queries, statuses = [], [], {}
+        for _ in range(iterations):
+            with QueryCounter(engine) as counter:
+                started = time.perf_counter()
+                response = client.open(request_url, method=method, data=_post_data(name, context))
+                durations.append(time.perf_counter() - started)
+            queries.append(counter.count)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        # Memory is traced in a separate short pass since tracing slows requests down
+        tracemalloc.start()
+        for _ in range(MEMORY_ITERATIONS):
+            client.open(request_url, method=method, data=_post_data(name, context))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        durations.sort()
+        result = {
+            'scenario': name,
+            'method': method,
+            'url': request_url,
+            'iterations': iterations,
+            'p50_ms': round(percentile(durations, 50), 3),
+            'p95_ms': round(percentile(durations, 95), 3),
+            'p99_ms': round(percentile(durations, 99), 3),
+            'mean_ms': round(sum(durations) / len(durations) * 1000, 3),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+            'peak_memory_kib': round(peak / 1024, 1),
+            'status_codes': statuses,
+        }
+        results.append(result)
+        log(f"{name:<24} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+            f"p99 {result['p99_ms']:>9.2f}ms  queries {result['queries_per_request']:>6.1f}  "
+            f"peak {result['peak_memory_kib']:>9.1f}KiB")
+
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': engine.url.render_as_string(hide_password=True),
+            'iterations': iterations,
+            'warmup': warmup,
+            'seed': seed,
+            'table_counts': table_counts,
+        },
+        'results': results,
+    }
+
+
+def capture_statements(app, only=None, seed=42):
+    """Run every scenario once and return the SELECTs it issued.
+
+    Returns ``{scenario: [(statement, parameters), ...]}`` with the DBAPI
+    level SQL and parameters, ready to be passed to ``EXPLAIN``.
+    """
+    with _without_page_cache(app):
+        return contextvars.Context().run(_capture_statements, app, only, seed)
+
+
+def _capture_statements(app, only, seed):
+    clients, context, engine, _ = _prepare(app, seed)
+    captured = {}
+
+    for name, role, method, url in _scenarios(only):
+        statements = captured[name] = []
+
+        def record(conn, cursor, statement, parameters, execution_context, executemany):
+            if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                statements.append((statement, parameters))
+
+        request_url = url(context) if callable(url) else url
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            clients[role].open(request_url, method=method, data=_post_data(name, context))
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+
+    return captured
+
+
+def write_results(report, path):
+    with open(path, 'w') as output:
+        json.dump(report, output, indent=2)
+
+
+def compare_results(before, after):
+    """Yield (scenario, metric, before, after) for scenarios present in both runs."""
+    previous = {result['scenario']: result for result in before['results']}
+    for result in after['results']:
+        old = previous.get(result['scenario'])
+        if old is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries_per_request', 'peak_memory_kib'):
+            yield result['scenario'], metric, old[metric], result[metric]
@@ -0,0 +1,186 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, User, Task, Attendance
+from summaries import STATUSES, apply_attendance_deltas
+from caching import mark_changed, student_scope, cohort_scope
+from changes import record_changes
+from cohorts import stamp_cohorts
+
+
+def active_student_ids(student_ids):
+    # One query for the whole batch instead of one lookup per student
+    if not student_ids:
+        return set()
+    return set(db.session.execute(
+        select(User.id).where(User.id.in_(student_ids),
+                              User.role == 'student',
+                              User.is_active == True)
+    ).scalars())
+
+
+def all_active_student_ids(cohort_id=None):
+    query = select(User.id).where(User.role == 'student', User.is_active == True)
+    if cohort_id is not None:
+        query = query.where(User.cohort_id == cohort_id)
+    return list(db.session.execute(query).scalars())
+
+
+def _insert_new_attendance(connection):
+    # INSERT that leaves out records already there for the student and date:
+    # one committed by another request since the batch was checked is
+    # skipped instead of failing the whole batch on unique_student_date
+    table = Attendance.__table__
+    dialect = {'sqlite': sqlite, 'postgresql': postgresql}.get(connection.dialect.name)
+    if dialect is None:
+        return insert(table)
+    return dialect.insert(table).on_conflict_do_nothing(index_elements=['student_id', 'date'])
+
+
+def bulk_assign_task(values, student_ids, created_by):
+    """Create one copy of a task for each student in a single INSERT.
+
+    ``values`` holds the shared task columns (``title``, ``description``,
+    ``due_date``, ``priority``). Students that are unknown or inactive are
+    skipped. Returns a report with the ``assigned`` student ids and the
+    ``skipped`` entries with the reason.
+    """
+    report = {'assigned': [], 'skipped': []}
+
+    requested = list(dict.fromkeys(student_ids))
+    valid_ids = active_student_ids(requested)
+    for student_id in requested:
+        if student_id in valid_ids:
+            report['assigned'].append(student_id)
+        else:
+            report['skipped'].append({'student_id': student_id, 'reason': 'not an active student'})
+
+    if not report['assigned']:
+        return report
+
+    # Timestamps are computed once instead of calling the column default per row
+    now = datetime.utcnow()
+    shared = {
+        'title': values['title'],
+        'description': values.get('description'),
+        'due_date': values['due_date'],
+        'priority': values.get('priority') or 'medium',
+        'status': 'pending',
+        'created_by': created_by,
+        'created_at': now,
+        'updated_at': now,
+    }
+    rows = [{**shared, 'student_id': student_id} for student_id in report['assigned']]
+    cohort_scopes = stamp_cohorts(rows)
+    table = Task.__table__
+    created = db.session.execute(insert(table).returning(table.c.id, table.c.student_id), rows).all()
+    record_changes(db.session.connection(), 'task', 'insert', created)
+    mark_changed(db.session, 'tasks', *cohort_scopes, *map(student_scope, report['assigned']))
+    db.session.commit()
+
+    return report
+
+
+def bulk_mark_attendance(day, entries, marked_by, overwrite=False):
+    """Mark attendance for many students on one date in a single transaction.
+
+    ``entries`` is a list of dicts with ``student_id``, ``status`` and optional
+    ``remarks``. New rows go in with one multi-row INSERT; when ``overwrite``
+    is set, already marked students whose status or remarks differ are
+    updated with one executemany UPDATE. A record another request commits
+    in the meantime is skipped as already marked rather than failing the
+    batch. Returns a report with the student ids that were ``inserted`` and
+    ``updated`` and a list of ``skipped`` entries with the reason.
+    """
+    report = {'inserted': [], 'updated': [], 'skipped': []}
+
+    # Validate the batch and keep the last entry per student
+    wanted = {}
+    for entry in entries:
+        try:
+            student_id = int(entry.get('student_id'))
+        except (TypeError, ValueError):
+            report['skipped'].append({'student_id': entry.get('student_id'), 'reason': 'invalid student id'})
+            continue
+        status = entry.get('status')
+        if status not in STATUSES:
+            report['skipped'].append({'student_id': student_id, 'reason': f'invalid status {status!r}'})
+            continue
+        remarks = (entry.get('remarks') or '').strip() or None
+        if remarks and len(remarks) > 200:
+            report['skipped'].append({'student_id': student_id, 'reason': 'remarks longer than 200 characters'})
+            continue
+        wanted[student_id] = {'status': status, 'remarks': remarks}
+
+    valid_ids = active_student_ids(list(wanted))
+    for student_id in list(wanted):
+        if student_id not in valid_ids:
+            del wanted[student_id]
+            report['skipped'].append({'student_id': student_id, 'reason': 'not an active student'})
+
+    if not wanted:
+        return report
+
+    # Existing records for this date, fetched in one query
+    existing = {
+        row.student_id: row for row in db.session.execute(
+            select(Attendance.id, Attendance.student_id, Attendance.status, Attendance.remarks, Attendance.cohort_id)
+            .where(Attendance.date == day, Attendance.student_id.in_(list(wanted)))
+        )
+    }
+
+    to_insert, to_update, deltas = [], [], {}
+    for student_id, values in wanted.items():
+        current = existing.get(student_id)
+        if current is None:
+            to_insert.append({'date': day, 'student_id': student_id, 'marked_by': marked_by, **values})
+        elif not overwrite:
+            report['skipped'].append({'student_id': student_id, 'reason': 'already marked'})
+        elif (current.status, current.remarks) == (values['status'], values['remarks']):
+            report['skipped'].append({'student_id': student_id, 'reason': 'unchanged'})
+        else:
+            to_update.append({
+                'record_id': current.id,
+                'new_status': values['status'],
+                'new_remarks': values['remarks'],
+                'new_marked_by': marked_by,
+            })
+            if current.status != values['status']:
+                deltas[(day, student_id, current.status)] = -1
+                deltas[(day, student_id, values['status'])] = 1
+            report['updated'].append(student_id)
+
+    # Core statements bypass the ORM flush hooks, so the change log and
+    # rollups are written here
+    cohort_scopes = stamp_cohorts(to_insert)
+    connection = db.session.connection()
+    table = Attendance.__table__
+    if to_insert:
+        inserted = connection.execute(_insert_new_attendance(connection).returning(table.c.id, table.c.student_id),
+                                      to_insert).all()
+        record_changes(connection, 'attendance', 'insert', inserted)
+        report['inserted'] = [student_id for _, student_id in inserted]
+        for student_id in report['inserted']:
+            deltas[(day, student_id, wanted[student_id]['status'])] = 1
+        for student_id in set(row['student_id'] for row in to_insert) - set(report['inserted']):
+            report['skipped'].append({'student_id': student_id, 'reason': 'already marked'})
+    if to_update:
+        connection.execute(
+            update(table).where(table.c.id == bindparam('record_id')).values(
+                status=bindparam('new_status'),
+                remarks=bindparam('new_remarks'),
+                marked_by=bindparam('new_marked_by'),
+            ),
+            to_update
+        )
+        record_changes(connection, 'attendance', 'update',
+                       [(existing[student_id].id, student_id) for student_id in report['updated']])
+    apply_attendance_deltas(connection, deltas)
+    # Updated records keep the cohort they were marked in
+    cohort_scopes.update(cohort_scope(existing[student_id].cohort_id) for student_id in report['updated']
+                         if existing[student_id].cohort_id is not None)
+    mark_changed(db.session, 'attendance', *cohort_scopes, *map(student_scope, report['inserted'] + report['updated']))
+    db.session.commit()
+
+    return report
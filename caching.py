@@ -0,0 +1,257 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from itertools import chain
+from flask import current_app, has_app_context, request, session, make_response
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+
+from models import db, User, Task, Attendance
+
+
+class MemoryCache:
+    """LRU cache with a TTL, private to the current process."""
+
+    def __init__(self, ttl=60, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires at, value)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class RedisCache:
+    """Cache shared by every worker, kept in Redis. Needs the ``redis`` package.
+
+    Values must be JSON serialisable. Redis being unreachable is treated as
+    a cache miss, so requests fall back to the database instead of failing.
+    """
+
+    def __init__(self, url, ttl=60, prefix=''):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.errors = redis.RedisError
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            value = self.client.get(f'{self.prefix}{key}')
+        except self.errors:
+            return None
+        return json.loads(value) if value else None
+
+    def set(self, key, value):
+        try:
+            self.client.setex(f'{self.prefix}{key}', self.ttl, json.dumps(value))
+        except self.errors:
+            pass
+
+    def delete(self, key):
+        try:
+            self.client.delete(f'{self.prefix}{key}')
+        except self.errors:
+            current_app.logger.warning('Could not delete cache key %s', key)
+
+
+def make_cache(backend, url=None, ttl=60, maxsize=10000, prefix=''):
+    """Build a cache for a config value of 'memory', 'redis' or 'none' (returns None)."""
+    if backend == 'memory':
+        return MemoryCache(ttl, maxsize)
+    if backend == 'redis':
+        return RedisCache(url, ttl, prefix)
+    if backend == 'none':
+        return None
+    raise ValueError(f'Unknown cache backend: {backend}')
+
+
+def init_page_cache(app):
+    cache = make_cache(app.config['PAGE_CACHE'], app.config['PAGE_CACHE_URL'],
+                       app.config['PAGE_CACHE_TTL'], app.config['PAGE_CACHE_SIZE'], prefix='page:')
+    if cache is not None:
+        app.extensions['page_cache'] = cache
+    app.add_template_global(cache_fragment)
+
+
+# Scopes name the data a cached page or fragment is built from. Each scope
+# has a version token; a write replaces the token, so every key built from
+# the old token simply stops being used and ages out of the cache.
+
+def student_scope(student_id):
+    return f'student:{student_id}'
+
+
+def cohort_scope(cohort_id):
+    return f'cohort:{cohort_id}'
+
+
+def _scope_versions(cache, scopes):
+    versions = []
+    for scope in scopes:
+        version = cache.get(f'version:{scope}')
+        if version is None:
+            version = _new_version(cache, scope)
+        versions.append(version)
+    return versions
+
+
+def _new_version(cache, scope):
+    version = format(time.time_ns(), 'x')
+    cache.set(f'version:{scope}', version)
+    return version
+
+
+def invalidate(*scopes):
+    cache = current_app.extensions.get('page_cache')
+    if cache is not None:
+        for scope in scopes:
+            _new_version(cache, scope)
+
+
+def mark_changed(session, *scopes):
+    # Scopes are invalidated when the session commits (see below); Core
+    # statements that bypass the ORM flush call this themselves
+    session.info.setdefault('changed_scopes', set()).update(scopes)
+
+
+def _cache_key(name, parts, scopes):
+    cache = current_app.extensions['page_cache']
+    key = [name, *map(str, parts), *_scope_versions(cache, scopes)]
+    return hashlib.sha1('|'.join(key).encode()).hexdigest()
+
+
+def cached_page(scopes):
+    """Cache a GET view's HTML per user and answer revalidations with 304.
+
+    ``scopes`` is called inside the request and returns the scopes the page
+    is built from. The ETag is derived from the versions of those scopes,
+    so an unchanged page is confirmed without rendering or querying.
+    Requests with pending flash messages are never cached.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache = current_app.extensions.get('page_cache')
+            if cache is None or request.method != 'GET' or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            # The page header shows the user's name, so it is part of the key
+            etag = _cache_key(request.full_path,
+                              [current_user.get_id(), current_user.full_name, date.today()],
+                              scopes())
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                html = cache.get(etag)
+                if html is None:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    cache.set(etag, response.get_data(as_text=True))
+                else:
+                    response = make_response(html)
+            response.set_etag(etag)
+            # Browsers must revalidate every time; only this user may store it
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
+
+
+def cache_fragment(name, *parts, scopes=(), caller=None):
+    """Jinja helper caching the HTML of a ``{% call %}`` block.
+
+    Use as ``{% call cache_fragment('name', key parts..., scopes=[...]) %}``.
+    Data the block needs should be loaded lazily inside it, so a hit skips
+    both the queries and the rendering.
+    """
+    cache = current_app.extensions.get('page_cache')
+    if cache is None:
+        return caller()
+    key = _cache_key(f'fragment:{name}', parts, scopes)
+    html = cache.get(key)
+    if html is None:
+        html = str(caller())
+        cache.set(key, html)
+    return Markup(html)
+
+
+def cached_result(name, *parts, scopes=(), compute):
+    """Return ``compute()``, cached until one of ``scopes`` changes.
+
+    The key is ``name`` and ``parts``. With the redis backend the result
+    must be JSON serialisable.
+    """
+    cache = current_app.extensions.get('page_cache')
+    if cache is None:
+        return compute()
+    key = _cache_key(f'result:{name}', parts, scopes)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+
+def _ids(obj, name):
+    # Current and, if it was just changed, previous value of a foreign key
+    history = getattr(inspect(obj).attrs, name).history
+    return {getattr(obj, name), *history.deleted} - {None}
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_changed_scopes(session, flush_context):
+    scopes = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Task):
+            scopes.add('tasks')
+            scopes.update(map(student_scope, _ids(obj, 'student_id')))
+        elif isinstance(obj, Attendance):
+            scopes.add('attendance')
+            scopes.update(map(student_scope, _ids(obj, 'student_id')))
+        elif isinstance(obj, User):
+            scopes.update(('students', student_scope(obj.id)))
+        else:
+            continue
+        scopes.update(map(cohort_scope, _ids(obj, 'cohort_id')))
+    if scopes:
+        mark_changed(session, *scopes)
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed_scopes(session):
+    scopes = session.info.pop('changed_scopes', ())
+    if scopes and has_app_context():
+        invalidate(*scopes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changed_scopes(session):
+    session.info.pop('changed_scopes', None)
@@ -0,0 +1,103 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, inspect, select, insert, func
+
+from models import db, Task, Attendance, ChangeLog
+
+# Change log entity name of each tracked model
+ENTITIES = {Task: 'task', Attendance: 'attendance'}
+
+
+def record_changes(connection, entity, action, rows):
+    """Append one change log entry per ``(entity_id, student_id)`` in ``rows``.
+
+    Runs on the given connection, so the entries commit or roll back with
+    the write they describe. ORM writes are logged by the flush hook below;
+    Core statements that bypass it call this themselves.
+    """
+    now = datetime.utcnow()
+    entries = [{'entity': entity, 'entity_id': entity_id, 'student_id': student_id,
+                'action': action, 'changed_at': now} for entity_id, student_id in rows]
+    if entries:
+        connection.execute(insert(ChangeLog.__table__), entries)
+
+
+def _previous_student_id(obj):
+    history = inspect(obj).attrs.student_id.history
+    return history.deleted[0] if history.deleted else obj.student_id
+
+
+@event.listens_for(db.session, 'after_flush')
+def log_changes(session, flush_context):
+    # Runs inside the flush, like the attendance rollups, so ids are assigned
+    # and attribute history still shows what changed
+    entries = []
+    for obj in session.new:
+        if type(obj) in ENTITIES:
+            entries.append((ENTITIES[type(obj)], 'insert', obj.id, obj.student_id))
+    for obj in session.dirty:
+        if type(obj) in ENTITIES and session.is_modified(obj, include_collections=False):
+            previous = _previous_student_id(obj)
+            if previous != obj.student_id:
+                # The old student's feed sees the row go away
+                entries.append((ENTITIES[type(obj)], 'delete', obj.id, previous))
+            entries.append((ENTITIES[type(obj)], 'update', obj.id, obj.student_id))
+    for obj in session.deleted:
+        if type(obj) in ENTITIES:
+            entries.append((ENTITIES[type(obj)], 'delete', obj.id, _previous_student_id(obj)))
+
+    # One executemany INSERT per entity and action. Deletes go first, so a
+    # task moved to another student reads as "gone" and then "updated" when
+    # the feed is replayed in order.
+    grouped = defaultdict(list)
+    for entity, action, entity_id, student_id in entries:
+        grouped[(entity, action)].append((entity_id, student_id))
+    for (entity, action), rows in sorted(grouped.items(), key=lambda item: item[0][1] != 'delete'):
+        record_changes(session.connection(), entity, action, rows)
+
+
+def latest_cursor(student_id=None):
+    """Id of the newest change log entry (for one student), or 0."""
+    query = select(func.max(ChangeLog.id))
+    if student_id is not None:
+        query = query.where(ChangeLog.student_id == student_id)
+    return db.session.scalar(query) or 0
+
+
+def oldest_cursor():
+    """Id of the oldest entry still kept, or None when the log is empty."""
+    return db.session.scalar(select(func.min(ChangeLog.id)))
+
+
+def changes_since(cursor, limit, student_id=None, entity=None):
+    """Change log entries after ``cursor`` in log order, at most ``limit``.
+
+    On databases with concurrent writers an id can become visible after a
+    higher one, so entries younger than CHANGE_FEED_SETTLE seconds are
+    held back until any transaction that took a lower id has committed.
+    """
+    query = select(ChangeLog).where(ChangeLog.id > cursor)
+    if student_id is not None:
+        query = query.where(ChangeLog.student_id == student_id)
+    if entity is not None:
+        query = query.where(ChangeLog.entity == entity)
+    settle = current_app.config['CHANGE_FEED_SETTLE']
+    if settle:
+        query = query.where(ChangeLog.changed_at <= datetime.utcnow() - timedelta(seconds=settle))
+    return db.session.scalars(query.order_by(ChangeLog.id).limit(limit)).all()
+
+
+def prune_changes(before):
+    """Delete entries older than ``before``; returns the number deleted.
+
+    The newest entry is always kept, so a cursor from before the pruned
+    range can still be told apart from an up-to-date one.
+    """
+    table = ChangeLog.__table__
+    newest = select(func.max(table.c.id)).scalar_subquery()
+    deleted = db.session.execute(
+        table.delete().where(table.c.changed_at < before, table.c.id < newest)
+    ).rowcount
+    db.session.commit()
+    return deleted
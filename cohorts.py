@@ -0,0 +1,113 @@
+from datetime import datetime
+from flask import session
+from sqlalchemy import event, inspect, select, update, func
+
+from models import db, Cohort, User, Task, Attendance
+from stats import count_where
+from caching import cached_result, mark_changed, cohort_scope, student_scope
+from identity import mark_users_changed
+
+# Students belong to a cohort through users.cohort_id. Tasks and attendance
+# records carry their own copy of it, set when they are written, so a
+# cohort's rows are found through the cohort_id indexes without joining the
+# user table, and past records stay with the cohort they were made in when
+# a student moves on.
+
+
+def current_cohort_id():
+    """Cohort the admin pages are narrowed to, chosen in the navigation bar; None for all."""
+    return session.get('cohort_id')
+
+
+def select_cohort(cohort_id):
+    if cohort_id is None:
+        session.pop('cohort_id', None)
+    else:
+        session['cohort_id'] = cohort_id
+
+
+def cohort_options():
+    """``[id, name, term]`` of every cohort by name, cached until a cohort changes."""
+    return cached_result('cohorts', scopes=('cohorts',), compute=lambda: [
+        list(row) for row in db.session.execute(select(Cohort.id, Cohort.name, Cohort.term).order_by(Cohort.name))
+    ])
+
+
+def cohort_names():
+    return {cohort_id: name for cohort_id, name, _ in cohort_options()}
+
+
+def cohort_counts():
+    """``{cohort_id: {'students': n, 'active': n}}`` with one grouped query over the cohort index."""
+    rows = db.session.execute(
+        select(User.cohort_id, func.count(), count_where(User.is_active == True))
+        .where(User.role == 'student')
+        .group_by(User.cohort_id)
+    )
+    return {cohort_id: {'students': students, 'active': active} for cohort_id, students, active in rows}
+
+
+def student_cohorts(student_ids):
+    """``{student_id: cohort_id}`` of the given students, for writes that bypass the ORM."""
+    ids = list(set(student_ids) - {None})
+    if not ids:
+        return {}
+    return dict(db.session.execute(select(User.id, User.cohort_id).where(User.id.in_(ids))).all())
+
+
+def stamp_cohorts(rows):
+    """Set ``cohort_id`` on Core insert rows from their ``student_id``; returns the cohort scopes touched."""
+    cohorts = student_cohorts(row['student_id'] for row in rows)
+    for row in rows:
+        row['cohort_id'] = cohorts.get(row['student_id'])
+    return {cohort_scope(cohort_id) for cohort_id in cohorts.values() if cohort_id is not None}
+
+
+def assign_students(cohort_id, student_ids):
+    """Move students into a cohort (or out of any with None).
+
+    Their tasks and attendance records without a cohort yet, i.e. those
+    from before cohorts were set up, are moved along; records made in an
+    earlier cohort stay there. Returns the number of students moved.
+    """
+    ids = list(db.session.execute(
+        select(User.id).where(User.id.in_(list(student_ids)), User.role == 'student')
+    ).scalars())
+    if not ids:
+        return 0
+    previous = set(student_cohorts(ids).values())
+    # updated_at changes too, so API delta syncs pick the new cohort up
+    now = datetime.utcnow()
+    db.session.execute(update(User).where(User.id.in_(ids)).values(cohort_id=cohort_id, updated_at=now))
+    if cohort_id is not None:
+        for model in (Task, Attendance):
+            db.session.execute(update(model).where(model.student_id.in_(ids), model.cohort_id.is_(None))
+                               .values(cohort_id=cohort_id, updated_at=now))
+    # Core updates bypass the flush hooks, so the caches are told here
+    scopes = {cohort_scope(c) for c in previous | {cohort_id} if c is not None}
+    mark_changed(db.session, 'students', 'tasks', 'attendance', *scopes, *map(student_scope, ids))
+    mark_users_changed(db.session, ids)
+    db.session.commit()
+    return len(ids)
+
+
+@event.listens_for(db.session, 'before_flush')
+def stamp_new_records(session, flush_context, instances):
+    # New tasks and attendance records, and tasks moved to another student,
+    # take the student's current cohort; one query for the whole flush
+    rows = [obj for obj in session.new if isinstance(obj, (Task, Attendance)) and obj.cohort_id is None]
+    rows += [obj for obj in session.dirty
+             if isinstance(obj, Task) and inspect(obj).attrs.student_id.history.deleted]
+    if rows:
+        with session.no_autoflush:
+            cohorts = dict(session.execute(
+                select(User.id, User.cohort_id).where(User.id.in_({obj.student_id for obj in rows}))
+            ).all())
+        for obj in rows:
+            obj.cohort_id = cohorts.get(obj.student_id)
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_changed_cohorts(session, flush_context):
+    if any(isinstance(obj, Cohort) for obj in (*session.new, *session.dirty, *session.deleted)):
+        mark_changed(session, 'cohorts')
@@ -1,9 +1,185 @@
 import os
-from datetime import timedelta
+from datetime import time, timedelta
+
+def database_url(url):
+    # Hosting providers still hand out postgres:// URLs, which SQLAlchemy rejects
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(url, pool_size=5):
+    """Engine profile for a database URL: SQLite needs no pool tuning, server databases
+    get ``pool_size`` connections per process (DB_POOL_SIZE overrides it)."""
+    if url.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # Drop connections the server closed while idle instead of failing a request
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+
+def time_of_day(value):
+    # 'HH:MM' from the environment, or None when unset
+    return time.fromisoformat(value) if value else None
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///student_system_new.db'
+    
+    # Production server profile, read by gunicorn.conf.py. 'gthread' workers
+    # serve SERVER_THREADS requests at a time each and suit SQLite, whose
+    # calls block; 'gevent' (pip install gevent psycogreen) keeps up to
+    # SERVER_WORKER_CONNECTIONS requests open per worker, e.g. change feed
+    # streams, but only pays off with PostgreSQL. One worker by default, so
+    # the in-memory page and identity caches see every write; more workers
+    # need them in Redis (or off), which gunicorn.conf.py enforces.
+    SERVER_WORKER_CLASS = os.environ.get('SERVER_WORKER_CLASS', 'gthread')
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 1))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 8))
+    SERVER_WORKER_CONNECTIONS = int(os.environ.get('SERVER_WORKER_CONNECTIONS', 1000))
+    SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', 30))
+    SERVER_KEEPALIVE = int(os.environ.get('SERVER_KEEPALIVE', 5))
+    # Workers are replaced after this many requests (0 = never), so memory
+    # grown by large exports is given back
+    SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 10000))
+    
+    SQLALCHEMY_DATABASE_URI = database_url(os.environ.get('DATABASE_URL')) or 'sqlite:///student_system_new.db'
+    # One connection per request thread; gevent requests wait for one of a
+    # few instead of opening a connection each
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI,
+                                               20 if SERVER_WORKER_CLASS == 'gevent' else SERVER_THREADS)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Optional read replica; SELECTs of views marked read_only are sent there
+    REPLICA_URL = database_url(os.environ.get('DATABASE_REPLICA_URL'))
+    SQLALCHEMY_BINDS = {'replica': REPLICA_URL} if REPLICA_URL else {}
+    
+    # Applied to every new SQLite connection: WAL lets dashboard reads run while
+    # attendance is being written, busy_timeout (ms) makes writers wait for the
+    # lock instead of failing, and synchronous=NORMAL is safe with WAL
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    }
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)
-    WTF_CSRF_ENABLED = True
\ No newline at end of file
+    WTF_CSRF_ENABLED = True
+    
+    # Page sizes for the keyset-paginated admin listings
+    TASKS_PER_PAGE = int(os.environ.get('TASKS_PER_PAGE', 50))
+    ATTENDANCE_PER_PAGE = int(os.environ.get('ATTENDANCE_PER_PAGE', 50))
+    STUDENTS_PER_PAGE = int(os.environ.get('STUDENTS_PER_PAGE', 50))
+    
+    # Search and autocomplete (/api/v1/search/...): default and maximum number of results
+    SEARCH_LIMIT = 10
+    SEARCH_MAX_LIMIT = 50
+    
+    # JSON API (/api/v1): default and maximum page size, maximum items per batch request
+    API_PAGE_SIZE = 100
+    API_MAX_PAGE_SIZE = 1000
+    API_MAX_BATCH = 1000
+    # Seconds of recent changes that a delta sync (If-Modified-Since) re-sends
+    API_SYNC_WINDOW = 2
+    
+    # Change feed (/api/v1/changes): SSE poll interval, keepalive interval and
+    # stream lifetime in seconds, and days of history kept by prune-changes.
+    # Server databases commit concurrently, so entries younger than
+    # CHANGE_FEED_SETTLE seconds are held back until lower ids are committed;
+    # SQLite has a single writer and needs no delay.
+    CHANGE_FEED_POLL_INTERVAL = float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', 1))
+    CHANGE_FEED_HEARTBEAT = 15
+    CHANGE_FEED_STREAM_TIMEOUT = int(os.environ.get('CHANGE_FEED_STREAM_TIMEOUT', 300))
+    CHANGE_FEED_SETTLE = 0 if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else 1
+    CHANGE_FEED_RETENTION_DAYS = int(os.environ.get('CHANGE_FEED_RETENTION_DAYS', 30))
+    
+    # Attendance analytics: students whose rate (percent present) is below the
+    # threshold are flagged at risk; reports cover this many days by default
+    ATTENDANCE_RISK_THRESHOLD = float(os.environ.get('ATTENDANCE_RISK_THRESHOLD', 75))
+    ANALYTICS_DEFAULT_DAYS = 90
+    # Attendance calendars (/api/v1/attendance/calendar): longest range in
+    # days and most students per request
+    CALENDAR_MAX_DAYS = 3660
+    CALENDAR_MAX_STUDENTS = 50
+    # Student check-in (/api/v1/check-in): local times after which a
+    # check-in counts as late and is no longer taken, e.g. '09:15' and '12:00';
+    # unset, every check-in is on time
+    CHECK_IN_LATE_AFTER = time_of_day(os.environ.get('CHECK_IN_LATE_AFTER'))
+    CHECK_IN_CLOSES = time_of_day(os.environ.get('CHECK_IN_CLOSES'))
+    
+    # Background jobs (imports, exports): threads working the queue inside each
+    # web process once something is queued (0 = leave it to `flask worker`),
+    # seconds between polls, delay before the first retry (doubled for each
+    # further one), heartbeat interval and the silence after which a running
+    # job is taken to have lost its worker. Uploads and results are kept as
+    # files in JOB_FILES_DIR (default instance/jobs) for JOB_RETENTION_DAYS.
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+    JOB_RETRY_DELAY = 30
+    JOB_HEARTBEAT = 10
+    JOB_STALE_AFTER = 60
+    JOB_FILES_DIR = os.environ.get('JOB_FILES_DIR')
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+    JOBS_PER_PAGE = 50
+    
+    # Deadline scan: open tasks due within DEADLINE_DUE_SOON_DAYS days count as
+    # due soon. Job workers rescan every DEADLINE_SCAN_INTERVAL seconds and
+    # then mail each student one reminder per overdue or due-soon task.
+    DEADLINE_DUE_SOON_DAYS = int(os.environ.get('DEADLINE_DUE_SOON_DAYS', 3))
+    DEADLINE_SCAN_INTERVAL = int(os.environ.get('DEADLINE_SCAN_INTERVAL', 3600))
+    DEADLINE_REMINDERS = os.environ.get('DEADLINE_REMINDERS', '1').lower() in ('1', 'true', 'yes')
+    # Job kinds the workers queue by themselves, with seconds between runs
+    JOB_SCHEDULE = {'scan_deadlines': DEADLINE_SCAN_INTERVAL}
+    
+    # Term archive: rows moved per transaction when a closed term's attendance
+    # and completed tasks leave the live tables (flask archive-term)
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    
+    # Outgoing mail; without MAIL_SERVER mails are only logged
+    MAIL_SERVER = os.environ.get('MAIL_SERVER')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', '1').lower() in ('1', 'true', 'yes')
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_FROM = os.environ.get('MAIL_FROM', 'noreply@example.com')
+    
+    # Password hashing: any Werkzeug method string, e.g. 'pbkdf2:sha256:600000' or
+    # 'scrypt:32768:8:1'. Hashes made with other settings are upgraded on login.
+    # scrypt hashes need the wider column of migration 12, so run init-db
+    # before switching an existing database to it.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    # Processes used to hash passwords during bulk account creation (0 = one per CPU)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    
+    # Cache of logged-in users, so a request does not need a query to load
+    # current_user: 'memory' (per worker process), 'redis' (shared by all
+    # workers, set IDENTITY_CACHE_URL) or 'none'. Changes to a user invalidate
+    # its entry; with 'memory' other workers would see the old data for up to
+    # IDENTITY_CACHE_TTL seconds, so it is only the default for one worker.
+    IDENTITY_CACHE = os.environ.get('IDENTITY_CACHE', 'memory' if SERVER_WORKERS == 1 else 'none')
+    IDENTITY_CACHE_URL = os.environ.get('IDENTITY_CACHE_URL')
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    IDENTITY_CACHE_SIZE = 10000
+    
+    # Cache of rendered dashboards and template fragments: 'memory', 'redis'
+    # (set PAGE_CACHE_URL) or 'none'. A write to the tasks, attendance or
+    # students an entry shows replaces it in the cache of the process that
+    # wrote; a 'memory' cache of any other process keeps serving the old
+    # page until PAGE_CACHE_TTL (seconds) runs out. So 'memory' is only the
+    # default for a single server process; several need 'redis' to cache.
+    PAGE_CACHE = os.environ.get('PAGE_CACHE', 'memory' if SERVER_WORKERS == 1 else 'none')
+    PAGE_CACHE_URL = os.environ.get('PAGE_CACHE_URL')
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 1000))
+    
+    # Opt-in request profiling (query count, SQL and template time, /admin/metrics)
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILING_SLOW_QUERIES = 5
+    PROFILING_HISTORY = 1000
+    # Maximum queries per endpoint, e.g. {'main.admin_tasks': 5}; QUERY_BUDGET_RAISE
+    # turns a breach into an exception so tests fail instead of just logging
+    QUERY_BUDGETS = {}
+    QUERY_BUDGET_DEFAULT = None
+    QUERY_BUDGET_RAISE = False
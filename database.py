@@ -0,0 +1,51 @@
+from functools import wraps
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# Bind key of the optional read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Session that sends SELECTs to the read replica inside ``read_only`` views.
+
+    Everything else, including reads during a flush and any statement
+    outside a ``read_only`` view, goes to the primary database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and getattr(clause, 'is_select', False)
+                and has_app_context() and g.get('read_only')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(f):
+    # Mark a view that only reads, so its queries may use the read replica
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_database(app, db):
+    """Apply ``SQLITE_PRAGMAS`` to every new connection of the app's SQLite engines.
+
+    Only registers connect listeners; no connection is opened here.
+    """
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    for engine in engines:
+        event.listen(engine, 'connect', set_pragmas)
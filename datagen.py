@@ -0,0 +1,135 @@
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+
+from models import db, Cohort, User, Task, Attendance
+from passwords import hash_password
+from summaries import rebuild_attendance_summaries
+
+# Password shared by every generated student
+GENERATED_PASSWORD = 'password123'
+
+TASK_STATUSES = ('pending', 'in_progress', 'completed')
+PRIORITIES = ('low', 'medium', 'high')
+# Roughly 85% present, 10% absent, 5% late
+ATTENDANCE_WEIGHTS = (('present', 85), ('absent', 10), ('late', 5))
+
+
+def _insert_batches(model, rows, batch_size):
+    # rows is a generator; it is consumed one batch at a time
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(model.__table__), batch)
+            db.session.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model.__table__), batch)
+        db.session.commit()
+        total += len(batch)
+    return total
+
+
+def generate_data(students=1000, days=180, tasks_per_student=20, seed=42,
+                  batch_size=5000, end_date=None, cohorts=0, log=print):
+    """Fill the database with synthetic students, tasks and attendance.
+
+    The same ``seed`` always produces the same data, so benchmark runs can be
+    compared. Attendance covers the ``days`` days ending at ``end_date``
+    (today by default), skipping weekends. With ``cohorts`` the students are
+    spread over that many new cohorts in turn.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    now = datetime.utcnow()
+
+    admin = User.query.filter_by(role='admin').first()
+    if admin is None:
+        raise RuntimeError('Create an admin user (flask seed) before generating data.')
+
+    # Continue numbering after earlier runs so usernames stay unique
+    offset = db.session.execute(select(func.count(User.id)).where(User.username.like('bench%'))).scalar()
+    password_hash = hash_password(GENERATED_PASSWORD)
+
+    cohort_ids = [None]
+    if cohorts:
+        first = db.session.execute(select(func.count(Cohort.id)).where(Cohort.name.like('Generated %'))).scalar()
+        cohort_ids = list(db.session.scalars(insert(Cohort).returning(Cohort.id, sort_by_parameter_order=True), [
+            {'name': f'Generated {n + 1:03d}', 'created_at': now} for n in range(first, first + cohorts)
+        ]))
+        db.session.commit()
+        log(f'Created {cohorts} cohorts.')
+
+    def student_rows():
+        for n in range(offset, offset + students):
+            yield {
+                'username': f'bench{n:06d}',
+                'email': f'bench{n:06d}@example.com',
+                'full_name': f'Student {n:06d}',
+                'password_hash': password_hash,
+                'role': 'student',
+                'is_active': rng.random() > 0.02,
+                'cohort_id': cohort_ids[n % len(cohort_ids)],
+                'created_at': now,
+            }
+
+    created = _insert_batches(User, student_rows(), batch_size)
+    log(f'Created {created} students.')
+
+    student_cohorts = dict(db.session.execute(
+        select(User.id, User.cohort_id).where(User.username >= f'bench{offset:06d}',
+                                              User.username < f'bench{offset + students:06d}')
+        .order_by(User.id)
+    ).all())
+    student_ids = list(student_cohorts)
+
+    def task_rows():
+        for student_id in student_ids:
+            for k in range(tasks_per_student):
+                due = start_date + timedelta(days=rng.randrange(days + 30))
+                created_at = datetime.combine(due - timedelta(days=rng.randrange(1, 30)), datetime.min.time())
+                yield {
+                    'title': f'Assignment {k + 1}',
+                    'description': 'Generated task for benchmarking.',
+                    'due_date': due,
+                    'status': 'completed' if due < end_date and rng.random() < 0.7 else rng.choice(TASK_STATUSES),
+                    'priority': rng.choice(PRIORITIES),
+                    'student_id': student_id,
+                    'cohort_id': student_cohorts[student_id],
+                    'created_by': admin.id,
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                }
+
+    created = _insert_batches(Task, task_rows(), batch_size)
+    log(f'Created {created} tasks.')
+
+    statuses = [status for status, _ in ATTENDANCE_WEIGHTS]
+    weights = [weight for _, weight in ATTENDANCE_WEIGHTS]
+
+    def attendance_rows():
+        for offset_days in range(days):
+            day = start_date + timedelta(days=offset_days)
+            if day.weekday() >= 5:
+                continue
+            marked_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=9)
+            for student_id, status in zip(student_ids, rng.choices(statuses, weights, k=len(student_ids))):
+                yield {
+                    'date': day,
+                    'student_id': student_id,
+                    'cohort_id': student_cohorts[student_id],
+                    'status': status,
+                    'marked_by': admin.id,
+                    'marked_at': marked_at,
+                }
+
+    created = _insert_batches(Attendance, attendance_rows(), batch_size)
+    log(f'Created {created} attendance records.')
+
+    # Bulk inserts bypass the rollup maintenance, so rebuild once at the end
+    rebuild_attendance_summaries()
+    log('Attendance summaries rebuilt.')
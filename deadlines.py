@@ -0,0 +1,181 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from flask import current_app, render_template
+from sqlalchemy import select, insert, update, delete, func, bindparam, or_
+
+from models import db, User, Task, TaskDeadline
+from caching import mark_changed, student_scope
+from jobs import job_handler, enqueue
+from mail import mail_sender
+
+DEADLINE_KINDS = ('overdue', 'due_soon')
+OPEN_STATUSES = ('pending', 'in_progress')
+
+# Students mailed per reminder job progress update
+PROGRESS_EVERY = 100
+
+
+def deadline_kind(due_date, today):
+    return 'overdue' if due_date < today else 'due_soon'
+
+
+def scan_deadlines(today, days):
+    """Bring the deadline table in line with the open tasks due by ``today + days``.
+
+    The tasks are read with one range scan of idx_task_status_due_date per
+    open status, and the deadline table holds only earlier matches, so the
+    cost follows the number of overdue and due-soon tasks, not the size of
+    the task table. Of the deadline table, only the rows of those tasks are
+    read in full, and of the others only what is needed to remove them. A
+    task that turns from due soon to overdue gets a new reminder. Returns
+    counts of the rows found, added, updated and removed.
+    """
+    horizon = today + timedelta(days=days)
+    candidate = (Task.status.in_(OPEN_STATUSES), Task.due_date <= horizon)
+    found = {
+        task_id: (student_id, due_date, deadline_kind(due_date, today))
+        for task_id, student_id, due_date in db.session.execute(
+            select(Task.id, Task.student_id, Task.due_date).where(*candidate)
+        )
+    }
+    table = TaskDeadline.__table__
+    existing = {row.task_id: row for row in db.session.execute(
+        select(table.c.id, table.c.task_id, table.c.student_id, table.c.kind, table.c.due_date, table.c.notified_at)
+        .join(Task, Task.id == table.c.task_id).where(*candidate)
+    )}
+    # Rows whose task was completed, moved past the horizon or deleted
+    removed = db.session.execute(
+        select(table.c.id, table.c.student_id).outerjoin(Task, Task.id == table.c.task_id)
+        .where(or_(Task.id.is_(None), Task.status.notin_(OPEN_STATUSES), Task.due_date > horizon))
+    ).all()
+
+    now = datetime.utcnow()
+    added, updated, students = [], [], set()
+    for task_id, (student_id, due_date, kind) in found.items():
+        row = existing.get(task_id)
+        if row is None:
+            added.append({'task_id': task_id, 'student_id': student_id, 'kind': kind,
+                          'due_date': due_date, 'detected_at': now})
+            students.add(student_id)
+        elif (row.student_id, row.due_date, row.kind) != (student_id, due_date, kind):
+            # A task that changed kind or student is reminded of again
+            renotify = (row.student_id, row.kind) != (student_id, kind)
+            updated.append({'row_id': row.id, 'student_id': student_id, 'due_date': due_date, 'kind': kind,
+                            'notified_at': None if renotify else row.notified_at})
+            students.update((row.student_id, student_id))
+    students.update(row.student_id for row in removed)
+
+    if added:
+        db.session.execute(insert(table), added)
+    if updated:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('row_id'))
+            .values(student_id=bindparam('student_id'), due_date=bindparam('due_date'),
+                    kind=bindparam('kind'), notified_at=bindparam('notified_at')),
+            updated,
+        )
+    ids = [row.id for row in removed]
+    for start in range(0, len(ids), 500):
+        db.session.execute(delete(table).where(table.c.id.in_(ids[start:start + 500])))
+    if students:
+        # The student dashboards list their deadlines
+        mark_changed(db.session, *map(student_scope, students))
+    db.session.commit()
+
+    kinds = [kind for _, _, kind in found.values()]
+    return {
+        'overdue': kinds.count('overdue'),
+        'due_soon': kinds.count('due_soon'),
+        'added': len(added),
+        'updated': len(updated),
+        'removed': len(removed),
+    }
+
+
+def open_deadlines():
+    """Deadline rows whose task is still open; a task completed since the last scan is left out."""
+    return (select(TaskDeadline, Task, User)
+            .join(Task, Task.id == TaskDeadline.task_id)
+            .join(User, User.id == TaskDeadline.student_id)
+            .where(Task.status.in_(OPEN_STATUSES)))
+
+
+def deadline_counts(cohort_id=None):
+    """Number of open overdue and due-soon tasks and of reminders not sent yet,
+    of every cohort or of the tasks of ``cohort_id``."""
+    table = TaskDeadline.__table__
+    source, criteria = table, []
+    if cohort_id is not None:
+        # The deadline table is small, so each row's task is looked up by id
+        source = table.join(Task, Task.id == table.c.task_id)
+        criteria.append(Task.cohort_id == cohort_id)
+    counts = dict(db.session.execute(
+        select(table.c.kind, func.count()).select_from(source).where(*criteria).group_by(table.c.kind)
+    ).all())
+    counts = {kind: counts.get(kind, 0) for kind in DEADLINE_KINDS}
+    counts['unsent'] = db.session.scalar(
+        select(func.count()).select_from(source).where(table.c.notified_at.is_(None), *criteria)
+    )
+    return counts
+
+
+def student_deadlines(student_id):
+    """A student's open overdue and due-soon tasks, soonest due first."""
+    return db.session.execute(
+        open_deadlines().where(TaskDeadline.student_id == student_id).order_by(TaskDeadline.due_date)
+    ).all()
+
+
+def send_deadline_reminders(job=None):
+    """Mail every active student one message about their tasks without a reminder yet.
+
+    A student's deadlines are marked as notified right after their mail
+    is sent, so a retry after a failure only mails the others. Returns the
+    number of mails and of tasks reminded of.
+    """
+    table = TaskDeadline.__table__
+    rows = db.session.execute(
+        select(table.c.id, table.c.kind, table.c.due_date, Task.title,
+               User.id.label('student_id'), User.email, User.full_name)
+        .join(Task, Task.id == table.c.task_id)
+        .join(User, User.id == table.c.student_id)
+        .where(table.c.notified_at.is_(None), Task.status.in_(OPEN_STATUSES), User.is_active == True)
+        .order_by(table.c.student_id, table.c.due_date)
+    ).all()
+    db.session.commit()
+    by_student = defaultdict(list)
+    for row in rows:
+        by_student[row.student_id].append(row)
+
+    today = date.today()
+    with mail_sender() as send:
+        for count, deadlines in enumerate(by_student.values(), start=1):
+            overdue = sum(1 for deadline in deadlines if deadline.kind == 'overdue')
+            if overdue:
+                subject = f"{overdue} overdue task{'s' if overdue != 1 else ''}"
+            else:
+                subject = f"{len(deadlines)} task{'s' if len(deadlines) != 1 else ''} due soon"
+            send(deadlines[0].email, subject,
+                 render_template('email/deadline_reminder.txt', deadlines=deadlines, today=today))
+            db.session.execute(update(table).where(table.c.id.in_([deadline.id for deadline in deadlines]))
+                               .values(notified_at=datetime.utcnow()))
+            db.session.commit()
+            if job and count % PROGRESS_EVERY == 0:
+                job.progress(count * 100 // len(by_student), f'{count} of {len(by_student)} students mailed')
+    return {'mails': len(by_student), 'tasks': len(rows)}
+
+
+@job_handler('scan_deadlines')
+def scan_deadlines_job(job, payload):
+    """Scheduled scan; queues the reminder mails when it found new deadlines."""
+    config = current_app.config
+    result = scan_deadlines(date.today(), config['DEADLINE_DUE_SOON_DAYS'])
+    if config['DEADLINE_REMINDERS'] and (result['added'] or result['updated']):
+        enqueue('deadline_reminders')
+    return result
+
+
+@job_handler('deadline_reminders')
+def deadline_reminders_job(job, payload):
+    return send_deadline_reminders(job)
+
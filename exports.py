@@ -0,0 +1,190 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from sqlalchemy import select, func
+from sqlalchemy.orm import aliased
+
+from models import db, User, Task, Attendance, ArchivedAttendance, ArchivedTask
+from jobs import job_handler, job_file_path, new_job_file
+from search import apply_search, like_search, SEARCH_INDEXES
+
+# Rows are pulled from the database in batches of this size while streaming
+EXPORT_BATCH_SIZE = 1000
+# An export job reports its progress every this many rows
+PROGRESS_EVERY = 10000
+
+ATTENDANCE_FIELDS = ['id', 'date', 'student_id', 'student_username', 'student_name',
+                     'status', 'remarks', 'marked_by_name', 'marked_at']
+TASK_FIELDS = ['id', 'title', 'description', 'student_id', 'student_username', 'student_name',
+               'due_date', 'status', 'priority', 'created_by_name', 'created_at', 'updated_at']
+
+
+def attendance_export_query(date_from=None, date_to=None, student_id=None, status=None, cohort_id=None, term=None):
+    # A term's records are read from its archive
+    records = ArchivedAttendance if term else Attendance
+    student = aliased(User)
+    marker = aliased(User)
+    stmt = (
+        select(records.id, records.date, records.student_id,
+               student.username.label('student_username'),
+               student.full_name.label('student_name'),
+               records.status, records.remarks,
+               marker.full_name.label('marked_by_name'),
+               records.marked_at)
+        .join(student, records.student_id == student.id)
+        .join(marker, records.marked_by == marker.id)
+    )
+    if date_from:
+        stmt = stmt.where(records.date >= date_from)
+    if date_to:
+        stmt = stmt.where(records.date <= date_to)
+    if student_id:
+        stmt = stmt.where(records.student_id == student_id)
+    if cohort_id:
+        stmt = stmt.where(records.cohort_id == cohort_id)
+    if status:
+        stmt = stmt.where(records.status == status)
+    if term:
+        stmt = stmt.where(records.term == term)
+    return stmt.order_by(records.date, records.id)
+
+
+def task_export_query(date_from=None, date_to=None, student_id=None, status=None, priority=None, q=None,
+                      cohort_id=None, term=None):
+    tasks = ArchivedTask if term else Task
+    student = aliased(User)
+    creator = aliased(User)
+    stmt = (
+        select(tasks.id, tasks.title, tasks.description, tasks.student_id,
+               student.username.label('student_username'),
+               student.full_name.label('student_name'),
+               tasks.due_date, tasks.status, tasks.priority,
+               creator.full_name.label('created_by_name'),
+               tasks.created_at, tasks.updated_at)
+        .join(student, tasks.student_id == student.id)
+        .join(creator, tasks.created_by == creator.id)
+    )
+    if date_from:
+        stmt = stmt.where(tasks.due_date >= date_from)
+    if date_to:
+        stmt = stmt.where(tasks.due_date <= date_to)
+    if student_id:
+        stmt = stmt.where(tasks.student_id == student_id)
+    if cohort_id:
+        stmt = stmt.where(tasks.cohort_id == cohort_id)
+    if status:
+        stmt = stmt.where(tasks.status == status)
+    if priority:
+        stmt = stmt.where(tasks.priority == priority)
+    if q:
+        # Archived tasks are not in the search index
+        stmt = apply_search(stmt, Task, q) if tasks is Task else like_search(stmt, tasks, SEARCH_INDEXES[Task][1], q)
+    return stmt.order_by(tasks.due_date, tasks.id)
+
+
+def stream_rows(stmt):
+    """Yield result rows as dicts without loading the whole result set.
+
+    ``stream_results`` asks the driver for a server-side cursor where one is
+    available and ``yield_per`` keeps only one batch in memory at a time.
+    """
+    result = db.session.execute(
+        stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    )
+    try:
+        for row in result.mappings():
+            yield dict(row)
+    finally:
+        result.close()
+
+
+def _serialize(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+def to_csv(rows, fieldnames):
+    # Each chunk is one CSV line so bytes go out as rows are read
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    yield _drain(buffer)
+    for row in rows:
+        writer.writerow({key: _serialize(value) for key, value in row.items()})
+        yield _drain(buffer)
+
+
+def to_jsonl(rows):
+    for row in rows:
+        yield json.dumps({key: _serialize(value) for key, value in row.items()}) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_query(kind, **filters):
+    """Return the query and field names of an attendance or task export."""
+    if kind == 'attendance':
+        return attendance_export_query(**filters), ATTENDANCE_FIELDS
+    return task_export_query(**filters), TASK_FIELDS
+
+
+def export_chunks(rows, fieldnames, fmt):
+    if fmt == 'csv':
+        return to_csv(rows, fieldnames)
+    return to_jsonl(rows)
+
+
+def export_stream(kind, fmt, **filters):
+    """Return a generator of text chunks for an attendance or task export."""
+    stmt, fieldnames = export_query(kind, **filters)
+    return export_chunks(stream_rows(stmt), fieldnames, fmt)
+
+
+def export_filename(kind, fmt):
+    return f"{kind}-{date.today().strftime('%Y-%m-%d')}.{fmt}"
+
+
+def _with_progress(rows, total, job):
+    for count, row in enumerate(rows, start=1):
+        yield row
+        if count % PROGRESS_EVERY == 0:
+            job.progress(count * 100 // total, f'{count} of {total} rows written')
+
+
+@job_handler('export')
+def export_job(job, payload):
+    """Write an export to a file for download; dates in the filters are ISO strings."""
+    filters = {key: date.fromisoformat(value) if key.startswith('date_') else value
+               for key, value in payload['filters'].items() if value}
+    stmt, fieldnames = export_query(payload['kind'], **filters)
+    total = db.session.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+    name = new_job_file('.' + payload['format'])
+    path = job_file_path(name)
+    try:
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            rows = _with_progress(stream_rows(stmt), total or 1, job)
+            for chunk in export_chunks(rows, fieldnames, payload['format']):
+                output.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return {
+        'file': name,
+        'filename': export_filename(payload['kind'], payload['format']),
+        'mimetype': EXPORT_FORMATS[payload['format']],
+        'rows': total,
+    }
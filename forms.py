@@ -1,9 +1,17 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, TextAreaField, SelectField, DateField, SubmitField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError
-from models import User
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, PasswordField, TextAreaField, SelectField, SelectMultipleField, DateField, SubmitField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange, Optional
+from wtforms.widgets import HiddenInput
+from models import User, Cohort
 from datetime import date
 
+# Student fields are filled in by the autocomplete picker, so the form only
+# sees an id and checks it here instead of against a list of every student
+def active_student(form, field):
+    if not User.query.filter_by(id=field.data, role='student', is_active=True).first():
+        raise ValidationError('Choose an active student.')
+
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=4, max=20)])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -16,6 +24,8 @@ class StudentRegistrationForm(FlaskForm):
     password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
     password2 = PasswordField('Confirm Password', 
                              validators=[DataRequired(), EqualTo('password')])
+    # Choices (0 = no cohort) are filled in by the view
+    cohort_id = SelectField('Cohort', coerce=int, choices=[])
     submit = SubmitField('Create Student Account')
     
     def validate_username(self, username):
@@ -34,13 +44,26 @@ class TaskForm(FlaskForm):
     due_date = DateField('Due Date', validators=[DataRequired()], default=date.today)
     priority = SelectField('Priority', choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], 
                           default='medium')
-    student_id = SelectField('Assign to Student', coerce=int, validators=[DataRequired()])
+    student_id = IntegerField('Assign to Student', widget=HiddenInput(),
+                              validators=[DataRequired('Choose a student.'), active_student])
     submit = SubmitField('Create Task')
     
     def validate_due_date(self, due_date):
         if due_date.data < date.today():
             raise ValidationError('Due date cannot be in the past.')
 
+class BulkTaskForm(TaskForm):
+    # Same task fields as TaskForm, assigned to many students at once;
+    # bulk_assign_task skips ids that are not active students
+    student_id = None
+    student_ids = SelectMultipleField('Assign to Students', coerce=int, choices=[], validate_choice=False)
+    assign_all = BooleanField('Assign to all active students')
+    submit = SubmitField('Assign Task')
+    
+    def validate_student_ids(self, student_ids):
+        if not student_ids.data and not self.assign_all.data:
+            raise ValidationError('Select at least one student or assign to all active students.')
+
 class TaskUpdateForm(FlaskForm):
     status = SelectField('Status', 
                         choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed')],
@@ -49,13 +72,54 @@ class TaskUpdateForm(FlaskForm):
 
 class AttendanceForm(FlaskForm):
     date = DateField('Date', validators=[DataRequired()], default=date.today)
-    student_id = SelectField('Student', coerce=int, validators=[DataRequired()])
+    student_id = IntegerField('Student', widget=HiddenInput(),
+                              validators=[DataRequired('Choose a student.'), active_student])
     status = SelectField('Status', 
                         choices=[('present', 'Present'), ('absent', 'Absent'), ('late', 'Late')],
                         validators=[DataRequired()])
     remarks = StringField('Remarks', validators=[Length(max=200)])
     submit = SubmitField('Mark Attendance')
 
+class BulkAttendanceForm(FlaskForm):
+    # Per-student statuses are posted as status_<id> / remarks_<id> fields
+    date = DateField('Date', validators=[DataRequired()], default=date.today)
+    overwrite = BooleanField('Overwrite existing records')
+    submit = SubmitField('Save Attendance')
+
+class CohortForm(FlaskForm):
+    name = StringField('Name', validators=[DataRequired(), Length(min=2, max=100)])
+    term = StringField('Term', validators=[Optional(), Length(max=50)])
+    submit = SubmitField('Create Cohort')
+    
+    def validate_name(self, name):
+        if Cohort.query.filter_by(name=name.data).first():
+            raise ValidationError('A cohort with this name already exists.')
+
+class AssignCohortForm(FlaskForm):
+    # Students come from the picker; choices (0 = no cohort) are filled in by the view
+    student_ids = SelectMultipleField('Students', coerce=int, choices=[], validate_choice=False,
+                                      validators=[DataRequired('Choose at least one student.')])
+    cohort_id = SelectField('Move to', coerce=int, choices=[])
+    submit = SubmitField('Move Students')
+
+class ArchiveTermForm(FlaskForm):
+    # Choices are the closed cohort terms, filled in by the view
+    term = SelectField('Term', choices=[])
+    submit = SubmitField('Archive Term')
+
+class CloseTermForm(FlaskForm):
+    # Choices are the cohort terms still open, filled in by the view
+    term = SelectField('Term', choices=[])
+    ends_on = DateField('Last Day', validators=[DataRequired()])
+    submit = SubmitField('Close Term')
+
+class ImportForm(FlaskForm):
+    kind = SelectField('Import', choices=[('students', 'Students'), ('tasks', 'Tasks'), ('attendance', 'Attendance History')])
+    file = FileField('CSV File', validators=[FileRequired(), FileAllowed(['csv'], 'Only CSV files are allowed.')])
+    batch_size = IntegerField('Batch Size', default=1000, validators=[NumberRange(min=1, max=50000)])
+    default_password = PasswordField('Default Password (students without one)', validators=[Optional(), Length(min=6)])
+    submit = SubmitField('Import')
+
 class ChangePasswordForm(FlaskForm):
     current_password = PasswordField('Current Password', validators=[DataRequired()])
     new_password = PasswordField('New Password', validators=[DataRequired(), Length(min=6)])
@@ -0,0 +1,47 @@
+import os
+
+from config import Config
+
+# Production server profile. gunicorn reads this file from the working
+# directory, so `gunicorn` on its own serves main:app without debug mode,
+# sized from Config (SERVER_* environment variables). `python main.py`
+# remains the development server.
+
+wsgi_app = 'main:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+worker_class = Config.SERVER_WORKER_CLASS
+workers = Config.SERVER_WORKERS
+threads = Config.SERVER_THREADS
+worker_connections = Config.SERVER_WORKER_CONNECTIONS
+timeout = Config.SERVER_TIMEOUT
+keepalive = Config.SERVER_KEEPALIVE
+max_requests = Config.SERVER_MAX_REQUESTS
+# Spread the restarts so workers are not all replaced at once
+max_requests_jitter = Config.SERVER_MAX_REQUESTS // 10
+
+
+def on_starting(server):
+    # server.cfg.workers includes a -w given on the command line
+    memory_caches = [name for name in ('PAGE_CACHE', 'IDENTITY_CACHE') if getattr(Config, name) == 'memory']
+    if server.cfg.workers > 1 and memory_caches:
+        raise RuntimeError(
+            f"The 'memory' cache of {' and '.join(memory_caches)} is private to each worker, so "
+            f"{server.cfg.workers} workers would serve stale pages and users. Run one worker "
+            "(SERVER_WORKERS=1, raising SERVER_THREADS instead) or set the caches to 'redis' or 'none'."
+        )
+    if worker_class == 'gevent' and Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        server.log.warning('SQLite calls block the gevent loop; use the gthread worker class with SQLite.')
+
+
+def post_fork(server, worker):
+    # psycopg2 waits for PostgreSQL in C; psycogreen makes it yield to other
+    # requests of the worker instead
+    if worker_class != 'gevent' or Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen is not installed; every database query blocks the whole gevent worker.')
+    else:
+        patch_psycopg()
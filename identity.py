@@ -0,0 +1,93 @@
+from datetime import datetime
+from itertools import chain
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+from caching import make_cache
+
+# Columns kept in the cache. password_hash is left out on purpose; it is
+# loaded from the database only when a password is actually checked.
+CACHED_COLUMNS = ('id', 'username', 'email', 'role', 'full_name', 'created_at', 'is_active', 'cohort_id',
+                  'updated_at')
+DATETIME_COLUMNS = ('created_at', 'updated_at')
+
+
+def init_identity_cache(app):
+    cache = make_cache(app.config['IDENTITY_CACHE'], app.config['IDENTITY_CACHE_URL'],
+                       app.config['IDENTITY_CACHE_TTL'], app.config['IDENTITY_CACHE_SIZE'], prefix='identity:')
+    if cache is not None:
+        app.extensions['identity_cache'] = cache
+
+
+def _to_cache(user):
+    data = {column: getattr(user, column) for column in CACHED_COLUMNS}
+    for column in DATETIME_COLUMNS:
+        data[column] = data[column].isoformat() if data[column] else None
+    return data
+
+
+def _from_cache(data):
+    data = dict(data)
+    for column in DATETIME_COLUMNS:
+        data[column] = datetime.fromisoformat(data[column]) if data.get(column) else None
+    return data
+
+
+def load_user(user_id):
+    """Return the User for ``user_id``, from the identity cache when possible.
+
+    A cached user is attached to the session with ``merge(load=False)``, so
+    it behaves like a loaded row (changes to it are saved on commit) without
+    a query being run.
+    """
+    cache = current_app.extensions.get('identity_cache')
+    if cache is None:
+        return db.session.get(User, user_id)
+
+    data = cache.get(user_id)
+    if data is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.set(user_id, _to_cache(user))
+        return user
+
+    user = User(**_from_cache(data))
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    cache = current_app.extensions.get('identity_cache')
+    if cache is not None:
+        cache.delete(user_id)
+
+
+def mark_users_changed(session, user_ids):
+    # Invalidated when the session commits (see below); Core updates of
+    # users that bypass the ORM flush call this themselves
+    session.info.setdefault('changed_user_ids', set()).update(user_ids)
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_changed_users(session, flush_context):
+    # Profile edits, password changes and (de)activation all flush a dirty
+    # User; remember the ids until the transaction commits
+    changed = {obj.id for obj in chain(session.dirty, session.deleted) if isinstance(obj, User)}
+    if changed:
+        mark_users_changed(session, changed)
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed_users(session):
+    # Invalidate only after commit so no other worker re-caches the old row
+    user_ids = session.info.pop('changed_user_ids', ())
+    if user_ids and has_app_context():
+        for user_id in user_ids:
+            invalidate_user(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
@@ -0,0 +1,329 @@
+import csv
+import io
+import os
+from datetime import datetime
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy import select, insert
+
+from models import db, Cohort, User, Task, Attendance
+from summaries import STATUSES, apply_attendance_deltas
+from passwords import hash_password, hash_passwords
+from caching import mark_changed, student_scope, cohort_scope
+from changes import record_changes
+from cohorts import stamp_cohorts
+from jobs import job_handler, job_file_path
+
+DEFAULT_BATCH_SIZE = 1000
+IMPORT_KINDS = ('students', 'tasks', 'attendance')
+# Rejected rows kept in the result of an import job
+MAX_REPORTED_ERRORS = 1000
+# An import job reports its progress every this many rows
+PROGRESS_EVERY = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    def add_error(self, line, messages):
+        self.errors.append({'line': line, 'errors': messages})
+
+    def to_dict(self):
+        return {'imported': self.imported, 'errors': sorted(self.errors, key=lambda e: e['line'])}
+
+
+def csv_rows(stream):
+    """Yield (line number, row dict) pairs from a binary or text CSV stream."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(stream)
+    # Line 1 is the header, so data starts on line 2
+    for line, row in enumerate(reader, start=2):
+        # Extra unnamed columns are collected under the None key and ignored
+        yield line, {key.strip(): (value or '').strip() for key, value in row.items() if key is not None}
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def _flush(model, batch, report):
+    # One executemany INSERT and one commit per batch
+    if batch:
+        if model is Task:
+            cohort_scopes = stamp_cohorts(batch)
+            table = model.__table__
+            created = db.session.execute(insert(table).returning(table.c.id, table.c.student_id), batch).all()
+            record_changes(db.session.connection(), 'task', 'insert', created)
+            mark_changed(db.session, 'tasks', *cohort_scopes, *{student_scope(row['student_id']) for row in batch})
+        else:
+            db.session.execute(insert(model.__table__), batch)
+            mark_changed(db.session, 'students', *{cohort_scope(row['cohort_id']) for row in batch if row['cohort_id']})
+        db.session.commit()
+        report.imported += len(batch)
+        batch.clear()
+
+
+def import_students(rows, batch_size=DEFAULT_BATCH_SIZE, default_password=None, default_hash=None):
+    """Import student accounts from ``username,email,full_name[,password][,cohort]`` rows.
+
+    Uniqueness is checked against sets of the existing usernames and emails
+    loaded once up front, not with a query per row. Rows without a password
+    get ``default_password``, hashed only once for the whole import; the
+    other passwords of each batch are hashed in parallel on a process pool.
+    ``default_hash`` is the already hashed form of a default password.
+    ``cohort`` is the name of an existing cohort.
+    """
+    report = ImportReport()
+    existing = db.session.execute(select(User.username, User.email)).all()
+    cohorts = dict(db.session.execute(select(Cohort.name, Cohort.id)).all())
+    usernames = {row.username for row in existing}
+    emails = {row.email for row in existing}
+    if default_password:
+        default_hash = hash_password(default_password)
+    now = datetime.utcnow()
+
+    batch = []
+    for line, row in rows:
+        errors = []
+        username = row.get('username', '')
+        email = row.get('email', '')
+        full_name = row.get('full_name', '')
+        password = row.get('password', '')
+        cohort = row.get('cohort', '')
+
+        if not 4 <= len(username) <= 20:
+            errors.append('Username must be between 4 and 20 characters.')
+        elif username in usernames:
+            errors.append('Username already exists.')
+        try:
+            validate_email(email, check_deliverability=False)
+        except EmailNotValidError:
+            errors.append('Invalid email address.')
+        else:
+            if email in emails:
+                errors.append('Email already registered.')
+        if not 2 <= len(full_name) <= 100:
+            errors.append('Full name must be between 2 and 100 characters.')
+        if password and len(password) < 6:
+            errors.append('Password must be at least 6 characters.')
+        elif not password and not default_hash:
+            errors.append('Password is required when no default password is given.')
+        if cohort and cohort not in cohorts:
+            errors.append('Unknown cohort.')
+
+        if errors:
+            report.add_error(line, errors)
+            continue
+
+        usernames.add(username)
+        emails.add(email)
+        batch.append({
+            'username': username,
+            'email': email,
+            'full_name': full_name,
+            'password_hash': default_hash,
+            'password': password or None,
+            'role': 'student',
+            'is_active': True,
+            'cohort_id': cohorts.get(cohort),
+            'created_at': now,
+        })
+        if len(batch) >= batch_size:
+            _flush_students(batch, report)
+
+    _flush_students(batch, report)
+    return report
+
+
+def _flush_students(batch, report):
+    # Rows carry the plain password until here so a whole batch is hashed at once
+    to_hash = [(row, row.pop('password')) for row in batch]
+    to_hash = [(row, password) for row, password in to_hash if password]
+    hashes = hash_passwords(password for _, password in to_hash)
+    for (row, _), password_hash in zip(to_hash, hashes):
+        row['password_hash'] = password_hash
+    _flush(User, batch, report)
+
+
+def _student_ids_by_username():
+    return dict(db.session.execute(
+        select(User.username, User.id).where(User.role == 'student')
+    ).all())
+
+
+def import_tasks(rows, created_by, batch_size=DEFAULT_BATCH_SIZE):
+    """Import tasks from ``student_username,title,description,due_date,priority,status`` rows."""
+    report = ImportReport()
+    student_ids = _student_ids_by_username()
+    now = datetime.utcnow()
+
+    batch = []
+    for line, row in rows:
+        errors = []
+        student_id = student_ids.get(row.get('student_username', ''))
+        title = row.get('title', '')
+        description = row.get('description') or None
+        due_date = _parse_date(row.get('due_date', ''))
+        priority = row.get('priority') or 'medium'
+        status = row.get('status') or 'pending'
+
+        if student_id is None:
+            errors.append('Unknown student username.')
+        if not 5 <= len(title) <= 200:
+            errors.append('Title must be between 5 and 200 characters.')
+        if description and len(description) > 500:
+            errors.append('Description cannot be longer than 500 characters.')
+        if due_date is None:
+            errors.append('Due date must be given as YYYY-MM-DD.')
+        if priority not in ('low', 'medium', 'high'):
+            errors.append('Priority must be low, medium or high.')
+        if status not in ('pending', 'in_progress', 'completed'):
+            errors.append('Status must be pending, in_progress or completed.')
+
+        if errors:
+            report.add_error(line, errors)
+            continue
+
+        batch.append({
+            'title': title,
+            'description': description,
+            'due_date': due_date,
+            'priority': priority,
+            'status': status,
+            'student_id': student_id,
+            'created_by': created_by,
+            'created_at': now,
+            'updated_at': now,
+        })
+        if len(batch) >= batch_size:
+            _flush(Task, batch, report)
+
+    _flush(Task, batch, report)
+    return report
+
+
+def import_attendance(rows, marked_by, batch_size=DEFAULT_BATCH_SIZE):
+    """Import historical attendance from ``student_username,date,status,remarks`` rows.
+
+    Records that already exist for the same student and date are reported as
+    errors; existing pairs are looked up with one query per batch.
+    """
+    report = ImportReport()
+    student_ids = _student_ids_by_username()
+    seen = set()
+
+    pending = []
+    for line, row in rows:
+        errors = []
+        student_id = student_ids.get(row.get('student_username', ''))
+        day = _parse_date(row.get('date', ''))
+        status = row.get('status', '')
+        remarks = row.get('remarks') or None
+
+        if student_id is None:
+            errors.append('Unknown student username.')
+        if day is None:
+            errors.append('Date must be given as YYYY-MM-DD.')
+        if status not in STATUSES:
+            errors.append('Status must be present, absent or late.')
+        if remarks and len(remarks) > 200:
+            errors.append('Remarks cannot be longer than 200 characters.')
+        if not errors and (student_id, day) in seen:
+            errors.append('Duplicate record for this student and date in the file.')
+
+        if errors:
+            report.add_error(line, errors)
+            continue
+
+        seen.add((student_id, day))
+        pending.append((line, {
+            'date': day,
+            'student_id': student_id,
+            'status': status,
+            'remarks': remarks,
+            'marked_by': marked_by,
+        }))
+        if len(pending) >= batch_size:
+            _flush_attendance(pending, report)
+
+    _flush_attendance(pending, report)
+    return report
+
+
+def _flush_attendance(pending, report):
+    if not pending:
+        return
+    student_ids = list({values['student_id'] for _, values in pending})
+    dates = [values['date'] for _, values in pending]
+    existing = set(db.session.execute(
+        select(Attendance.student_id, Attendance.date).where(
+            Attendance.student_id.in_(student_ids),
+            Attendance.date >= min(dates),
+            Attendance.date <= max(dates),
+        )
+    ).all())
+
+    batch, deltas = [], {}
+    for line, values in pending:
+        if (values['student_id'], values['date']) in existing:
+            report.add_error(line, ['Attendance already marked for this student on this date.'])
+            continue
+        batch.append(values)
+        deltas[(values['date'], values['student_id'], values['status'])] = 1
+
+    if batch:
+        cohort_scopes = stamp_cohorts(batch)
+        connection = db.session.connection()
+        table = Attendance.__table__
+        created = connection.execute(insert(table).returning(table.c.id, table.c.student_id), batch).all()
+        # Core inserts bypass the ORM flush hooks, so update the rollups and change log here
+        apply_attendance_deltas(connection, deltas)
+        record_changes(connection, 'attendance', 'insert', created)
+        mark_changed(db.session, 'attendance', *cohort_scopes, *{student_scope(row['student_id']) for row in batch})
+        db.session.commit()
+        report.imported += len(batch)
+    pending.clear()
+
+
+def run_import(kind, rows, user_id, batch_size=DEFAULT_BATCH_SIZE, default_password=None, default_hash=None):
+    if kind == 'students':
+        return import_students(rows, batch_size, default_password, default_hash)
+    if kind == 'tasks':
+        return import_tasks(rows, user_id, batch_size)
+    return import_attendance(rows, user_id, batch_size)
+
+
+def _with_progress(rows, stream, size, job):
+    # Progress is the share of the file read so far
+    for count, item in enumerate(rows, start=1):
+        yield item
+        if count % PROGRESS_EVERY == 0:
+            job.progress(stream.tell() * 100 // size, f'{count} rows read')
+
+
+@job_handler('import', max_attempts=1)
+def import_job(job, payload):
+    """Import an uploaded CSV file in the background, then delete it.
+
+    Attempted only once: a retry would import the batches that were
+    already committed a second time.
+    """
+    path = job_file_path(payload['file'])
+    try:
+        with open(path, 'rb') as stream:
+            rows = _with_progress(csv_rows(stream), stream, os.path.getsize(path) or 1, job)
+            report = run_import(payload['kind'], rows, job.created_by, payload['batch_size'],
+                                default_hash=payload.get('default_hash')).to_dict()
+    finally:
+        os.remove(path)
+    return {
+        'kind': payload['kind'],
+        'imported': report['imported'],
+        'rejected': len(report['errors']),
+        'errors': report['errors'][:MAX_REPORTED_ERRORS],
+    }
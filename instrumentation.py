@@ -0,0 +1,160 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestProfile:
+    def __init__(self, slow_query_count):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.slow_query_count = slow_query_count
+        self.slowest = []  # (duration, statement), longest first
+
+    def add_query(self, statement, duration):
+        self.query_count += 1
+        self.sql_time += duration
+        if len(self.slowest) < self.slow_query_count or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, ' '.join(statement.split())))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.slow_query_count:]
+
+
+class EndpointMetrics:
+    """Recent request samples per endpoint, kept in memory of this process."""
+
+    def __init__(self, history=1000):
+        self.history = history
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.history))
+
+    def record(self, endpoint, duration, query_count, sql_time):
+        with self.lock:
+            self.samples[endpoint].append((duration, query_count, sql_time))
+
+    def summary(self):
+        rows = []
+        with self.lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self.samples.items()}
+        for endpoint, samples in sorted(snapshot.items()):
+            durations = sorted(sample[0] for sample in samples)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'p50': percentile(durations, 50),
+                'p95': percentile(durations, 95),
+                'p99': percentile(durations, 99),
+                'avg_queries': sum(sample[1] for sample in samples) / len(samples),
+                'max_queries': max(sample[1] for sample in samples),
+                'avg_sql_ms': sum(sample[2] for sample in samples) / len(samples) * 1000,
+            })
+        return rows
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list, in milliseconds
+    if not sorted_values:
+        return 0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index] * 1000
+
+
+def _current_profile():
+    if has_request_context():
+        return g.get('profile')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile() is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    if profile is not None and conn.info.get('query_start'):
+        profile.add_query(statement, time.perf_counter() - conn.info['query_start'].pop())
+
+
+def init_instrumentation(app):
+    """Register per-request SQL and template profiling when PROFILING_ENABLED is set.
+
+    Every profiled response gets a ``Server-Timing`` header and a structured
+    log line, and its timings are added to ``app.extensions['metrics']``
+    for the ``/admin/metrics`` page. Endpoints listed in ``QUERY_BUDGETS``
+    (or any endpoint, with ``QUERY_BUDGET_DEFAULT``) that run more queries
+    than allowed are logged, or raise ``QueryBudgetExceeded`` when
+    ``QUERY_BUDGET_RAISE`` is set, which makes the offending test fail.
+    """
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    metrics = EndpointMetrics(app.config['PROFILING_HISTORY'])
+    app.extensions['metrics'] = metrics
+    if app.logger.level == logging.NOTSET:
+        app.logger.setLevel(logging.INFO)
+
+    def start_template(sender, template, context, **extra):
+        if _current_profile() is not None:
+            g.template_started = time.perf_counter()
+
+    def finish_template(sender, template, context, **extra):
+        profile = _current_profile()
+        if profile is not None and 'template_started' in g:
+            profile.template_time += time.perf_counter() - g.pop('template_started')
+
+    before_render_template.connect(start_template, app, weak=False)
+    template_rendered.connect(finish_template, app, weak=False)
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint != 'static':
+            g.profile = RequestProfile(app.config['PROFILING_SLOW_QUERIES'])
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+
+        duration = time.perf_counter() - profile.started
+        endpoint = request.endpoint or 'unknown'
+        metrics.record(endpoint, duration, profile.query_count, profile.sql_time)
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'sql;dur={profile.sql_time * 1000:.2f};desc="{profile.query_count} queries"',
+            f'tpl;dur={profile.template_time * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ])
+        app.logger.info(json.dumps({
+            'event': 'request_profile',
+            'endpoint': endpoint,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'query_count': profile.query_count,
+            'sql_ms': round(profile.sql_time * 1000, 2),
+            'template_ms': round(profile.template_time * 1000, 2),
+            'slowest': [{'ms': round(d * 1000, 2), 'sql': sql[:200]} for d, sql in profile.slowest],
+        }))
+
+        budget = app.config['QUERY_BUDGETS'].get(endpoint, app.config['QUERY_BUDGET_DEFAULT'])
+        if budget is not None and profile.query_count > budget:
+            message = f'{endpoint} ran {profile.query_count} queries (budget {budget})'
+            if app.config['QUERY_BUDGET_RAISE']:
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+
+        return response
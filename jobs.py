@@ -0,0 +1,363 @@
+import json
+import os
+import signal
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, insert, update, func, exists, literal
+
+from models import db, Job
+
+# The queue is the job table itself: workers claim a job with a conditional
+# UPDATE, so any number of web processes and `flask worker` processes can
+# share it without a broker.
+
+# kind -> (function taking a JobContext and the payload, max attempts)
+JOB_HANDLERS = {}
+
+
+def job_handler(kind, max_attempts=3):
+    """Register a function as the handler of a job kind.
+
+    The handler gets a ``JobContext`` and the payload dict, and returns a
+    JSON-serializable result (or None). An exception fails the attempt;
+    it is retried until ``max_attempts`` attempts have failed.
+    """
+    def register(func):
+        JOB_HANDLERS[kind] = (func, max_attempts)
+        return func
+    return register
+
+
+def _files_dir():
+    path = current_app.config['JOB_FILES_DIR'] or os.path.join(current_app.instance_path, 'jobs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def new_job_file(suffix):
+    # Jobs refer to their files by name only, never by a client-given path
+    return uuid.uuid4().hex + suffix
+
+
+def job_file_path(name):
+    return os.path.join(_files_dir(), os.path.basename(name))
+
+
+def enqueue(kind, payload=None, created_by=None, delay=0):
+    """Queue a job and commit; returns the Job.
+
+    Also wakes (or starts) this process's worker threads.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}.')
+    now = datetime.utcnow()
+    job = Job(kind=kind, payload=json.dumps(payload or {}), created_by=created_by,
+              max_attempts=JOB_HANDLERS[kind][1], created_at=now,
+              run_after=now + timedelta(seconds=delay))
+    db.session.add(job)
+    db.session.commit()
+    start_in_process_workers(current_app._get_current_object())
+    return job
+
+
+class JobContext:
+    """What a handler knows about the job it runs, and how it reports progress."""
+
+    def __init__(self, job, worker_id):
+        self.id = job.id
+        self.kind = job.kind
+        self.created_by = job.created_by
+        self.attempt = job.attempts
+        self.worker_id = worker_id
+
+    def progress(self, percent, message=None):
+        """Record progress (0-100) and an optional status line.
+
+        Written and committed on a connection of its own so pollers see it
+        at once. SQLite has a single writer, so call this between the
+        handler's own commits.
+        """
+        jobs = Job.__table__
+        values = {'progress': max(0, min(100, int(percent))), 'heartbeat_at': datetime.utcnow()}
+        if message is not None:
+            values['message'] = message[:200]
+        with db.engine.begin() as connection:
+            connection.execute(update(jobs).where(jobs.c.id == self.id, jobs.c.worker == self.worker_id,
+                                                  jobs.c.status == 'running').values(**values))
+
+
+def claim_job(worker_id):
+    """Move the oldest due queued job to running for ``worker_id``; returns its id or None.
+
+    Several workers may pick the same candidate, but only one of them gets
+    a row back from the conditional UPDATE; the others try the next one.
+    """
+    jobs = Job.__table__
+    while True:
+        now = datetime.utcnow()
+        job_id = db.session.scalar(
+            select(jobs.c.id).where(jobs.c.status == 'queued', jobs.c.run_after <= now)
+            .order_by(jobs.c.run_after, jobs.c.id).limit(1)
+        )
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(jobs).where(jobs.c.id == job_id, jobs.c.status == 'queued')
+            .values(status='running', worker=worker_id, attempts=jobs.c.attempts + 1,
+                    started_at=now, heartbeat_at=now, progress=0, message=None)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+
+
+def _finish(job_id, worker_id, **values):
+    # Only the worker still holding the job records its outcome; a job taken
+    # for stale meanwhile belongs to someone else now
+    jobs = Job.__table__
+    db.session.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.worker == worker_id,
+                                          jobs.c.status == 'running').values(**values))
+    db.session.commit()
+
+
+def run_job(job_id, worker_id):
+    """Run a claimed job's handler and record the outcome.
+
+    A failed attempt is queued again after JOB_RETRY_DELAY seconds, twice
+    as long after each further failure, until ``max_attempts`` is reached.
+    """
+    job = db.session.get(Job, job_id)
+    context = JobContext(job, worker_id)
+    attempts, max_attempts = job.attempts, job.max_attempts
+    payload = json.loads(job.payload)
+    handler = JOB_HANDLERS.get(job.kind)
+    db.session.commit()
+    try:
+        if handler is None:
+            raise LookupError(f'No handler for job kind {context.kind!r}.')
+        result = handler[0](context, payload)
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+        current_app.logger.warning('Job %s (%s) failed on attempt %s:\n%s', job_id, context.kind, attempts, error)
+        now = datetime.utcnow()
+        if attempts < max_attempts:
+            delay = current_app.config['JOB_RETRY_DELAY'] * 2 ** (attempts - 1)
+            _finish(job_id, worker_id, status='queued', worker=None, error=error,
+                    run_after=now + timedelta(seconds=delay))
+        else:
+            _finish(job_id, worker_id, status='failed', error=error, finished_at=now)
+    else:
+        _finish(job_id, worker_id, status='succeeded', progress=100, error=None,
+                result=json.dumps(result) if result is not None else None,
+                finished_at=datetime.utcnow())
+
+
+def heartbeat(worker_id):
+    jobs = Job.__table__
+    db.session.execute(update(jobs).where(jobs.c.worker == worker_id, jobs.c.status == 'running')
+                       .values(heartbeat_at=datetime.utcnow()))
+    db.session.commit()
+
+
+def requeue_stale_jobs(stale_after):
+    """Queue again the running jobs whose worker has not heartbeat for ``stale_after`` seconds.
+
+    Jobs with no attempts left fail instead. Returns the number requeued.
+    Every dispatcher calls this, so it only writes when a job is stale.
+    """
+    jobs = Job.__table__
+    now = datetime.utcnow()
+    stale = (jobs.c.status == 'running') & (jobs.c.heartbeat_at < now - timedelta(seconds=stale_after))
+    if db.session.scalar(select(jobs.c.id).where(stale).limit(1)) is None:
+        db.session.commit()
+        return 0
+    db.session.execute(update(jobs).where(stale, jobs.c.attempts >= jobs.c.max_attempts)
+                       .values(status='failed', worker=None, error='The worker running this job stopped.',
+                               finished_at=now))
+    requeued = db.session.execute(update(jobs).where(stale).values(status='queued', worker=None, run_after=now)).rowcount
+    db.session.commit()
+    return requeued
+
+
+def _active_job(kind):
+    jobs = Job.__table__
+    return select(jobs.c.id).where(jobs.c.kind == kind, jobs.c.status.in_(('queued', 'running')))
+
+
+def queue_if_idle(kind, run_after):
+    """Queue a job of ``kind`` due at ``run_after`` unless one is queued or running; True if queued.
+
+    A single INSERT ... SELECT ... WHERE NOT EXISTS, so processes scheduling
+    the same kind at once cannot both queue it.
+    """
+    jobs = Job.__table__
+    now = datetime.utcnow()
+    row = select(literal(kind), literal('{}'), literal('queued'), literal(0), literal(0),
+                 literal(JOB_HANDLERS[kind][1]), literal(run_after), literal(now)).where(~exists(_active_job(kind)))
+    queued = db.session.execute(insert(jobs).from_select(
+        ['kind', 'payload', 'status', 'progress', 'attempts', 'max_attempts', 'run_after', 'created_at'], row
+    )).rowcount
+    db.session.commit()
+    return bool(queued)
+
+
+def schedule_periodic_jobs(schedule):
+    """Queue the next run of each kind in ``schedule`` (kind -> seconds between runs).
+
+    A kind that is queued or running already is left alone without a
+    write; otherwise its next run is due ``interval`` seconds after the
+    previous one was.
+    """
+    jobs = Job.__table__
+    now = datetime.utcnow()
+    for kind, interval in schedule.items():
+        if db.session.scalar(_active_job(kind).limit(1)) is not None:
+            continue
+        last = db.session.scalar(select(func.max(jobs.c.run_after)).where(jobs.c.kind == kind))
+        queue_if_idle(kind, max(last + timedelta(seconds=interval), now) if last else now)
+    db.session.commit()
+
+
+class WorkerPool:
+    """Bounded pool of job threads fed by one dispatcher loop.
+
+    The dispatcher claims jobs only while a thread is free, so at most
+    ``concurrency`` jobs run here at once. Every JOB_HEARTBEAT seconds it
+    also heartbeats the jobs it holds, requeues jobs of dead workers and
+    queues the scheduled jobs of JOB_SCHEDULE.
+    """
+
+    def __init__(self, app, concurrency, poll_interval=None):
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval or app.config['JOB_POLL_INTERVAL']
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.pid = os.getpid()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.running = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix='job')
+
+    def run(self):
+        """Dispatch until ``stop()``, then wait for the running jobs to finish."""
+        last_heartbeat = 0
+        with self.app.app_context():
+            while not self.stopping.is_set():
+                try:
+                    now = datetime.utcnow().timestamp()
+                    if now - last_heartbeat >= self.app.config['JOB_HEARTBEAT']:
+                        if self.running:
+                            heartbeat(self.worker_id)
+                        requeue_stale_jobs(self.app.config['JOB_STALE_AFTER'])
+                        schedule_periodic_jobs(self.app.config['JOB_SCHEDULE'])
+                        last_heartbeat = now
+                    self._dispatch()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Job dispatcher error')
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+            self.executor.shutdown(wait=True)
+
+    def _dispatch(self):
+        while not self.stopping.is_set():
+            with self.lock:
+                if len(self.running) >= self.concurrency:
+                    return
+            job_id = claim_job(self.worker_id)
+            if job_id is None:
+                return
+            with self.lock:
+                self.running.add(job_id)
+            self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        # Each thread has its own app context and so its own session
+        try:
+            with self.app.app_context():
+                run_job(job_id, self.worker_id)
+        except Exception:
+            self.app.logger.exception('Job %s could not be run', job_id)
+        finally:
+            with self.lock:
+                self.running.discard(job_id)
+            self.wakeup.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+
+# The pool of this process per app, so enqueue() can wake it
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def start_in_process_workers(app):
+    """Wake this process's job threads, starting JOB_WORKERS of them first if needed.
+
+    Lets a web process work the queue without a separate worker; does
+    nothing when JOB_WORKERS is 0 and no worker runs in this process.
+    """
+    with _pools_lock:
+        pool = _pools.get(app)
+        # A pool inherited through fork has no threads in this process
+        if (pool is None or pool.pid != os.getpid()) and app.config['JOB_WORKERS']:
+            pool = _pools[app] = WorkerPool(app, app.config['JOB_WORKERS'])
+            threading.Thread(target=pool.run, name='job-dispatcher', daemon=True).start()
+    if pool is not None:
+        pool.wakeup.set()
+    return pool
+
+
+def start_workers_on_first_request(app):
+    """Start the in-process pool with the first request of each web process.
+
+    So scheduled jobs such as the deadline scan run without waiting for a
+    job to be queued. CLI commands, including ``flask worker``, never serve
+    a request and leave it alone.
+    """
+    if not app.config['JOB_WORKERS']:
+        return
+
+    @app.before_request
+    def start_job_workers():
+        pool = _pools.get(app)
+        # Checked without the lock; start_in_process_workers checks again
+        if pool is None or pool.pid != os.getpid():
+            start_in_process_workers(app)
+
+
+def run_worker(app, concurrency, poll_interval=None):
+    """Work the queue in the foreground until SIGINT or SIGTERM.
+
+    Jobs already running are finished before it returns; one killed
+    outright is requeued by the other workers once it goes stale.
+    """
+    pool = WorkerPool(app, concurrency, poll_interval)
+    with _pools_lock:
+        _pools[app] = pool
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: pool.stop())
+    pool.run()
+
+
+def prune_jobs(before):
+    """Delete finished jobs older than ``before`` and their files; returns the number deleted."""
+    jobs = Job.__table__
+    old = (jobs.c.status.in_(('succeeded', 'failed')), jobs.c.finished_at < before)
+    for result in db.session.scalars(select(jobs.c.result).where(*old, jobs.c.result.is_not(None))):
+        name = json.loads(result).get('file')
+        if name and os.path.exists(job_file_path(name)):
+            os.remove(job_file_path(name))
+    deleted = db.session.execute(jobs.delete().where(*old)).rowcount
+    db.session.commit()
+    return deleted
@@ -0,0 +1,185 @@
+import http.client
+import json
+import platform
+import threading
+import time
+from datetime import date, datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+from sqlalchemy import select, exists
+
+from models import db, User, Attendance
+from datagen import GENERATED_PASSWORD
+from instrumentation import percentile
+
+# Unlike the benchmark, which times requests one at a time through the test
+# client, the load test drives a running server over HTTP with many students
+# at once: the rush of a session start, when every student logs in, checks
+# in and opens the dashboard within a few minutes. Each student keeps one
+# keep-alive connection and its own session cookie, as a browser would.
+
+# (phase, method, path); every student runs each phase once, phase by phase
+PHASES = [
+    ('login', 'POST', '/api/v1/login'),
+    ('check_in', 'POST', '/api/v1/check-in'),
+    ('check_in_status', 'GET', '/api/v1/check-in'),
+    ('student_dashboard', 'GET', '/student/dashboard'),
+]
+
+# Students made by generate-data, who share GENERATED_PASSWORD
+LOAD_TEST_USERS = 'bench%'
+
+
+def load_test_users(count, reset=False):
+    """Usernames of up to ``count`` active generated students not checked in today.
+
+    With ``reset``, today's records of the generated students are deleted
+    first, through the ORM so the rollups and change log follow, and the
+    test can be run again on the same day.
+    """
+    today = date.today()
+    students = select(User.id).where(User.role == 'student', User.username.like(LOAD_TEST_USERS))
+    if reset:
+        records = Attendance.query.filter(Attendance.date == today, Attendance.student_id.in_(students))
+        for record in records:
+            db.session.delete(record)
+        db.session.commit()
+    checked_in = exists().where(Attendance.student_id == User.id, Attendance.date == today)
+    return list(db.session.scalars(
+        select(User.username)
+        .where(User.role == 'student', User.is_active == True, User.username.like(LOAD_TEST_USERS), ~checked_in)
+        .order_by(User.id).limit(count)
+    ))
+
+
+class Client:
+    """One simulated student: a keep-alive connection and the cookies the server set."""
+
+    def __init__(self, base_url, username):
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.hostname, url.port, timeout=60)
+        self.username = username
+        self.cookies = {}
+
+    def request(self, method, path):
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items()),
+                   'X-Requested-With': 'XMLHttpRequest'}
+        body = None
+        if path == '/api/v1/login':
+            body = json.dumps({'username': self.username, 'password': GENERATED_PASSWORD})
+            headers['Content-Type'] = 'application/json'
+        try:
+            return self._send(method, path, body, headers)
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # The server closed the idle connection between phases
+            self.connection.close()
+            return self._send(method, path, body, headers)
+
+    def _send(self, method, path, body, headers):
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.update({name: morsel.value for name, morsel in SimpleCookie(header).items()})
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+def _run_phase(clients, method, path, concurrency):
+    # ``concurrency`` threads take the students in turn; they start together
+    # and the phase is timed from the start to the last response
+    pending = iter(clients)
+    lock = threading.Lock()
+    durations, statuses, errors = [], {}, []
+    start = threading.Barrier(concurrency + 1)
+
+    def work():
+        start.wait()
+        while True:
+            with lock:
+                client = next(pending, None)
+            if client is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path)
+            except (OSError, http.client.HTTPException) as exc:
+                client.close()
+                with lock:
+                    errors.append(f'{type(exc).__name__}: {exc}')
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                durations.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(durations), statuses, errors
+
+
+def run_load_test(base_url, usernames, concurrency=50, log=print):
+    """Run every phase for all ``usernames`` against the server at ``base_url``.
+
+    Returns a JSON-serialisable dict with, per phase, the throughput
+    (requests per second over the phase), latency percentiles (ms), status
+    codes and connection errors.
+    """
+    clients = [Client(base_url, username) for username in usernames]
+    concurrency = max(1, min(concurrency, len(clients)))
+    results = []
+    try:
+        for name, method, path in PHASES:
+            seconds, durations, statuses, errors = _run_phase(clients, method, path, concurrency)
+            result = {
+                'scenario': name,
+                'method': method,
+                'url': path,
+                'requests': len(durations),
+                'seconds': round(seconds, 3),
+                'requests_per_second': round(len(durations) / seconds, 1) if seconds else 0,
+                'p50_ms': round(percentile(durations, 50), 3),
+                'p95_ms': round(percentile(durations, 95), 3),
+                'p99_ms': round(percentile(durations, 99), 3),
+                'status_codes': statuses,
+                'errors': len(errors),
+                'first_errors': errors[:5],
+            }
+            results.append(result)
+            log(f"{name:<20} {result['requests_per_second']:>8.1f} req/s  p50 {result['p50_ms']:>9.2f}ms  "
+                f"p95 {result['p95_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+                f"statuses {statuses}  errors {len(errors)}")
+    finally:
+        for client in clients:
+            client.close()
+
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'url': base_url,
+            'users': len(clients),
+            'concurrency': concurrency,
+        },
+        'results': results,
+    }
+
+
+def compare_load_results(before, after):
+    """Yield (phase, metric, before, after) for phases present in both runs."""
+    previous = {result['scenario']: result for result in before['results']}
+    for result in after['results']:
+        old = previous.get(result['scenario'])
+        if old is None:
+            continue
+        for metric in ('requests_per_second', 'p50_ms', 'p95_ms', 'p99_ms'):
+            yield result['scenario'], metric, old[metric], result[metric]
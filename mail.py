@@ -0,0 +1,35 @@
+import smtplib
+from contextlib import contextmanager
+from email.message import EmailMessage
+from flask import current_app
+
+
+@contextmanager
+def mail_sender():
+    """Yield a ``send(to, subject, body)`` function for plain text mails.
+
+    All mails go over one SMTP connection to MAIL_SERVER. Without a
+    MAIL_SERVER they are only written to the log, e.g. in development.
+    """
+    config = current_app.config
+
+    def message(to, subject, body):
+        mail = EmailMessage()
+        mail['From'] = config['MAIL_FROM']
+        mail['To'] = to
+        mail['Subject'] = subject
+        mail.set_content(body)
+        return mail
+
+    if not config['MAIL_SERVER']:
+        def log(to, subject, body):
+            current_app.logger.info('Mail to %s (MAIL_SERVER not set, not sent): %s\n%s', to, subject, body)
+        yield log
+        return
+
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=30) as smtp:
+        if config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if config['MAIL_USERNAME']:
+            smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        yield lambda to, subject, body: smtp.send_message(message(to, subject, body))
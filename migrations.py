@@ -0,0 +1,233 @@
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, select, insert, inspect, update, func
+from sqlalchemy.schema import CreateTable
+
+from models import (db, Cohort, User, Task, Attendance, AttendanceWeeklySummary, ChangeLog, Job, TaskDeadline,
+                    ArchivedAttendance, ArchivedTask, TermArchive)
+from summaries import fill_student_summary
+from search import create_search_indexes
+
+# Kept out of db.metadata so create_all() never touches it
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+# (version, description, function taking a connection), in order
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+def _create_indexes(connection, model, *names):
+    # Indexes are declared on the models; checkfirst makes this a no-op on
+    # databases that create_all() built after they were added
+    indexes = {index.name: index for index in model.__table__.indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst=True)
+
+
+@migration(1, 'Add indexes for the task, attendance and student filters')
+def add_query_indexes(connection):
+    _create_indexes(connection, User, 'idx_user_role_active')
+    _create_indexes(connection, Task, 'idx_task_student_status', 'idx_task_due_date', 'idx_task_created_at')
+    _create_indexes(connection, Attendance, 'idx_attendance_date_status', 'idx_attendance_date_marked_at')
+
+
+def _add_column(connection, model, name):
+    # ALTER TABLE ... ADD COLUMN using the column type declared on the model,
+    # skipped when create_all() already built the table with it
+    table = model.__table__
+    if name in {column['name'] for column in inspect(connection).get_columns(table.name)}:
+        return False
+    preparer = connection.dialect.identifier_preparer
+    column_type = table.c[name].type.compile(dialect=connection.dialect)
+    connection.exec_driver_sql(
+        f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.quote(name)} {column_type}'
+    )
+    return True
+
+
+@migration(2, 'Add updated_at to users and attendance for API delta sync')
+def add_updated_at(connection):
+    for model, source in ((User, User.__table__.c.created_at), (Attendance, Attendance.__table__.c.marked_at)):
+        if _add_column(connection, model, 'updated_at'):
+            table = model.__table__
+            connection.execute(update(table).values(updated_at=source))
+    # Older task rows may have no updated_at either
+    tasks = Task.__table__
+    connection.execute(update(tasks).where(tasks.c.updated_at.is_(None)).values(updated_at=tasks.c.created_at))
+    _create_indexes(connection, User, 'idx_user_updated_at')
+    _create_indexes(connection, Task, 'idx_task_updated_at')
+    _create_indexes(connection, Attendance, 'idx_attendance_updated_at')
+
+
+@migration(3, 'Add the change log behind the API change feed')
+def add_change_log(connection):
+    ChangeLog.__table__.create(connection, checkfirst=True)
+
+
+@migration(4, 'Add the weekly attendance rollup and the absence streak index')
+def add_weekly_summary(connection):
+    table = AttendanceWeeklySummary.__table__
+    table.create(connection, checkfirst=True)
+    _create_indexes(connection, AttendanceWeeklySummary, 'idx_attendance_weekly_student')
+    # create_all() may have made the table already, but never filled it
+    if connection.execute(select(table.c.id).limit(1)).first() is None:
+        fill_student_summary(connection, table, 'week')
+    _create_indexes(connection, Attendance, 'idx_attendance_status_student_date')
+
+
+@migration(5, 'Add the background job queue')
+def add_jobs(connection):
+    Job.__table__.create(connection, checkfirst=True)
+
+
+@migration(6, 'Add the task deadline table and the indexes of the deadline scan')
+def add_task_deadlines(connection):
+    _create_indexes(connection, Task, 'idx_task_status_due_date')
+    _create_indexes(connection, Job, 'idx_job_kind_run_after')
+    TaskDeadline.__table__.create(connection, checkfirst=True)
+
+
+@migration(7, 'Add full-text search over students and tasks')
+def add_search_indexes(connection):
+    _create_indexes(connection, User, 'idx_user_role_full_name')
+    # Other databases search with LIKE and need no index tables
+    if connection.dialect.name == 'sqlite':
+        create_search_indexes(connection)
+
+
+@migration(8, 'Add cohorts and the cohort of students, tasks and attendance')
+def add_cohorts(connection):
+    Cohort.__table__.create(connection, checkfirst=True)
+    _create_indexes(connection, Cohort, 'idx_cohort_term')
+    # Existing rows stay without a cohort until students are assigned to one
+    for model in (User, Task, Attendance):
+        _add_column(connection, model, 'cohort_id')
+    _create_indexes(connection, User, 'idx_user_cohort_role_full_name')
+    _create_indexes(connection, Task, 'idx_task_cohort_due_date', 'idx_task_cohort_status', 'idx_task_cohort_created_at')
+    _create_indexes(connection, Attendance, 'idx_attendance_cohort_date_status')
+
+
+@migration(9, 'Add the archive of closed terms')
+def add_term_archive(connection):
+    for model in (ArchivedAttendance, ArchivedTask, TermArchive):
+        model.__table__.create(connection, checkfirst=True)
+    _create_indexes(connection, ArchivedAttendance, 'idx_archived_attendance_term',
+                    'idx_archived_attendance_student', 'idx_archived_attendance_updated_at')
+    _create_indexes(connection, ArchivedTask, 'idx_archived_task_term', 'idx_archived_task_student',
+                    'idx_archived_task_updated_at')
+
+
+@migration(10, 'Add the end date of cohort terms')
+def add_term_end(connection):
+    # Terms already archived stay readable; archiving them again waits for an end date
+    _add_column(connection, Cohort, 'ends_on')
+
+
+def _rebuild_with_autoincrement(connection, model, archive_model):
+    # SQLite gives a new row the highest rowid in use plus one, so after the
+    # newest rows were archived their ids came back. Only a table created
+    # with AUTOINCREMENT never reuses ids, and a column option can only be
+    # added by rebuilding the table: copy the rows into a new table, drop
+    # the old one (with its indexes and triggers) and put them back.
+    table = model.__table__
+    preparer = connection.dialect.identifier_preparer
+    name = preparer.format_table(table)
+    definition = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+    ).scalar()
+    if 'AUTOINCREMENT' not in definition.upper():
+        triggers = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table.name,)
+        ).scalars().all()
+        rebuilt = preparer.quote(f'{table.name}_rebuilt')
+        create = str(CreateTable(table).compile(dialect=connection.dialect))
+        connection.exec_driver_sql(create.replace(f'CREATE TABLE {name} ', f'CREATE TABLE {rebuilt} ', 1))
+        columns = ', '.join(preparer.quote(column.name) for column in table.c)
+        connection.exec_driver_sql(f'INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {name}')
+        connection.exec_driver_sql(f'DROP TABLE {name}')
+        connection.exec_driver_sql(f'ALTER TABLE {rebuilt} RENAME TO {name}')
+        for index in table.indexes:
+            index.create(connection)
+        # The search index triggers of migration 7
+        for trigger in triggers:
+            connection.exec_driver_sql(trigger)
+    # New ids also start past every archived one
+    last_id = max(connection.scalar(select(func.max(table.c.id))) or 0,
+                  connection.scalar(select(func.max(archive_model.__table__.c.id))) or 0)
+    connection.exec_driver_sql('DELETE FROM sqlite_sequence WHERE name = ?', (table.name,))
+    connection.exec_driver_sql('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table.name, last_id))
+
+
+@migration(11, 'Stop SQLite from reusing the ids of archived tasks and attendance records')
+def add_autoincrement_ids(connection):
+    # Server databases take ids from sequences, which never go back
+    if connection.dialect.name == 'sqlite':
+        _rebuild_with_autoincrement(connection, Task, ArchivedTask)
+        _rebuild_with_autoincrement(connection, Attendance, ArchivedAttendance)
+
+
+def _widen_column(connection, model, name):
+    # ALTER COLUMN ... TYPE to the longer string type now declared on the
+    # model, skipped when the column is already that long. SQLite does not
+    # enforce VARCHAR lengths and cannot alter a column type.
+    if connection.dialect.name == 'sqlite':
+        return False
+    table = model.__table__
+    current = {column['name']: column['type'] for column in inspect(connection).get_columns(table.name)}[name]
+    if getattr(current, 'length', None) is None or current.length >= table.c[name].type.length:
+        return False
+    preparer = connection.dialect.identifier_preparer
+    column_type = table.c[name].type.compile(dialect=connection.dialect)
+    connection.exec_driver_sql(
+        f'ALTER TABLE {preparer.format_table(table)} ALTER COLUMN {preparer.quote(name)} TYPE {column_type}'
+    )
+    return True
+
+
+@migration(12, 'Widen user password hashes for longer hash methods such as scrypt')
+def widen_password_hash(connection):
+    # Hashes were at most 120 characters; scrypt ones are 162
+    _widen_column(connection, User, 'password_hash')
+
+
+@migration(13, 'Add the archived attendance indexes of the reports over archived terms')
+def add_archived_report_indexes(connection):
+    _create_indexes(connection, ArchivedAttendance, 'idx_archived_attendance_status_student_date',
+                    'idx_archived_attendance_cohort_date_status')
+
+
+def applied_versions():
+    schema_migrations.create(db.engine, checkfirst=True)
+    with db.engine.connect() as connection:
+        return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [entry for entry in MIGRATIONS if entry[0] not in applied]
+
+
+def upgrade(log=print):
+    """Apply every pending migration, each in its own transaction.
+
+    Returns the number of migrations applied.
+    """
+    pending = pending_migrations()
+    for version, description, func in pending:
+        with db.engine.begin() as connection:
+            func(connection)
+            connection.execute(insert(schema_migrations).values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        log(f'Applied migration {version}: {description}')
+    return len(pending)
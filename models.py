@@ -1,30 +1,68 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from passwords import hash_password, needs_rehash
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+class Cohort(db.Model):
+    # A class or section. Students belong to one; their tasks and attendance
+    # records are stamped with it when written (see cohorts.py), so the
+    # per-cohort admin pages read only that cohort's rows through an index.
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    term = db.Column(db.String(50), nullable=True)  # e.g. '2026-autumn'
+    # Last day of the term, set when the term is closed; archiving waits for it
+    ends_on = db.Column(db.Date, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('idx_cohort_term', 'term'),)
+    
+    def __repr__(self):
+        return f'<Cohort {self.name}>'
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='student')  # 'admin' or 'student'
     full_name = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    cohort_id = db.Column(db.Integer, db.ForeignKey('cohort.id'), nullable=True)
     
     # Relationships
     tasks = db.relationship('Task', backref='assigned_student', lazy=True, foreign_keys='Task.student_id')
     attendance_records = db.relationship('Attendance', backref='student', lazy=True, foreign_keys='Attendance.student_id')
     
+    # Student listings and counts filter on role and is_active; API delta
+    # sync reads rows by updated_at; the student list and pickers page by
+    # name, within one cohort when one is selected
+    __table_args__ = (
+        db.Index('idx_user_role_active', 'role', 'is_active'),
+        db.Index('idx_user_updated_at', 'updated_at'),
+        db.Index('idx_user_role_full_name', 'role', 'full_name'),
+        db.Index('idx_user_cohort_role_full_name', 'cohort_id', 'role', 'full_name'),
+    )
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def rehash_password(self, password):
+        # Call after a successful check_password; re-hashes with the current
+        # settings if they changed and returns True when the hash was replaced
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+            return True
+        return False
+    
     def is_admin(self):
         return self.role == 'admin'
     
@@ -44,29 +82,276 @@ class Task(db.Model):
     # Foreign Keys
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # The student's cohort when the task was assigned
+    cohort_id = db.Column(db.Integer, db.ForeignKey('cohort.id'), nullable=True)
     
     # Relationships
     creator = db.relationship('User', foreign_keys=[created_by], backref='created_tasks')
     
+    # Indexes for the per-student task lists, the due date listing, "recent
+    # tasks" and API delta sync. AUTOINCREMENT keeps SQLite from giving the
+    # id of an archived task to a new one.
+    __table_args__ = (
+        db.Index('idx_task_student_status', 'student_id', 'status'),
+        db.Index('idx_task_due_date', 'due_date'),
+        db.Index('idx_task_created_at', 'created_at'),
+        db.Index('idx_task_updated_at', 'updated_at'),
+        # The deadline scan reads open tasks by due date range
+        db.Index('idx_task_status_due_date', 'status', 'due_date'),
+        # Per-cohort task list, dashboard counters and "recent tasks"
+        db.Index('idx_task_cohort_due_date', 'cohort_id', 'due_date'),
+        db.Index('idx_task_cohort_status', 'cohort_id', 'status'),
+        db.Index('idx_task_cohort_created_at', 'cohort_id', 'created_at'),
+        {'sqlite_autoincrement': True},
+    )
+    
     def __repr__(self):
         return f'<Task {self.title}>'
 
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, nullable=False)
-    status = db.Column(db.String(20), nullable=False)  # 'present', 'absent', 'late'
+    # active_history: the rollup hook needs the old date, student and status
+    # even when they are set on an expired record, e.g. right after a commit
+    date = db.mapped_column(db.Date, nullable=False, active_history=True)
+    status = db.mapped_column(db.String(20), nullable=False, active_history=True)  # 'present', 'absent', 'late'
     remarks = db.Column(db.String(200), nullable=True)
     marked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Foreign Keys
-    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    student_id = db.mapped_column(db.Integer, db.ForeignKey('user.id'), nullable=False, active_history=True)
     marked_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # The student's cohort on the day the record was marked
+    cohort_id = db.Column(db.Integer, db.ForeignKey('cohort.id'), nullable=True)
     
     # Relationships
     marker = db.relationship('User', foreign_keys=[marked_by], backref='marked_attendance_records')
     
-    # Unique constraint to prevent duplicate attendance for same student on same date
-    __table_args__ = (db.UniqueConstraint('student_id', 'date', name='unique_student_date'),)
+    # Unique constraint to prevent duplicate attendance for same student on same date,
+    # plus indexes for the per-day listings, "recent attendance", API delta sync
+    # and the absence streaks of the analytics report (read from the index alone).
+    # AUTOINCREMENT keeps SQLite from reusing the ids of archived records.
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'date', name='unique_student_date'),
+        db.Index('idx_attendance_date_status', 'date', 'status'),
+        db.Index('idx_attendance_date_marked_at', 'date', 'marked_at'),
+        db.Index('idx_attendance_updated_at', 'updated_at'),
+        db.Index('idx_attendance_status_student_date', 'status', 'student_id', 'date'),
+        # Per-cohort listings and status counts, read from the index alone
+        db.Index('idx_attendance_cohort_date_status', 'cohort_id', 'date', 'status'),
+        {'sqlite_autoincrement': True},
+    )
+    
+    def __repr__(self):
+        return f'<Attendance {self.student.username} - {self.date} - {self.status}>'
+
+class AttendanceDailySummary(db.Model):
+    # Rollup of Attendance per day, maintained by summaries.py
+    date = db.Column(db.Date, primary_key=True)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def total(self):
+        return self.present + self.absent + self.late
+    
+    def __repr__(self):
+        return f'<AttendanceDailySummary {self.date}>'
+
+class AttendanceMonthlySummary(db.Model):
+    # Rollup of Attendance per student per month (month = first day of the month)
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('student_id', 'month', name='unique_student_month'),)
+    
+    @property
+    def total(self):
+        return self.present + self.absent + self.late
+    
+    def __repr__(self):
+        return f'<AttendanceMonthlySummary {self.student_id} - {self.month}>'
+
+class AttendanceWeeklySummary(db.Model):
+    # Rollup of Attendance per student per week (week = its Monday), for analytics
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    week = db.Column(db.Date, nullable=False)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    
+    # The analytics report reads the cohort from the covering index alone
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'week', name='unique_student_week'),
+        db.Index('idx_attendance_weekly_student', 'student_id', 'week', 'present', 'absent', 'late'),
+    )
+    
+    @property
+    def total(self):
+        return self.present + self.absent + self.late
+    
+    def __repr__(self):
+        return f'<AttendanceWeeklySummary {self.student_id} - {self.week}>'
+
+class ChangeLog(db.Model):
+    # Append-only log of Task and Attendance writes, maintained by changes.py.
+    # The id is the feed cursor; AUTOINCREMENT keeps SQLite from reusing ids
+    # after old entries are pruned.
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # 'task' or 'attendance'
+    entity_id = db.Column(db.Integer, nullable=False)
+    student_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # 'insert', 'update' or 'delete'
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Students follow only their own entries
+    __table_args__ = (
+        db.Index('idx_change_log_student', 'student_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+    
+    def __repr__(self):
+        return f'<ChangeLog {self.id} {self.action} {self.entity} {self.entity_id}>'
+
+class Job(db.Model):
+    # Background job queue worked by jobs.py; payload and result are JSON text
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'succeeded' or 'failed'
+    progress = db.Column(db.Integer, nullable=False, default=0)  # percent
+    message = db.Column(db.String(200))
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    worker = db.Column(db.String(100))  # the worker holding a running job
+    heartbeat_at = db.Column(db.DateTime)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Workers look for due queued jobs (and stale running ones) and for the
+    # last run of scheduled kinds; admins list their own
+    __table_args__ = (
+        db.Index('idx_job_status_run_after', 'status', 'run_after'),
+        db.Index('idx_job_created_by', 'created_by', 'id'),
+        db.Index('idx_job_kind_run_after', 'kind', 'run_after'),
+    )
+    
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed')
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
+class TaskDeadline(db.Model):
+    # Open tasks that are overdue or due soon, refreshed by the deadline scan
+    # in deadlines.py. Rows without notified_at are the reminders still to send.
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False, unique=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'overdue' or 'due_soon'
+    due_date = db.Column(db.Date, nullable=False)
+    detected_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    notified_at = db.Column(db.DateTime)
+    
+    task = db.relationship('Task')
+    student = db.relationship('User')
+    
+    # Per-student and per-kind listings by due date, and the reminder queue
+    __table_args__ = (
+        db.Index('idx_task_deadline_student', 'student_id', 'due_date'),
+        db.Index('idx_task_deadline_kind', 'kind', 'due_date'),
+        db.Index('idx_task_deadline_notified', 'notified_at', 'student_id'),
+    )
+    
+    def __repr__(self):
+        return f'<TaskDeadline {self.task_id} {self.kind}>'
+
+class ArchivedAttendance(db.Model):
+    # Attendance records of closed terms, moved out of the attendance table by
+    # archive.py with their ids and values unchanged. The rollup tables keep
+    # counting them.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    remarks = db.Column(db.String(200), nullable=True)
+    marked_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    marked_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    cohort_id = db.Column(db.Integer, db.ForeignKey('cohort.id'), nullable=True)
+    term = db.Column(db.String(50), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Read per term or per student by date, and page by updated_at in the API;
+    # the reports read it like the attendance table, with the same indexes
+    __table_args__ = (
+        db.Index('idx_archived_attendance_term', 'term', 'student_id', 'date'),
+        db.Index('idx_archived_attendance_student', 'student_id', 'date'),
+        db.Index('idx_archived_attendance_updated_at', 'updated_at'),
+        db.Index('idx_archived_attendance_status_student_date', 'status', 'student_id', 'date'),
+        db.Index('idx_archived_attendance_cohort_date_status', 'cohort_id', 'date', 'status'),
+    )
+    
+    def __repr__(self):
+        return f'<ArchivedAttendance {self.student_id} - {self.date} - {self.status}>'
+
+class ArchivedTask(db.Model):
+    # Completed tasks of closed terms, moved out of the task table by archive.py
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    due_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20))
+    priority = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    cohort_id = db.Column(db.Integer, db.ForeignKey('cohort.id'), nullable=True)
+    term = db.Column(db.String(50), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_archived_task_term', 'term', 'student_id', 'due_date'),
+        db.Index('idx_archived_task_student', 'student_id', 'due_date'),
+        db.Index('idx_archived_task_updated_at', 'updated_at'),
+    )
+    
+    def __repr__(self):
+        return f'<ArchivedTask {self.title}>'
+
+class TermArchive(db.Model):
+    # What was archived of each cohort of a term: attendance counts and date
+    # range, and the number of completed tasks, added to on every archive run
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(50), nullable=False)
+    cohort_id = db.Column(db.Integer, db.ForeignKey('cohort.id'), nullable=False)
+    first_date = db.Column(db.Date)
+    last_date = db.Column(db.Date)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    tasks = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('term', 'cohort_id', name='unique_term_cohort'),)
+    
+    @property
+    def total(self):
+        return self.present + self.absent + self.late
     
     def __repr__(self):
-        return f'<Attendance {self.student.username} - {self.date} - {self.status}>'
\ No newline at end of file
+        return f'<TermArchive {self.term} {self.cohort_id}>'
@@ -0,0 +1,70 @@
+from datetime import date
+from sqlalchemy import or_, and_
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, per_page):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(sort_value, row_id):
+    # Cursor format: "<iso date or datetime, or text>:<id>" of the last row on the page
+    if isinstance(sort_value, str):
+        return f'{sort_value}:{row_id}'
+    return f'{sort_value.isoformat()}:{row_id}'
+
+
+def decode_cursor(cursor, value_type=date):
+    # Returns (sort value, id) or None if the cursor is missing or malformed;
+    # value_type is date, datetime or str, matching the sort column
+    if not cursor:
+        return None
+    try:
+        sort_value, row_id = cursor.rsplit(':', 1)
+        if value_type is str:
+            return sort_value, int(row_id)
+        return value_type.fromisoformat(sort_value), int(row_id)
+    except ValueError:
+        return None
+
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, per_page=50, descending=True):
+    """Paginate a query in (sort_column, id_column) order, newest first by default.
+
+    Instead of OFFSET, each page continues strictly after the last row of the
+    previous one, so every page costs the same no matter how deep it is.
+    """
+    position = decode_cursor(cursor, sort_column.type.python_type)
+    if position is not None:
+        sort_value, row_id = position
+        if descending:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < row_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > sort_value,
+                and_(sort_column == sort_value, id_column > row_id)
+            ))
+
+    # Fetch one extra row to know whether there is a next page
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    return KeysetPage(items, next_cursor, per_page)
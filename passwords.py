@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from flask import current_app
+from werkzeug.security import generate_password_hash
+
+# Below this many passwords a process pool costs more than it saves
+PARALLEL_HASH_THRESHOLD = 8
+
+# One pool per process, started on first use and kept for later batches.
+# Its workers are spawned rather than forked: a fork taken while another
+# request or job thread holds a lock leaves that lock held in the child.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hash_settings():
+    return {
+        'method': current_app.config['PASSWORD_HASH_METHOD'],
+        'salt_length': current_app.config['PASSWORD_SALT_LENGTH'],
+    }
+
+
+def hash_password(password):
+    return generate_password_hash(password, **_hash_settings())
+
+
+@lru_cache(maxsize=None)
+def _method_prefix(method):
+    # Werkzeug expands defaults ('scrypt' -> 'scrypt:32768:8:1'), so hash once
+    # with the configured method to learn the exact prefix it writes
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with a different method or cost than configured."""
+    return password_hash.split('$', 1)[0] != _method_prefix(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def _hash_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def hash_passwords(passwords):
+    """Hash many passwords, spreading the work over a process pool.
+
+    Returns the hashes in the same order as ``passwords``. Small batches are
+    hashed inline. The pool size comes from ``PASSWORD_HASH_WORKERS``
+    (0 means one worker per CPU).
+    """
+    passwords = list(passwords)
+    hasher = partial(generate_password_hash, **_hash_settings())
+    if len(passwords) < PARALLEL_HASH_THRESHOLD:
+        return [hasher(password) for password in passwords]
+
+    workers = current_app.config['PASSWORD_HASH_WORKERS'] or os.cpu_count() or 1
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(_hash_pool(workers).map(hasher, passwords, chunksize=chunksize))
@@ -0,0 +1,52 @@
+import re
+
+# SQLAlchemy names anonymous subqueries anon_1, anon_2, ...; scanning one of
+# those reads the subquery result, whose own plan is checked separately
+SUBQUERY_ALIAS = re.compile(r'anon_\d+$')
+# The same goes for WITH queries (CTEs) and SQLite's "(subquery-N)" rows
+CTE_NAME = re.compile(r'(\w+) AS\s*\(')
+# SQLite plan rows read "SCAN task" for a full scan and "SCAN task USING INDEX ..." otherwise
+SQLITE_FULL_SCAN = re.compile(r'SCAN (\S+)$')
+
+
+def full_table_scans(connection, statement, parameters):
+    """Return the tables (or their aliases) the statement reads with a full scan.
+
+    Scans that walk an index, e.g. for ``ORDER BY ... LIMIT``, are not full
+    table scans. Supports SQLite and PostgreSQL.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        details = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        tables = [match.group(1) for match in map(SQLITE_FULL_SCAN.match, details) if match]
+    elif dialect == 'postgresql':
+        plan = '\n'.join(row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters))
+        tables = re.findall(r'Seq Scan on (\S+)', plan)
+    else:
+        raise ValueError(f'Query plans are not supported for {dialect}.')
+    subqueries = set(CTE_NAME.findall(statement))
+    # SQLite's own catalog (sqlite_master) is small and has no indexes to use
+    return [table.strip('"') for table in tables
+            if not SUBQUERY_ALIAS.match(table) and not table.startswith(('(', 'sqlite_'))
+            and table not in subqueries]
+
+
+def check_query_plans(engine, captured):
+    """Explain every captured statement and collect the full table scans.
+
+    ``captured`` maps a scenario name to ``(statement, parameters)`` pairs, as
+    returned by ``benchmark.capture_statements``. Returns a list of
+    ``(scenario, tables, statement)`` tuples, one per offending statement.
+    """
+    problems = []
+    with engine.connect() as connection:
+        for scenario, statements in captured.items():
+            seen = set()
+            for statement, parameters in statements:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                tables = full_table_scans(connection, statement, parameters)
+                if tables:
+                    problems.append((scenario, tables, statement))
+    return problems
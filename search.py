@@ -0,0 +1,140 @@
+import re
+from sqlalchemy import MetaData, Table, Column, Integer, String, select, and_, or_
+
+from models import db, User, Task
+
+# On SQLite, students and tasks are searched through FTS5 tables that index
+# the text columns of the user and task tables (external content, so the
+# text is not stored twice). Triggers created by migration 7 keep them in
+# step with every write, ORM and Core alike. Other databases, or a SQLite
+# built without FTS5, fall back to LIKE over the same columns.
+
+# Words of a query that are matched; the rest is ignored
+MAX_TERMS = 8
+
+# model -> (index table name, indexed columns)
+SEARCH_INDEXES = {
+    User: ('user_search', ('full_name', 'username', 'email')),
+    Task: ('task_search', ('title', 'description')),
+}
+
+# Kept out of db.metadata so create_all() never touches them; only the rowid
+# and the hidden column named after the table, which MATCH is applied to,
+# are ever queried
+_index_tables = {
+    name: Table(name, MetaData(), Column('rowid', Integer, primary_key=True), Column(name, String))
+    for name, _ in SEARCH_INDEXES.values()
+}
+
+# engine -> whether the search tables exist in its database
+_fts_ready = {}
+
+
+def search_terms(q):
+    # Split like the FTS5 unicode61 tokenizer: runs of letters and digits
+    return re.findall(r'[^\W_]+', (q or '').lower())[:MAX_TERMS]
+
+
+def fts_enabled():
+    bind = db.session.get_bind(clause=select(User.id))
+    if bind.dialect.name != 'sqlite':
+        return False
+    if bind not in _fts_ready:
+        with bind.connect() as connection:
+            _fts_ready[bind] = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'"
+            ).first() is not None
+    return _fts_ready[bind]
+
+
+def apply_search(query, model, q):
+    """Narrow a Query or select() over ``model`` to rows matching every word of ``q``.
+
+    Each word matches as a prefix of a word in any indexed column, so
+    "jo sm" finds "John Smith". A query without words is returned as it is.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return query
+    name, columns = SEARCH_INDEXES[model]
+    if fts_enabled():
+        index = _index_tables[name]
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        # As IN (subquery), SQLite runs the MATCH once; as a join it may
+        # instead probe the index once per row of the outer table
+        return query.filter(model.id.in_(select(index.c.rowid).where(index.c[name].match(expression))))
+    return like_search(query, model, columns, q)
+
+
+def like_search(query, model, columns, q):
+    """Narrow ``query`` to rows with every word of ``q`` somewhere in ``columns``, without an index."""
+    return query.filter(and_(*[
+        or_(*[getattr(model, column).ilike(f'%{term}%') for column in columns]) for term in search_terms(q)
+    ]))
+
+
+def search_students(q, limit, active_only=False, cohort_id=None):
+    """Students matching ``q``, by name; at most ``limit`` rows of id, names, email and status."""
+    query = (select(User.id, User.full_name, User.username, User.email, User.is_active)
+             .where(User.role == 'student'))
+    if active_only:
+        query = query.where(User.is_active == True)
+    if cohort_id is not None:
+        query = query.where(User.cohort_id == cohort_id)
+    query = apply_search(query, User, q).order_by(User.full_name, User.id).limit(limit)
+    return db.session.execute(query).all()
+
+
+def search_tasks(q, limit, student_id=None):
+    """Tasks matching ``q``, latest due first; at most ``limit`` rows, of one student if given."""
+    query = select(Task.id, Task.title, Task.status, Task.priority, Task.due_date, Task.student_id)
+    if student_id is not None:
+        query = query.where(Task.student_id == student_id)
+    query = apply_search(query, Task, q).order_by(Task.due_date.desc(), Task.id.desc()).limit(limit)
+    return db.session.execute(query).all()
+
+
+def student_names(student_ids):
+    """``{id: full_name}`` of the given students, e.g. to show a picker's current choice."""
+    ids = [student_id for student_id in student_ids if student_id]
+    if not ids:
+        return {}
+    return dict(db.session.execute(select(User.id, User.full_name).where(User.id.in_(ids))).all())
+
+
+def create_search_indexes(connection):
+    """Create the FTS5 tables and their triggers and index the existing rows.
+
+    SQLite only; returns False, changing nothing, when FTS5 is not compiled in.
+    """
+    options = {row[0] for row in connection.exec_driver_sql('PRAGMA compile_options')}
+    if 'ENABLE_FTS5' not in options:
+        return False
+    for model, (name, columns) in SEARCH_INDEXES.items():
+        source = model.__table__.name
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        # prefix= keeps two and three letter prefixes in the index, the
+        # typical autocomplete input
+        connection.exec_driver_sql(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({column_list}, '
+            f"content='{source}', content_rowid='id', prefix='2 3', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        insert_new = f'INSERT INTO {name}(rowid, {column_list}) VALUES (new.id, {new_values});'
+        delete_old = f"INSERT INTO {name}({name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+        for suffix, event, body in (('ai', 'AFTER INSERT', insert_new),
+                                    ('ad', 'AFTER DELETE', delete_old),
+                                    ('au', f'AFTER UPDATE OF {column_list}', delete_old + ' ' + insert_new)):
+            connection.exec_driver_sql(
+                f'CREATE TRIGGER IF NOT EXISTS {name}_{suffix} {event} ON "{source}" BEGIN {body} END'
+            )
+        rebuild_search_index(connection, name)
+    _fts_ready.clear()
+    return True
+
+
+def rebuild_search_index(connection, name):
+    # Re-reads every row of the content table
+    connection.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
@@ -0,0 +1,119 @@
+// Student picker: a search box over /api/v1/search/students that keeps the
+// chosen students as hidden inputs, so a form never lists the whole roster.
+// Markup comes from the student_picker macro (templates/student_picker.html).
+(function() {
+    const DEBOUNCE_MS = 200;
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function setUp(picker) {
+        if (picker.dataset.ready) {
+            return;
+        }
+        picker.dataset.ready = '1';
+        const multiple = picker.hasAttribute('data-multiple');
+        const input = picker.querySelector('.student-picker-input');
+        const chosen = picker.querySelector('.student-picker-chosen');
+        const results = picker.querySelector('.student-picker-results');
+        let timer = null;
+        let request = 0;
+        let active = -1;
+
+        function chosenIds() {
+            return Array.from(chosen.querySelectorAll('input')).map(field => field.value);
+        }
+
+        function choose(student) {
+            if (!multiple) {
+                chosen.innerHTML = '';
+            } else if (chosenIds().includes(String(student.id))) {
+                return;
+            }
+            const chip = document.createElement('span');
+            chip.className = 'student-picker-chip';
+            chip.innerHTML = escapeHtml(student.full_name) +
+                '<input type="hidden" name="' + picker.dataset.name + '" value="' + student.id + '">' +
+                '<button type="button" class="student-picker-remove" aria-label="Remove">&times;</button>';
+            chosen.appendChild(chip);
+            input.value = '';
+            hide();
+        }
+
+        function hide() {
+            results.hidden = true;
+            results.innerHTML = '';
+            active = -1;
+        }
+
+        function highlight(index) {
+            const items = results.querySelectorAll('li');
+            items.forEach((item, i) => item.classList.toggle('active', i === index));
+            active = index;
+        }
+
+        function search() {
+            const current = ++request;
+            const url = picker.dataset.url + (picker.dataset.url.includes('?') ? '&' : '?') +
+                'q=' + encodeURIComponent(input.value.trim());
+            fetch(url, {credentials: 'same-origin'})
+                .then(response => response.ok ? response.json() : {data: []})
+                .then(body => {
+                    // Answers to earlier keystrokes may arrive late
+                    if (current !== request) {
+                        return;
+                    }
+                    results.innerHTML = '';
+                    body.data.forEach(student => {
+                        const item = document.createElement('li');
+                        item.innerHTML = escapeHtml(student.full_name) +
+                            '<small>' + escapeHtml(student.username) + '</small>';
+                        item.addEventListener('mousedown', event => {
+                            event.preventDefault();
+                            choose(student);
+                        });
+                        item.student = student;
+                        results.appendChild(item);
+                    });
+                    results.hidden = body.data.length === 0;
+                    highlight(body.data.length ? 0 : -1);
+                })
+                .catch(() => {});
+        }
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(search, DEBOUNCE_MS);
+        });
+        input.addEventListener('focus', search);
+        input.addEventListener('blur', hide);
+        input.addEventListener('keydown', event => {
+            const items = results.querySelectorAll('li');
+            if (event.key === 'ArrowDown' && items.length) {
+                event.preventDefault();
+                highlight((active + 1) % items.length);
+            } else if (event.key === 'ArrowUp' && items.length) {
+                event.preventDefault();
+                highlight((active - 1 + items.length) % items.length);
+            } else if (event.key === 'Enter' && active >= 0 && !results.hidden) {
+                // Pick the highlighted student instead of submitting the form
+                event.preventDefault();
+                choose(items[active].student);
+            } else if (event.key === 'Escape') {
+                hide();
+            }
+        });
+        chosen.addEventListener('click', event => {
+            if (event.target.classList.contains('student-picker-remove')) {
+                event.target.parentElement.remove();
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('.student-picker').forEach(setUp);
+    });
+})();
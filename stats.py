@@ -0,0 +1,124 @@
+from sqlalchemy import select, func, case, true
+
+from models import db, User, Task, Attendance, AttendanceDailySummary, AttendanceMonthlySummary
+
+
+def count_where(condition):
+    # COUNT only rows matching the condition (CASE yields NULL otherwise)
+    return func.count(case((condition, 1)))
+
+
+def percentage(part, whole):
+    return round(part / whole * 100, 1) if whole > 0 else 0
+
+
+def student_counts(*criteria):
+    return select(
+        count_where(User.is_active == True).label('total_students'),
+    ).where(User.role == 'student', *criteria).subquery()
+
+
+def task_counts(*criteria):
+    return select(
+        func.count(Task.id).label('total_tasks'),
+        count_where(Task.status == 'pending').label('pending_tasks'),
+        count_where(Task.status == 'in_progress').label('in_progress_tasks'),
+        count_where(Task.status == 'completed').label('completed_tasks'),
+    ).where(*criteria).subquery()
+
+
+def attendance_counts(*criteria):
+    return select(
+        func.count(Attendance.id).label('total_days'),
+        count_where(Attendance.status == 'present').label('present_days'),
+        count_where(Attendance.status == 'absent').label('absent_days'),
+        count_where(Attendance.status == 'late').label('late_days'),
+    ).where(*criteria).subquery()
+
+
+def summary_counts(model, *criteria):
+    # Same columns as attendance_counts, summed from a rollup table
+    present = func.coalesce(func.sum(model.present), 0)
+    absent = func.coalesce(func.sum(model.absent), 0)
+    late = func.coalesce(func.sum(model.late), 0)
+    return select(
+        (present + absent + late).label('total_days'),
+        present.label('present_days'),
+        absent.label('absent_days'),
+        late.label('late_days'),
+    ).where(*criteria).subquery()
+
+
+def fetch_counts(*subqueries):
+    """Run several single-row aggregate subqueries as one SELECT.
+
+    Each subquery returns exactly one row, so cross joining them yields a
+    single row holding every counter, fetched in one round trip.
+    """
+    columns = [column for subquery in subqueries for column in subquery.c]
+    stmt = select(*columns).select_from(subqueries[0])
+    for subquery in subqueries[1:]:
+        stmt = stmt.join(subquery, true())
+    return db.session.execute(stmt).one()._asdict()
+
+
+def admin_dashboard_stats(today, cohort_id=None):
+    if cohort_id is None:
+        stats = fetch_counts(
+            student_counts(),
+            task_counts(),
+            summary_counts(AttendanceDailySummary, AttendanceDailySummary.date == today),
+        )
+    else:
+        # The rollups cover every cohort; one cohort's counts come from the
+        # cohort_id indexes instead
+        stats = fetch_counts(
+            student_counts(User.cohort_id == cohort_id),
+            task_counts(Task.cohort_id == cohort_id),
+            attendance_counts(Attendance.cohort_id == cohort_id, Attendance.date == today),
+        )
+    stats['task_completion_rate'] = percentage(stats['completed_tasks'], stats['total_tasks'])
+    stats['attendance_rate'] = percentage(stats['present_days'], stats['total_days'])
+    return stats
+
+
+def check_in_counts(day, cohort_id=None):
+    """Active students and their attendance so far on ``day``, in one query,
+    for staff following the check-in at the start of a session."""
+    if cohort_id is None:
+        return fetch_counts(student_counts(),
+                            summary_counts(AttendanceDailySummary, AttendanceDailySummary.date == day))
+    return fetch_counts(student_counts(User.cohort_id == cohort_id),
+                        attendance_counts(Attendance.cohort_id == cohort_id, Attendance.date == day))
+
+
+def student_dashboard_stats(student_id, month_start):
+    stats = fetch_counts(
+        task_counts(Task.student_id == student_id),
+        summary_counts(AttendanceMonthlySummary,
+                       AttendanceMonthlySummary.student_id == student_id,
+                       AttendanceMonthlySummary.month == month_start),
+    )
+    stats['attendance_rate'] = percentage(stats['present_days'], stats['total_days'])
+    return stats
+
+
+def attendance_status_counts(date_from=None, date_to=None, cohort_id=None):
+    """Per-status attendance totals for a date range, read from the daily rollup,
+    or from the (cohort_id, date, status) index for one cohort."""
+    model = AttendanceDailySummary if cohort_id is None else Attendance
+    criteria = [] if cohort_id is None else [Attendance.cohort_id == cohort_id]
+    if date_from:
+        criteria.append(model.date >= date_from)
+    if date_to:
+        criteria.append(model.date <= date_to)
+    if cohort_id is None:
+        stats = fetch_counts(summary_counts(model, *criteria))
+    else:
+        stats = fetch_counts(attendance_counts(*criteria))
+    counts = {
+        'present': stats['present_days'],
+        'absent': stats['absent_days'],
+        'late': stats['late_days'],
+    }
+    return {status: count for status, count in counts.items() if count}
@@ -0,0 +1,195 @@
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import event, inspect, select, insert, update, delete, func, case, bindparam, union_all
+
+from models import (db, Attendance, ArchivedAttendance, AttendanceDailySummary, AttendanceMonthlySummary,
+                    AttendanceWeeklySummary)
+
+STATUSES = ('present', 'absent', 'late')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def week_start(day):
+    # Weeks start on Monday
+    return day - timedelta(days=day.weekday())
+
+
+def attendance_records(where, *columns):
+    """The live and archived attendance records matching ``where(model)``,
+    as a subquery of the named ``columns``.
+
+    Reports over a date range read this instead of the attendance table,
+    so a range reaching back into an archived term still sees its days.
+    ``where`` is called with each of the two models, and each half of the
+    UNION ALL is read over its own table's indexes.
+    """
+    return union_all(*[
+        select(*[getattr(model, name) for name in columns]).where(*where(model))
+        for model in (Attendance, ArchivedAttendance)
+    ]).subquery()
+
+
+def _new_counts():
+    return dict.fromkeys(STATUSES, 0)
+
+
+def apply_attendance_deltas(connection, deltas):
+    """Add attendance count changes to the daily, weekly and monthly rollup tables.
+
+    ``deltas`` maps ``(date, student_id, status)`` to a signed count, e.g.
+    ``{(date(2024, 5, 1), 7, 'present'): 1}``. Rows are updated with
+    ``column = column + delta`` on the given connection, so the rollup
+    changes commit or roll back together with the Attendance writes.
+    """
+    daily = defaultdict(_new_counts)
+    weekly = defaultdict(_new_counts)
+    monthly = defaultdict(_new_counts)
+    for (day, student_id, status), count in deltas.items():
+        if status not in STATUSES or not count:
+            continue
+        daily[day][status] += count
+        weekly[(student_id, week_start(day))][status] += count
+        monthly[(student_id, month_start(day))][status] += count
+
+    if daily:
+        daily_table = AttendanceDailySummary.__table__
+        existing = set(connection.execute(
+            select(daily_table.c.date).where(daily_table.c.date.in_(list(daily)))
+        ).scalars())
+        _write_deltas(
+            connection, daily_table,
+            key_columns=('date',),
+            rows=[{'date': day, **counts} for day, counts in daily.items()],
+            existing=[{'date': day} for day in existing],
+        )
+
+    _write_student_deltas(connection, AttendanceWeeklySummary.__table__, 'week', weekly)
+    _write_student_deltas(connection, AttendanceMonthlySummary.__table__, 'month', monthly)
+
+
+def _write_student_deltas(connection, table, period, counts_by_key):
+    # counts_by_key maps (student_id, period start) to per-status deltas
+    if not counts_by_key:
+        return
+    existing = connection.execute(
+        select(table.c.student_id, table.c[period]).where(
+            table.c.student_id.in_(list({student_id for student_id, _ in counts_by_key})),
+            table.c[period].in_(list({start for _, start in counts_by_key})),
+        )
+    ).all()
+    _write_deltas(
+        connection, table,
+        key_columns=('student_id', period),
+        rows=[{'student_id': student_id, period: start, **counts}
+              for (student_id, start), counts in counts_by_key.items()],
+        existing=[{'student_id': student_id, period: start} for student_id, start in existing],
+    )
+
+
+def _write_deltas(connection, table, key_columns, rows, existing):
+    # Existing rollup rows get an in-place increment, missing ones are inserted
+    existing_keys = {tuple(row[name] for name in key_columns) for row in existing}
+    to_update, to_insert = [], []
+    for row in rows:
+        key = tuple(row[name] for name in key_columns)
+        (to_update if key in existing_keys else to_insert).append(row)
+
+    if to_update:
+        stmt = update(table).where(
+            *[table.c[name] == bindparam('key_' + name) for name in key_columns]
+        ).values({
+            status: table.c[status] + bindparam('delta_' + status) for status in STATUSES
+        })
+        connection.execute(stmt, [
+            {**{'key_' + name: row[name] for name in key_columns},
+             **{'delta_' + status: row[status] for status in STATUSES}}
+            for row in to_update
+        ])
+    if to_insert:
+        connection.execute(insert(table), to_insert)
+
+
+def _committed_key(obj):
+    # (date, student_id, status) as last loaded from the database
+    state = inspect(obj)
+    values = []
+    for name in ('date', 'student_id', 'status'):
+        history = state.attrs[name].history
+        values.append(history.deleted[0] if history.deleted else getattr(obj, name))
+    return tuple(values)
+
+
+def _current_key(obj):
+    return (obj.date, obj.student_id, obj.status)
+
+
+@event.listens_for(db.session, 'after_flush')
+def maintain_attendance_summaries(session, flush_context):
+    # Runs inside the flush, so pending state and attribute history are still
+    # available and the rollup writes share the Attendance transaction
+    deltas = defaultdict(int)
+    for obj in session.new:
+        if isinstance(obj, Attendance):
+            deltas[_current_key(obj)] += 1
+    for obj in session.dirty:
+        if isinstance(obj, Attendance) and session.is_modified(obj, include_collections=False):
+            old_key, new_key = _committed_key(obj), _current_key(obj)
+            if old_key != new_key:
+                deltas[old_key] -= 1
+                deltas[new_key] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Attendance):
+            deltas[_committed_key(obj)] -= 1
+
+    if deltas:
+        apply_attendance_deltas(session.connection(), deltas)
+
+
+def period_start(column, period, dialect_name):
+    """SQL expression for the Monday of the week or first day of the month of ``column``."""
+    if dialect_name == 'sqlite':
+        if period == 'week':
+            # Forward to the next Sunday (or stay on one), then back to Monday
+            return func.date(column, 'weekday 0', '-6 days')
+        return func.date(column, 'start of month')
+    return func.date_trunc(period, column).cast(db.Date)
+
+
+def fill_student_summary(connection, table, period, source=None):
+    """Fill a per-student rollup table (weekly or monthly) from the raw Attendance rows.
+
+    ``source`` is any selectable with date, student_id and status columns,
+    by default the attendance table.
+    """
+    source = Attendance.__table__ if source is None else source
+    counts = [func.count(case((source.c.status == status, 1))) for status in STATUSES]
+    start = period_start(source.c.date, period, connection.dialect.name)
+    connection.execute(insert(table).from_select(
+        ['student_id', period, *STATUSES],
+        select(source.c.student_id, start, *counts).group_by(source.c.student_id, start)
+    ))
+
+
+def rebuild_attendance_summaries():
+    """Recompute all rollup tables from the raw Attendance rows, archived ones included."""
+    connection = db.session.connection()
+    daily_table = AttendanceDailySummary.__table__
+    weekly_table = AttendanceWeeklySummary.__table__
+    monthly_table = AttendanceMonthlySummary.__table__
+    source = attendance_records(lambda model: (), 'date', 'student_id', 'status')
+    counts = [func.count(case((source.c.status == status, 1))) for status in STATUSES]
+
+    for table in (daily_table, weekly_table, monthly_table):
+        connection.execute(delete(table))
+
+    connection.execute(insert(daily_table).from_select(
+        ['date', *STATUSES],
+        select(source.c.date, *counts).group_by(source.c.date)
+    ))
+    fill_student_summary(connection, weekly_table, 'week', source)
+    fill_student_summary(connection, monthly_table, 'month', source)
+
+    db.session.commit()
@@ -0,0 +1,159 @@
+from collections import Counter
+
+import pytest
+from sqlalchemy import select, func
+
+from config import Config
+from app import create_app
+from models import (db, User, Attendance, ArchivedAttendance, ChangeLog,
+                    AttendanceDailySummary, AttendanceWeeklySummary, AttendanceMonthlySummary)
+from migrations import upgrade
+from datagen import generate_data
+from identity import load_user
+from summaries import STATUSES, week_start, month_start
+
+# Queries each page may run when it is not cached, with the logged-in user
+# already in the identity cache. A page that needs more fails its test.
+QUERY_BUDGETS = {
+    'main.admin_dashboard': 5,
+    'main.admin_students': 3,
+    'main.admin_tasks': 2,
+    'main.admin_attendance': 4,
+    'main.admin_analytics': 5,
+    'main.admin_deadlines': 5,
+    'main.admin_cohorts': 4,
+    'main.admin_archive': 3,
+    'main.mark_attendance_bulk': 3,
+    'main.student_dashboard': 5,
+    'main.student_tasks': 1,
+    'main.student_attendance': 2,
+    # One more for a delta sync, which checks for changes first
+    'api.list_tasks': 2,
+    'api.list_attendance': 2,
+    # cursor check, entries, and the current rows of each of the two entities
+    'api.list_changes': 4,
+    'api.check_in_summary': 1,
+    'api.me': 0,
+}
+
+
+def make_config(tmp_path, **settings):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        SQLALCHEMY_BINDS = {}
+        WTF_CSRF_ENABLED = False
+        JOB_WORKERS = 0
+        JOB_FILES_DIR = str(tmp_path / 'jobs')
+        PAGE_CACHE = 'memory'
+        IDENTITY_CACHE = 'memory'
+        CHANGE_FEED_SETTLE = 0
+        PROFILING_ENABLED = True
+        QUERY_BUDGETS = dict(QUERY_BUDGETS)
+        QUERY_BUDGET_RAISE = True
+
+    for name, value in settings.items():
+        setattr(TestConfig, name, value)
+    return TestConfig
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a small generated database: an admin, 40 students in two cohorts, 30 days."""
+    app = create_app(make_config(tmp_path))
+    with app.app_context():
+        db.create_all()
+        upgrade(log=lambda message: None)
+        admin = User(username='admin', email='admin@example.com', full_name='Admin', role='admin')
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        generate_data(40, 30, 3, cohorts=2, log=lambda message: None)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+
+
+def login(app, username):
+    """A test client logged in as ``username``, and the user's id.
+
+    Requests are made outside any app context, so each gets its own ``g``.
+    """
+    with app.app_context():
+        user_id = db.session.scalar(select(User.id).where(User.username == username))
+        # Put the user in the identity cache, as it is for every request after the first
+        load_user(user_id)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client, user_id
+
+
+def admin_id():
+    return db.session.scalar(select(User.id).where(User.username == 'admin'))
+
+
+def student_ids(count=None):
+    query = select(User.id).where(User.role == 'student', User.is_active == True).order_by(User.id)
+    return list(db.session.scalars(query.limit(count)))
+
+
+def active_student(app):
+    with app.app_context():
+        return db.session.scalar(select(User.username).where(User.role == 'student', User.is_active == True)
+                                 .order_by(User.id))
+
+
+def expected_rollups():
+    """Daily, weekly and monthly counts of the live and archived attendance records."""
+    rows = db.session.execute(
+        select(Attendance.date, Attendance.student_id, Attendance.status).union_all(
+            select(ArchivedAttendance.date, ArchivedAttendance.student_id, ArchivedAttendance.status))
+    ).all()
+    daily, weekly, monthly = Counter(), Counter(), Counter()
+    for day, student_id, status in rows:
+        daily[(day, status)] += 1
+        weekly[(student_id, week_start(day), status)] += 1
+        monthly[(student_id, month_start(day), status)] += 1
+    return daily, weekly, monthly
+
+
+def stored_rollups():
+    """The same counts read from the rollup tables."""
+    daily, weekly, monthly = Counter(), Counter(), Counter()
+    for row in AttendanceDailySummary.query:
+        daily.update({(row.date, status): getattr(row, status) for status in STATUSES})
+    for row in AttendanceWeeklySummary.query:
+        weekly.update({(row.student_id, row.week, status): getattr(row, status) for status in STATUSES})
+    for row in AttendanceMonthlySummary.query:
+        monthly.update({(row.student_id, row.month, status): getattr(row, status) for status in STATUSES})
+    # Counter equality ignores the zero counts rollup rows keep
+    return +daily, +weekly, +monthly
+
+
+def latest_change():
+    return db.session.scalar(select(func.max(ChangeLog.id))) or 0
+
+
+def changes_after(cursor):
+    """``{(entity, action, entity_id)}`` logged after ``cursor``."""
+    return {(entry.entity, entry.action, entry.entity_id)
+            for entry in ChangeLog.query.filter(ChangeLog.id > cursor)}
+
+
+def work_queue(worker_id='test-worker'):
+    """Run the due queued jobs one by one in this thread, as a worker would."""
+    from jobs import claim_job, run_job
+    while True:
+        job_id = claim_job(worker_id)
+        if job_id is None:
+            return
+        run_job(job_id, worker_id)
@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+from sqlalchemy import select, func
+
+from models import db, Cohort, Attendance
+from analytics import absence_streaks, student_summaries, cohort_rates, attendance_report
+from archive import archive_term, close_term
+from conftest import admin_id
+
+FROM, TO = date.today() - timedelta(days=60), date.today()
+
+
+def archive_first_cohort():
+    first, second = Cohort.query.order_by(Cohort.id).all()
+    first.term, second.term = 'T1', 'T2'
+    db.session.commit()
+    close_term('T1', date.today() - timedelta(days=1))
+    archive_term('T1')
+    return first.id
+
+
+def cohort_figures(cohort_id):
+    return (absence_streaks(FROM, TO, cohort_id), student_summaries(FROM, TO, cohort_id),
+            cohort_rates('week', FROM, TO, cohort_id))
+
+
+def test_archived_terms_still_count(ctx):
+    first = db.session.scalar(select(Cohort.id).order_by(Cohort.id))
+    before = absence_streaks(FROM, TO), cohort_figures(first)
+    assert before[0] and before[1][1]
+    archive_first_cohort()
+    assert Attendance.query.filter_by(cohort_id=first).count() == 0
+    assert (absence_streaks(FROM, TO), cohort_figures(first)) == before
+
+
+def test_streak_runs_on_across_the_archived_term(ctx):
+    first = db.session.scalar(select(Cohort.id).order_by(Cohort.id))
+    last_day = db.session.scalar(select(func.max(Attendance.date)))
+    record = Attendance.query.filter_by(cohort_id=first, date=last_day).first()
+    record.status = 'absent'
+    student_id = record.student_id
+    db.session.commit()
+    archive_first_cohort()
+    current = absence_streaks(FROM, TO)[student_id]['current']
+    assert current > 0
+    # An absence of the next term, on the next school day, continues the run
+    next_day = last_day + timedelta(days=1)
+    db.session.add(Attendance(date=next_day, student_id=student_id, status='absent', marked_by=admin_id()))
+    db.session.commit()
+    assert absence_streaks(FROM, next_day)[student_id]['current'] == current + 1
+
+
+def test_report_after_archiving(ctx):
+    first = db.session.scalar(select(Cohort.id).order_by(Cohort.id))
+    before = attendance_report(FROM, TO, 90, first)
+    archive_first_cohort()
+    after = attendance_report(FROM, TO, 90, first)
+    assert after['at_risk'] == before['at_risk'] and after['students'] == before['students']
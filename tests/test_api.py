@@ -0,0 +1,127 @@
+from datetime import date, datetime
+
+from sqlalchemy import update
+from werkzeug.http import http_date
+
+from models import db, User, Task, Attendance
+from conftest import login, admin_id, student_ids
+
+
+def set_updated_at(model, ids, value):
+    db.session.execute(update(model).where(model.id.in_(ids)).values(updated_at=value))
+    db.session.commit()
+
+
+def all_pages(client, url):
+    rows, cursor = [], None
+    while True:
+        page = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        rows += page['data']
+        cursor = page['next_cursor']
+        if cursor is None:
+            return rows
+
+
+def test_cursor_pages_cover_every_row_once(app):
+    admin, _ = login(app, 'admin')
+    rows = all_pages(admin, '/api/v1/tasks?limit=7&fields=title')
+    with app.app_context():
+        assert sorted(row['id'] for row in rows) == sorted(task.id for task in Task.query)
+    assert set(rows[0]) == {'id', 'title'}
+    assert admin.get('/api/v1/tasks?fields=secret').status_code == 400
+
+
+def test_delta_sync_resends_the_last_modified_second(app):
+    admin, _ = login(app, 'admin')
+    with app.app_context():
+        first, second, *rest = [task.id for task in Task.query.order_by(Task.id)]
+        set_updated_at(Task, [second, *rest], datetime(2020, 1, 1, 9))
+        set_updated_at(Task, [first], datetime(2020, 1, 1, 10, 0, 0, 200000))
+    response = admin.get('/api/v1/tasks?limit=1000')
+    last_modified = response.headers['Last-Modified']
+    assert last_modified == http_date(datetime(2020, 1, 1, 10))
+
+    # Committed later in the same second as the row the client saw last
+    with app.app_context():
+        set_updated_at(Task, [second], datetime(2020, 1, 1, 10, 0, 0, 900000))
+    response = admin.get('/api/v1/tasks', headers={'If-Modified-Since': last_modified})
+    assert {row['id'] for row in response.get_json()['data']} == {first, second}
+
+    later = http_date(datetime(2020, 1, 1, 10, 0, 1))
+    assert admin.get('/api/v1/tasks', headers={'If-Modified-Since': later}).status_code == 304
+    response = admin.get('/api/v1/tasks?updated_since=2020-01-01T10:00:00.500000')
+    assert [row['id'] for row in response.get_json()['data']] == [second]
+
+
+def test_task_batches_are_all_or_nothing(app):
+    admin, _ = login(app, 'admin')
+    with app.app_context():
+        student = student_ids(1)[0]
+        count = Task.query.count()
+    due = date.today().isoformat()
+    response = admin.post('/api/v1/tasks', json={'tasks': [
+        {'title': 'Lab report', 'due_date': due, 'student_id': student},
+        {'title': 'Lab report', 'due_date': due, 'student_id': 999999},
+    ]})
+    assert response.status_code == 422
+    assert response.get_json()['errors'] == [{'index': 1, 'errors': {'student_id': 'Not an active student.'}}]
+    with app.app_context():
+        assert Task.query.count() == count
+
+    response = admin.post('/api/v1/tasks', json={'tasks': [
+        {'title': 'Lab report', 'due_date': due, 'student_id': student, 'priority': 'high'}]})
+    assert response.status_code == 201
+    task_id = response.get_json()['created'][0]
+    response = admin.patch('/api/v1/tasks', json={'tasks': [{'id': task_id, 'status': 'completed'}]})
+    assert response.get_json() == {'updated': [task_id]}
+    with app.app_context():
+        assert db.session.get(Task, task_id).status == 'completed'
+
+
+def test_students_may_only_change_the_status_of_their_own_tasks(app):
+    with app.app_context():
+        first, second = student_ids(2)
+        username = db.session.get(User, first).username
+        own = Task.query.filter_by(student_id=first).first().id
+        other = Task.query.filter_by(student_id=second).first().id
+    student, _ = login(app, username)
+    assert student.patch('/api/v1/tasks', json={'tasks': [{'id': own, 'status': 'in_progress'}]}).status_code == 200
+    assert student.patch('/api/v1/tasks', json={'tasks': [{'id': own, 'title': 'Skip'}]}).status_code == 422
+    assert student.patch('/api/v1/tasks', json={'tasks': [{'id': other, 'status': 'completed'}]}).status_code == 422
+    assert student.post('/api/v1/tasks', json={'tasks': [{'title': 'x'}]}).status_code == 403
+
+
+def test_batch_items_need_integer_ids(app):
+    admin, _ = login(app, 'admin')
+    with app.app_context():
+        record = Attendance.query.first().id
+    for url, key in (('/api/v1/attendance', 'records'), ('/api/v1/tasks', 'tasks')):
+        response = admin.patch(url, json={key: [{'id': record, 'status': 'late'}, {'id': [record]},
+                                                {'id': {'id': record}}]})
+        assert response.status_code == 400
+        assert [error['index'] for error in response.get_json()['errors']] == [1, 2]
+    assert admin.patch('/api/v1/attendance', json={'records': []}).status_code == 400
+
+
+def test_attendance_batches(app):
+    admin, _ = login(app, 'admin')
+    with app.app_context():
+        first, second = student_ids(2)
+    response = admin.post('/api/v1/attendance', json={'records': [
+        {'student_id': first, 'date': '2030-01-07', 'status': 'present'},
+        {'student_id': first, 'date': '2030-01-08', 'status': 'late'},
+        {'student_id': second, 'date': 'Monday', 'status': 'present'},
+    ]})
+    assert response.status_code == 201
+    report = response.get_json()
+    assert len(report['inserted']) == 2 and report['skipped'][0]['date'] == 'Monday'
+
+    with app.app_context():
+        record = Attendance.query.filter_by(student_id=first, date=date(2030, 1, 7)).one().id
+    response = admin.patch('/api/v1/attendance', json={'records': [{'id': record, 'status': 'absent',
+                                                                     'remarks': ' Sick '}]})
+    assert response.get_json() == {'updated': [record]}
+    with app.app_context():
+        updated = db.session.get(Attendance, record)
+        assert (updated.status, updated.remarks, updated.marked_by) == ('absent', 'Sick', admin_id())
+    assert admin.patch('/api/v1/attendance', json={'records': [{'id': record, 'status': 'gone'}]}).status_code == 422
@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select, delete, func, inspect
+from sqlalchemy.schema import CreateTable
+
+from models import db, User, Cohort, Task, Attendance, ArchivedAttendance, ArchivedTask
+from archive import archive_term, close_term, cohort_terms
+from migrations import upgrade, schema_migrations
+from search import create_search_indexes, search_tasks
+from conftest import login, admin_id, expected_rollups, stored_rollups, latest_change, changes_after
+
+YESTERDAY = date.today() - timedelta(days=1)
+# After the generated records, so a student has none on it yet
+DAY = date.today() + timedelta(days=7)
+
+
+def give_terms():
+    # The first generated cohort gets T1, the second T2
+    first, second = Cohort.query.order_by(Cohort.id).all()
+    first.term, second.term = 'T1', 'T2'
+    db.session.commit()
+    return first.id, second.id
+
+
+def cohort_student(cohort_id):
+    return db.session.scalar(select(User.id).where(User.cohort_id == cohort_id, User.is_active == True)
+                             .order_by(User.id))
+
+
+def add_records(student_id, day):
+    # Newest rows, so each holds the highest id of its table
+    record = Attendance(date=day, student_id=student_id, status='present', marked_by=admin_id())
+    task = Task(title='Essay', due_date=day, status='completed', student_id=student_id, created_by=admin_id())
+    db.session.add_all([record, task])
+    db.session.commit()
+    return record.id, task.id
+
+
+def test_open_term_is_not_archived(ctx):
+    give_terms()
+    with pytest.raises(ValueError):
+        archive_term('T1')
+    close_term('T1', date.today())
+    with pytest.raises(ValueError):
+        archive_term('T1')
+    close_term('T1', YESTERDAY)
+    assert dict((term, ends_on) for term, _, ends_on in cohort_terms())['T1'] == YESTERDAY
+
+
+def test_archiving_keeps_rollups_and_logs_deletes(ctx):
+    first, _ = give_terms()
+    close_term('T1', YESTERDAY)
+    archived_ids = set(db.session.scalars(select(Attendance.id).where(Attendance.cohort_id == first)))
+    cursor = latest_change()
+    assert archive_term('T1')['attendance'] == len(archived_ids) > 0
+    assert stored_rollups() == expected_rollups()
+    deleted = {entity_id for entity, action, entity_id in changes_after(cursor)
+               if (entity, action) == ('attendance', 'delete')}
+    assert deleted == archived_ids
+    assert Attendance.query.filter_by(cohort_id=first).count() == 0
+
+
+def test_archived_ids_are_not_reused(ctx):
+    first, second = give_terms()
+    archived = add_records(cohort_student(first), DAY)
+    close_term('T1', YESTERDAY)
+    archive_term('T1')
+
+    # SQLite would give the archived ids to these without AUTOINCREMENT
+    added = add_records(cohort_student(second), DAY)
+    assert added[0] > archived[0] and added[1] > archived[1]
+    close_term('T2', YESTERDAY)
+    moved = archive_term('T2')
+    assert moved['attendance'] > 0 and moved['tasks'] > 0
+    assert db.session.get(ArchivedAttendance, added[0]).term == 'T2'
+    assert db.session.get(ArchivedTask, added[1]).term == 'T2'
+
+
+def test_migration_rebuilds_tables_without_autoincrement(app):
+    with app.app_context():
+        first, _ = give_terms()
+        archived = add_records(cohort_student(first), DAY)
+        close_term('T1', YESTERDAY)
+        archive_term('T1')
+        # Put back the tables as databases from before migration 11 have them
+        with db.engine.begin() as connection:
+            for model in (Task, Attendance):
+                name = model.__table__.name
+                connection.exec_driver_sql(f'CREATE TABLE old_{name} AS SELECT * FROM "{name}"')
+                connection.exec_driver_sql(f'DROP TABLE "{name}"')
+                create = str(CreateTable(model.__table__).compile(dialect=connection.dialect))
+                connection.exec_driver_sql(create.replace(' AUTOINCREMENT', ''))
+                connection.exec_driver_sql(f'INSERT INTO "{name}" SELECT * FROM old_{name}')
+                connection.exec_driver_sql(f'DROP TABLE old_{name}')
+                connection.exec_driver_sql('DELETE FROM sqlite_sequence WHERE name = ?', (name,))
+            create_search_indexes(connection)
+            connection.execute(delete(schema_migrations).where(schema_migrations.c.version == 11))
+        count = Task.query.count()
+
+        assert upgrade(log=lambda message: None) == 1
+        assert Task.query.count() == count
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('attendance')}
+        assert {index.name for index in Attendance.__table__.indexes} <= indexes
+        added = add_records(cohort_student(first), DAY)
+        assert added[0] > archived[0] and added[1] > archived[1]
+        # The search triggers came back with the task table
+        assert added[1] in {row.id for row in search_tasks('essay', 100)}
+
+
+def test_archive_api(app):
+    admin, _ = login(app, 'admin')
+    with app.app_context():
+        give_terms()
+        close_term('T1', YESTERDAY)
+    terms = {entry['term']: entry for entry in admin.get('/api/v1/archive').get_json()['data']}
+    assert terms['T1']['closed'] and not terms['T2']['closed']
+    assert admin.post('/api/v1/archive', json={'term': 'T2'}).status_code == 422
+    response = admin.post('/api/v1/archive', json={'term': 'T1'})
+    assert response.status_code == 202 and response.get_json()['kind'] == 'archive_term'
@@ -0,0 +1,113 @@
+from datetime import date
+
+from sqlalchemy import select, insert, update
+
+import bulk
+from models import db, User, Task, Attendance
+from bulk import bulk_mark_attendance, bulk_assign_task
+from conftest import login, admin_id, student_ids, expected_rollups, stored_rollups, latest_change, changes_after
+
+DAY = date(2030, 1, 7)
+
+
+def test_bulk_marking_keeps_rollups_and_change_log(ctx):
+    students = student_ids(5)
+    cursor = latest_change()
+    report = bulk_mark_attendance(DAY, [{'student_id': student_id, 'status': 'present'} for student_id in students],
+                                  admin_id())
+    assert sorted(report['inserted']) == students
+    assert stored_rollups() == expected_rollups()
+
+    report = bulk_mark_attendance(DAY, [{'student_id': student_id, 'status': 'absent'}
+                                        for student_id in students[:3]], admin_id(), overwrite=True)
+    assert sorted(report['updated']) == students[:3]
+    assert stored_rollups() == expected_rollups()
+
+    records = dict(db.session.execute(select(Attendance.student_id, Attendance.id).where(Attendance.date == DAY)).all())
+    assert changes_after(cursor) == (
+        {('attendance', 'insert', records[student_id]) for student_id in students}
+        | {('attendance', 'update', records[student_id]) for student_id in students[:3]}
+    )
+
+
+def test_bulk_marking_skips_invalid_and_marked_entries(ctx):
+    first, second = student_ids(2)
+    bulk_mark_attendance(DAY, [{'student_id': first, 'status': 'present'}], admin_id())
+    report = bulk_mark_attendance(DAY, [
+        {'student_id': first, 'status': 'late'},
+        {'student_id': second, 'status': 'sick'},
+        {'student_id': 'x', 'status': 'present'},
+        {'student_id': 999999, 'status': 'present'},
+    ], admin_id())
+    assert report['inserted'] == [] and report['updated'] == []
+    assert {entry['reason'] for entry in report['skipped']} == {
+        'already marked', "invalid status 'sick'", 'invalid student id', 'not an active student'}
+
+
+def test_concurrently_marked_record_is_skipped(ctx, monkeypatch):
+    first, second = student_ids(2)
+    stamp_cohorts = bulk.stamp_cohorts
+
+    def mark_first_meanwhile(rows):
+        # Another request commits a record for ``first`` after the batch was checked
+        db.session.execute(insert(Attendance.__table__).values(
+            date=DAY, student_id=first, status='late', marked_by=admin_id()))
+        return stamp_cohorts(rows)
+
+    monkeypatch.setattr(bulk, 'stamp_cohorts', mark_first_meanwhile)
+    report = bulk_mark_attendance(DAY, [{'student_id': first, 'status': 'present'},
+                                        {'student_id': second, 'status': 'present'}], admin_id())
+    assert report['inserted'] == [second]
+    assert report['skipped'] == [{'student_id': first, 'reason': 'already marked'}]
+    assert db.session.scalar(select(Attendance.status).where(Attendance.student_id == first,
+                                                             Attendance.date == DAY)) == 'late'
+
+
+def test_bulk_marking_json_endpoint(app):
+    admin, _ = login(app, 'admin')
+    # Writes are not budgeted like the page they share an endpoint with
+    app.config['QUERY_BUDGET_RAISE'] = False
+    with app.app_context():
+        first, second = student_ids(2)
+    response = admin.post('/admin/attendance/bulk', json={
+        'date': DAY.isoformat(), 'records': [{'student_id': first, 'status': 'present'},
+                                             {'student_id': second, 'status': 'absent'}]})
+    assert response.status_code == 200
+    assert sorted(response.get_json()['inserted']) == [first, second]
+
+    assert admin.post('/admin/attendance/bulk', json={'date': 'tomorrow', 'records': []}).status_code == 400
+    assert admin.post('/admin/attendance/bulk', json={'date': DAY.isoformat(), 'records': 'all'}).status_code == 400
+
+
+def test_bulk_assignment_creates_one_task_per_student(ctx):
+    first, second, third = student_ids(3)
+    db.session.execute(update(User).where(User.id == third).values(is_active=False))
+    db.session.commit()
+    cursor = latest_change()
+    report = bulk_assign_task({'title': 'Lab report', 'due_date': DAY}, [first, second, first, third, 999999],
+                              admin_id())
+    assert report['assigned'] == [first, second]
+    assert report['skipped'] == [{'student_id': third, 'reason': 'not an active student'},
+                                 {'student_id': 999999, 'reason': 'not an active student'}]
+    tasks = Task.query.filter_by(title='Lab report').order_by(Task.student_id).all()
+    assert [(task.student_id, task.status, task.priority) for task in tasks] == [
+        (first, 'pending', 'medium'), (second, 'pending', 'medium')]
+    # Each copy is stamped with its student's cohort and logged for the feed
+    assert all(task.cohort_id == db.session.get(User, task.student_id).cohort_id for task in tasks)
+    assert changes_after(cursor) == {('task', 'insert', task.id) for task in tasks}
+
+
+def test_bulk_assignment_json_endpoint(app):
+    admin, _ = login(app, 'admin')
+    with app.app_context():
+        students = student_ids()
+    task = {'title': 'Field trip form', 'due_date': DAY.isoformat(), 'priority': 'high'}
+    response = admin.post('/admin/tasks/bulk', json={**task, 'all_students': True})
+    assert response.status_code == 201
+    assert sorted(response.get_json()['assigned']) == students
+
+    response = admin.post('/admin/tasks/bulk', json={**task, 'student_ids': [999999]})
+    assert response.status_code == 200 and response.get_json()['assigned'] == []
+    response = admin.post('/admin/tasks/bulk', json={'title': 'x', 'due_date': '2000-01-01', 'student_ids': []})
+    assert response.status_code == 400
+    assert set(response.get_json()['errors']) == {'title', 'due_date', 'student_ids'}
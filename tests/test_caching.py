@@ -0,0 +1,63 @@
+from datetime import date
+
+from models import db, Task
+from bulk import bulk_mark_attendance
+from caching import MemoryCache, cached_result, mark_changed
+from conftest import login, active_student, admin_id
+
+
+def test_memory_cache_evicts_oldest_and_expired_entries():
+    cache = MemoryCache(ttl=60, maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    expired = MemoryCache(ttl=-1)
+    expired.set('a', 1)
+    assert expired.get('a') is None
+
+
+def test_cached_result_follows_committed_writes(ctx):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cached_result('count', scopes=['tasks'], compute=compute) == 1
+    assert cached_result('count', scopes=['tasks'], compute=compute) == 1
+    # A rolled back write leaves the cache alone
+    mark_changed(db.session, 'tasks')
+    db.session.rollback()
+    assert cached_result('count', scopes=['tasks'], compute=compute) == 1
+    mark_changed(db.session, 'tasks')
+    db.session.commit()
+    assert cached_result('count', scopes=['tasks'], compute=compute) == 2
+
+
+def test_dashboard_is_revalidated_after_orm_and_core_writes(app):
+    client, student_id = login(app, active_student(app))
+    response = client.get('/student/dashboard')
+    etag = response.headers['ETag'].strip('"')
+    # Unchanged: confirmed without rendering or queries
+    assert client.get('/student/dashboard', headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        bulk_mark_attendance(date(2030, 1, 7), [{'student_id': student_id, 'status': 'present'}], admin_id())
+    response = client.get('/student/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    etag = response.headers['ETag'].strip('"')
+
+    with app.app_context():
+        task = Task.query.filter_by(student_id=student_id).first()
+        task.status = 'completed' if task.status != 'completed' else 'pending'
+        db.session.commit()
+    assert client.get('/student/dashboard', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_pages_are_cached_per_user(app):
+    admin, _ = login(app, 'admin')
+    student, _ = login(app, active_student(app))
+    admin_etag = admin.get('/admin/dashboard').headers['ETag']
+    assert student.get('/admin/dashboard', headers={'If-None-Match': admin_etag}).status_code != 304
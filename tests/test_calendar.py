@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+from models import db, User, Cohort, Attendance
+from archive import archive_term, close_term
+from attendance_calendar import attendance_calendars, calendar_counts
+from conftest import login
+
+FROM, TO = date.today() - timedelta(days=60), date.today()
+
+
+def first_cohort_students():
+    cohort_id = db.session.scalar(select(Cohort.id).order_by(Cohort.id))
+    return list(db.session.scalars(select(User.id).where(User.cohort_id == cohort_id).order_by(User.id).limit(3)))
+
+
+def archive_first_cohort():
+    first, second = Cohort.query.order_by(Cohort.id).all()
+    first.term, second.term = 'T1', 'T2'
+    db.session.commit()
+    close_term('T1', date.today() - timedelta(days=1))
+    archive_term('T1')
+
+
+def test_calendar_matches_records(ctx):
+    student_ids = first_cohort_students()
+    calendars = attendance_calendars(student_ids, FROM, TO)
+    for student_id in student_ids:
+        records = Attendance.query.filter_by(student_id=student_id).all()
+        assert sum(calendar_counts(calendars[student_id]).values()) == len(records) > 0
+        for record in records:
+            assert calendars[student_id][(record.date - FROM).days] == record.status[0].upper()
+
+
+def test_archived_days_stay_on_the_calendar(ctx):
+    student_ids = first_cohort_students()
+    before = attendance_calendars(student_ids, FROM, TO)
+    archive_first_cohort()
+    assert Attendance.query.filter(Attendance.student_id.in_(student_ids)).count() == 0
+    assert attendance_calendars(student_ids, FROM, TO) == before
+
+
+def test_calendar_api(app):
+    with app.app_context():
+        student_id = first_cohort_students()[0]
+        before = attendance_calendars([student_id], FROM, TO)[student_id]
+        archive_first_cohort()
+    client, _ = login(app, 'admin')
+    params = {'from': FROM.isoformat(), 'to': TO.isoformat(), 'student_id': student_id}
+    response = client.get('/api/v1/attendance/calendar', query_string=params)
+    assert response.status_code == 200
+    assert response.json['data'][0]['days'] == before
+    assert client.get('/api/v1/attendance/calendar', query_string={'from': TO, 'to': FROM,
+                                                                    'student_id': student_id}).status_code == 400
@@ -0,0 +1,74 @@
+from datetime import date, datetime, timedelta
+
+from models import db, User, Task, ChangeLog
+from changes import prune_changes
+from conftest import login, admin_id, student_ids, latest_change, changes_after
+
+
+def add_task(student_id, title='Read chapter 4'):
+    task = Task(title=title, due_date=date.today(), student_id=student_id, created_by=admin_id())
+    db.session.add(task)
+    db.session.commit()
+    return task
+
+
+def test_change_log_follows_orm_writes(ctx):
+    first, second = student_ids(2)
+    cursor = latest_change()
+    task = add_task(first)
+    task.status = 'in_progress'
+    db.session.commit()
+    assert changes_after(cursor) == {('task', 'insert', task.id), ('task', 'update', task.id)}
+
+    # A task moved to another student leaves the first student's feed
+    cursor = latest_change()
+    task.student_id = second
+    db.session.commit()
+    entries = ChangeLog.query.filter(ChangeLog.id > cursor).order_by(ChangeLog.id).all()
+    assert [(entry.action, entry.student_id) for entry in entries] == [('delete', first), ('update', second)]
+
+    cursor = latest_change()
+    task_id = task.id
+    db.session.delete(task)
+    db.session.commit()
+    assert changes_after(cursor) == {('task', 'delete', task_id)}
+
+
+def test_feed_pages_changes_after_a_cursor(app):
+    admin, _ = login(app, 'admin')
+    cursor = admin.get('/api/v1/changes').get_json()['cursor']
+    with app.app_context():
+        first, second = student_ids(2)
+        ids = [add_task(first, f'Task {n}').id for n in range(3)]
+
+    page = admin.get(f'/api/v1/changes?since={cursor}&limit=2').get_json()
+    assert [change['id'] for change in page['changes']] == ids[:2] and page['has_more']
+    page = admin.get(f"/api/v1/changes?since={page['cursor']}&limit=2").get_json()
+    assert [change['id'] for change in page['changes']] == ids[2:] and not page['has_more']
+    assert page['changes'][0]['data']['title'] == 'Task 2'
+    assert admin.get(f"/api/v1/changes?since={cursor}&entity=attendance").get_json()['changes'] == []
+    assert admin.get('/api/v1/changes?since=soon').status_code == 400
+    assert admin.get('/api/v1/changes?entity=user').status_code == 400
+
+
+def test_students_follow_only_their_own_changes(app):
+    with app.app_context():
+        first, second = student_ids(2)
+        username = db.session.get(User, first).username
+    student, _ = login(app, username)
+    cursor = student.get('/api/v1/changes').get_json()['cursor']
+    with app.app_context():
+        own = add_task(first).id
+        add_task(second)
+    changes = student.get(f'/api/v1/changes?since={cursor}').get_json()['changes']
+    assert [(change['id'], change['action']) for change in changes] == [(own, 'insert')]
+
+
+def test_pruned_cursor_asks_for_a_resync(app):
+    admin, _ = login(app, 'admin')
+    with app.app_context():
+        first = student_ids(1)[0]
+        for n in range(3):
+            add_task(first, f'Task {n}')
+        assert prune_changes(datetime.utcnow() + timedelta(seconds=1)) > 0
+    assert admin.get('/api/v1/changes?since=1').status_code == 410
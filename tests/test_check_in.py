@@ -0,0 +1,56 @@
+from datetime import time
+
+from loadtest import load_test_users
+from conftest import login
+
+XHR = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def student_not_checked_in(app):
+    with app.app_context():
+        return load_test_users(1, reset=True)[0]
+
+
+def test_check_in_once_a_day(app):
+    student, _ = login(app, student_not_checked_in(app))
+    assert student.get('/api/v1/check-in').get_json()['record'] is None
+    response = student.post('/api/v1/check-in', headers=XHR)
+    assert response.status_code == 201 and response.get_json()['status'] == 'present'
+    # Retrying is harmless
+    response = student.post('/api/v1/check-in', headers=XHR)
+    assert response.status_code == 200 and not response.get_json()['created']
+    assert student.get('/api/v1/check-in').get_json()['record']['status'] == 'present'
+
+
+def test_late_and_closed_check_ins(app):
+    app.config['CHECK_IN_LATE_AFTER'] = time(0, 0)
+    student, _ = login(app, student_not_checked_in(app))
+    assert student.post('/api/v1/check-in', headers=XHR).get_json()['status'] == 'late'
+
+    app.config['CHECK_IN_CLOSES'] = time(0, 0)
+    other, _ = login(app, student_not_checked_in(app))
+    assert other.post('/api/v1/check-in', headers=XHR).status_code == 409
+
+
+def test_cross_site_writes_are_refused(app):
+    student, _ = login(app, student_not_checked_in(app))
+    # What a form on another site can send with the student's cookie
+    assert student.post('/api/v1/check-in').status_code == 403
+    assert student.post('/api/v1/check-in', data='{}', content_type='text/plain').status_code == 403
+    assert student.post('/api/v1/logout').status_code == 403
+    assert student.get('/api/v1/check-in').get_json()['record'] is None
+
+    assert student.post('/api/v1/check-in', json={}).status_code == 201
+    assert student.post('/api/v1/logout', headers=XHR).status_code == 204
+    assert student.get('/api/v1/me').status_code == 401
+
+
+def test_admins_see_todays_counts(app):
+    admin, _ = login(app, 'admin')
+    assert admin.post('/api/v1/check-in', headers=XHR).status_code == 403
+    before = admin.get('/api/v1/check-in').get_json()
+    student, _ = login(app, student_not_checked_in(app))
+    student.post('/api/v1/check-in', headers=XHR)
+    after = admin.get('/api/v1/check-in').get_json()
+    assert after['checked_in'] == before['checked_in'] + 1
+    assert after['present'] == before['present'] + 1
@@ -0,0 +1,42 @@
+from sqlalchemy import inspect
+
+from app import create_app
+from models import db, User
+from migrations import pending_migrations
+from conftest import make_config
+
+
+def test_app_start_does_not_touch_the_database(tmp_path):
+    app = create_app(make_config(tmp_path))
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+        db.engine.dispose()
+
+
+def test_init_db_and_seed(tmp_path):
+    app = create_app(make_config(tmp_path))
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['init-db'])
+    assert result.exit_code == 0 and 'Database initialized.' in result.output
+    # Running it again finds nothing to do
+    assert 'Applied migration' not in runner.invoke(args=['init-db']).output
+
+    result = runner.invoke(args=['seed', '--username', 'head', '--password', 'secret99'])
+    assert "Admin user created: username='head'" in result.output
+    assert "already exists" in runner.invoke(args=['seed', '--username', 'head']).output
+    with app.app_context():
+        assert pending_migrations() == []
+        admin = User.query.filter_by(username='head').one()
+        assert admin.is_admin() and admin.check_password('secret99')
+        db.engine.dispose()
+
+    # The first request of a user loads it into the identity cache
+    app.config['QUERY_BUDGET_RAISE'] = False
+    client = app.test_client()
+    assert client.post('/login', data={'username': 'head', 'password': 'secret99'}).status_code == 302
+    assert client.get('/api/v1/me').get_json()['data']['username'] == 'head'
+
+
+def test_db_status_lists_migrations(app):
+    output = app.test_cli_runner().invoke(args=['db-status']).output
+    assert output.count('applied') == len(output.splitlines()) and 'pending' not in output
@@ -0,0 +1,60 @@
+from datetime import date
+
+from sqlalchemy import select, update
+
+from models import db, User, Cohort, Task, Attendance
+from cohorts import assign_students, stamp_cohorts, cohort_counts, cohort_options
+from caching import cohort_scope
+from conftest import login, admin_id, student_ids
+
+DAY = date(2030, 1, 7)
+
+
+def test_new_records_take_the_student_cohort(ctx):
+    student = db.session.get(User, student_ids(1)[0])
+    task = Task(title='Poster project', due_date=DAY, student_id=student.id, created_by=admin_id())
+    record = Attendance(date=DAY, status='present', student_id=student.id, marked_by=admin_id())
+    db.session.add_all([task, record])
+    db.session.commit()
+    assert task.cohort_id == record.cohort_id == student.cohort_id is not None
+
+    rows = [{'student_id': student.id}, {'student_id': 999999}]
+    assert stamp_cohorts(rows) == {cohort_scope(student.cohort_id)}
+    assert [row['cohort_id'] for row in rows] == [student.cohort_id, None]
+
+
+def test_moving_students_keeps_past_records_in_their_cohort(ctx):
+    new = Cohort(name='Late joiners')
+    db.session.add(new)
+    db.session.commit()
+    moved, stays = student_ids(2)
+    old = db.session.get(User, moved).cohort_id
+    # Records from before cohorts were set up move along with the student
+    unassigned = db.session.scalar(select(Task.id).where(Task.student_id == moved))
+    db.session.execute(update(Task).where(Task.id == unassigned).values(cohort_id=None))
+    db.session.commit()
+
+    assert assign_students(new.id, [moved, admin_id(), 999999]) == 1
+    assert db.session.get(User, moved).cohort_id == new.id
+    assert db.session.get(Task, unassigned).cohort_id == new.id
+    assert Attendance.query.filter_by(student_id=moved, cohort_id=old).count() > 0
+    assert cohort_counts()[new.id] == {'students': 1, 'active': 1}
+    assert [name for _, name, _ in cohort_options()].count('Late joiners') == 1
+
+    assert assign_students(None, [stays]) == 1
+    assert db.session.get(User, stays).cohort_id is None
+
+
+def test_selected_cohort_narrows_admin_pages(app):
+    with app.app_context():
+        first, second = Cohort.query.order_by(Cohort.id).all()
+        first_id, second_id = first.id, second.id
+        outside = User.query.filter_by(cohort_id=second_id, role='student').first().username
+    client, _ = login(app, 'admin')
+    response = client.get('/admin/cohorts/select', query_string={'cohort_id': first_id, 'next': '/admin/students'})
+    assert response.status_code == 302 and response.headers['Location'] == '/admin/students'
+    assert outside not in client.get('/admin/students').get_data(as_text=True)
+    assert client.get('/admin/cohorts/select', query_string={'cohort_id': 999999}).status_code == 404
+    # Leaving out the cohort shows every student again
+    client.get('/admin/cohorts/select')
+    assert outside in client.get('/admin/students').get_data(as_text=True)
@@ -0,0 +1,39 @@
+from flask import g
+from sqlalchemy import select, insert
+
+from app import create_app
+from models import db, User
+from database import REPLICA_BIND
+from conftest import make_config
+
+
+def test_sqlite_pragmas_apply_to_new_connections(ctx):
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == 5000
+        # NORMAL
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+
+
+def test_read_only_views_read_from_the_replica(tmp_path):
+    app = create_app(make_config(tmp_path, SQLALCHEMY_BINDS={REPLICA_BIND: f"sqlite:///{tmp_path / 'replica.db'}"}))
+    try:
+        with app.test_request_context():
+            primary, replica = db.engines[None], db.engines[REPLICA_BIND]
+            reads, writes = select(User.id), insert(User)
+            assert db.session.get_bind(clause=reads) is primary
+            g.read_only = True
+            assert db.session.get_bind(clause=reads) is replica
+            assert db.session.get_bind(clause=writes) is primary
+            for engine in (primary, replica):
+                engine.dispose()
+    finally:
+        # The extension keeps a metadata per bind key it has seen, and the
+        # create_all() of later apps without a replica would look for it
+        db.metadatas.pop(REPLICA_BIND, None)
+
+
+def test_without_a_replica_everything_uses_the_primary(app):
+    with app.test_request_context():
+        g.read_only = True
+        assert db.session.get_bind(clause=select(User.id)) is db.engine
@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+
+from markupsafe import escape
+from sqlalchemy import select, func
+
+from models import db, User, Task, TaskDeadline
+from deadlines import OPEN_STATUSES, scan_deadlines, deadline_counts, student_deadlines
+from conftest import login
+
+TODAY = date.today()
+DAYS = 3
+
+
+def expected_deadlines():
+    horizon = TODAY + timedelta(days=DAYS)
+    return {task.id: (task.student_id, task.due_date, 'overdue' if task.due_date < TODAY else 'due_soon')
+            for task in Task.query.filter(Task.status.in_(OPEN_STATUSES), Task.due_date <= horizon)}
+
+
+def stored_deadlines():
+    return {row.task_id: (row.student_id, row.due_date, row.kind) for row in TaskDeadline.query}
+
+
+def test_scan_matches_open_tasks(ctx):
+    result = scan_deadlines(TODAY, DAYS)
+    expected = expected_deadlines()
+    assert result['added'] == len(expected) > 0
+    assert stored_deadlines() == expected
+    assert scan_deadlines(TODAY, DAYS) == {**result, 'added': 0}
+
+
+def test_rescan_updates_and_removes(ctx):
+    scan_deadlines(TODAY, DAYS)
+    due_soon = Task.query.filter(Task.id.in_(
+        select(TaskDeadline.task_id).where(TaskDeadline.kind == 'due_soon'))).first()
+    overdue = Task.query.filter(Task.id.in_(
+        select(TaskDeadline.task_id).where(TaskDeadline.kind == 'overdue'))).first()
+    overdue.status = 'completed'
+    db.session.commit()
+    db.session.execute(TaskDeadline.__table__.update().values(notified_at=func.current_timestamp()))
+    db.session.commit()
+
+    # The next day the due-soon task may be overdue; a finished one is gone
+    result = scan_deadlines(TODAY + timedelta(days=DAYS + 1), DAYS)
+    assert result['removed'] >= 1
+    stored = {row.task_id: row for row in TaskDeadline.query}
+    assert overdue.id not in stored
+    assert stored[due_soon.id].kind == 'overdue' and stored[due_soon.id].notified_at is None
+
+
+def test_student_sees_their_deadlines(app):
+    with app.app_context():
+        scan_deadlines(TODAY, DAYS)
+        counts = deadline_counts()
+        assert counts['overdue'] + counts['due_soon'] == len(expected_deadlines())
+        username = db.session.scalar(select(User.username).join(TaskDeadline, TaskDeadline.student_id == User.id)
+                                     .where(User.is_active == True).limit(1))
+    client, student_id = login(app, username)
+    with app.app_context():
+        titles = [task.title for _, task, _ in student_deadlines(student_id)]
+    response = client.get('/student/dashboard')
+    assert response.status_code == 200
+    assert titles
+    for title in titles:
+        assert str(escape(title)) in response.get_data(as_text=True)
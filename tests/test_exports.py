@@ -0,0 +1,43 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select, func
+
+from models import db, Task, Attendance
+from exports import export_stream, ATTENDANCE_FIELDS, TASK_FIELDS
+from conftest import login, student_ids
+
+
+def test_csv_export_has_every_record(ctx):
+    chunks = list(export_stream('attendance', 'csv'))
+    # The header, then one chunk per row
+    assert len(chunks) == Attendance.query.count() + 1
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert list(rows[0]) == ATTENDANCE_FIELDS
+    assert [(row['date'], int(row['id'])) for row in rows] == sorted(
+        (day.isoformat(), record_id) for day, record_id in db.session.execute(select(Attendance.date, Attendance.id)))
+
+
+def test_jsonl_export_filters(ctx):
+    student_id = student_ids(1)[0]
+    rows = [json.loads(line) for line in export_stream('tasks', 'jsonl', student_id=student_id, status='pending')]
+    assert {row['id'] for row in rows} == set(db.session.scalars(
+        select(Task.id).where(Task.student_id == student_id, Task.status == 'pending')))
+    assert all(list(row) == TASK_FIELDS for row in rows)
+
+
+def test_export_route_streams_one_day(app):
+    client, _ = login(app, 'admin')
+    with app.app_context():
+        day = db.session.scalar(select(func.max(Attendance.date)))
+        count = Attendance.query.filter_by(date=day).count()
+    response = client.get('/admin/export/attendance', query_string={'date': day.isoformat()})
+    assert response.status_code == 200 and response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'attachment; filename=attendance-' in response.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == count and {row['date'] for row in rows} == {day.isoformat()}
+
+    assert client.get('/admin/export/attendance', query_string={'format': 'xml'}).status_code == 400
+    assert client.get('/admin/export/users').status_code == 404
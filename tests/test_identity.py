@@ -0,0 +1,35 @@
+from models import db, User, Cohort
+from cohorts import assign_students
+from conftest import login, active_student
+
+
+def test_me_is_served_from_the_identity_cache(app):
+    client, student_id = login(app, active_student(app))
+    # api.me has a budget of 0 queries
+    data = client.get('/api/v1/me').get_json()['data']
+    assert data['id'] == student_id
+
+
+def test_identity_cache_follows_user_changes(app):
+    client, student_id = login(app, active_student(app))
+    # The first request after each change reloads the user, one query over budget
+    app.config['QUERY_BUDGET_RAISE'] = False
+    with app.app_context():
+        db.session.get(User, student_id).full_name = 'Renamed Student'
+        db.session.commit()
+    assert client.get('/api/v1/me').get_json()['data']['full_name'] == 'Renamed Student'
+
+    # Cohort moves are Core updates
+    with app.app_context():
+        cohort_id = db.session.scalar(db.select(Cohort.id).order_by(Cohort.id.desc()))
+        assign_students(cohort_id, [student_id])
+    assert client.get('/api/v1/me').get_json()['data']['cohort_id'] == cohort_id
+
+
+def test_deactivated_user_is_logged_out(app):
+    client, student_id = login(app, active_student(app))
+    app.config['QUERY_BUDGET_RAISE'] = False
+    with app.app_context():
+        db.session.get(User, student_id).is_active = False
+        db.session.commit()
+    assert client.get('/api/v1/me').status_code == 401
@@ -0,0 +1,77 @@
+import io
+import json
+from datetime import date
+
+from models import User, Cohort, Task, Attendance, Job
+from imports import csv_rows, import_students, import_tasks, import_attendance
+from conftest import login, admin_id, active_student, expected_rollups, stored_rollups, latest_change, changes_after, \
+    work_queue
+
+DAY = date(2030, 1, 7)
+
+
+def rows(text):
+    return csv_rows(io.BytesIO(text.encode('utf-8-sig')))
+
+
+def test_students_import_in_batches(ctx):
+    cohort = Cohort.query.first()
+    report = import_students(rows(
+        'username,email,full_name,password,cohort\n'
+        f'newstudent1,new1@example.com,New One,secret1,{cohort.name}\n'
+        'newstudent2,new2@example.com,New Two,,\n'
+        'newstudent1,other@example.com,Duplicate,,\n'
+        'x,not-an-email,N,123,Nowhere\n'
+        'newstudent3,new3@example.com,New Three,,\n'
+    ), batch_size=2, default_password='welcome1').to_dict()
+    assert report['imported'] == 3
+    assert [error['line'] for error in report['errors']] == [4, 5]
+    assert len(report['errors'][1]['errors']) == 5
+
+    first, second = (User.query.filter_by(username=name).one() for name in ('newstudent1', 'newstudent2'))
+    assert first.cohort_id == cohort.id and second.cohort_id is None
+    assert first.check_password('secret1') and second.check_password('welcome1')
+
+
+def test_tasks_import_logs_changes(app, ctx):
+    username = active_student(app)
+    cursor = latest_change()
+    report = import_tasks(rows(
+        'student_username,title,description,due_date,priority,status\n'
+        f'{username},Read chapter 4,,2030-01-07,high,\n'
+        f'nobody,Read chapter 5,,07/01/2030,urgent,done\n'
+    ), admin_id()).to_dict()
+    assert report['imported'] == 1 and report['errors'][0]['line'] == 3
+    assert len(report['errors'][0]['errors']) == 4
+    task = Task.query.filter_by(title='Read chapter 4').one()
+    assert (task.status, task.priority, task.due_date) == ('pending', 'high', DAY)
+    assert changes_after(cursor) == {('task', 'insert', task.id)}
+
+
+def test_attendance_import_keeps_rollups(app, ctx):
+    username = active_student(app)
+    marked = Attendance.query.join(User, User.id == Attendance.student_id).filter(User.username == username).first()
+    report = import_attendance(rows(
+        'student_username,date,status,remarks\n'
+        f'{username},2030-01-07,present,\n'
+        f'{username},2030-01-07,late,\n'
+        f'{username},{marked.date.isoformat()},absent,\n'
+        f'{username},2030-01-08,sick,\n'
+    ), admin_id(), batch_size=1).to_dict()
+    assert report['imported'] == 1
+    assert [error['line'] for error in report['errors']] == [3, 4, 5]
+    assert stored_rollups() == expected_rollups()
+
+
+def test_upload_is_imported_by_a_job(app):
+    client, _ = login(app, 'admin')
+    upload = (io.BytesIO(b'username,email,full_name\nuploaded1,up1@example.com,Up One\n'), 'students.csv')
+    response = client.post('/admin/import', data={'kind': 'students', 'file': upload, 'batch_size': 100,
+                                                   'default_password': 'welcome1'})
+    assert response.status_code == 302
+    with app.app_context():
+        work_queue()
+        job = Job.query.filter_by(kind='import').one()
+        assert job.status == 'succeeded'
+        assert json.loads(job.result)['imported'] == 1
+        assert User.query.filter_by(username='uploaded1').one().check_password('welcome1')
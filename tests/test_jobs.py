@@ -0,0 +1,112 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, func
+
+import jobs
+from models import db, Job
+from jobs import enqueue, job_handler, requeue_stale_jobs, schedule_periodic_jobs, queue_if_idle
+from conftest import login, work_queue
+
+calls = []
+
+
+@job_handler('test_echo')
+def echo_job(job, payload):
+    job.progress(50, 'halfway')
+    return payload
+
+
+@job_handler('test_flaky', max_attempts=2)
+def flaky_job(job, payload):
+    calls.append(job.attempt)
+    raise RuntimeError('flaky')
+
+
+def writes_during(func, *args):
+    statements = []
+
+    def record(conn, cursor, statement, *rest):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        result = func(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return result, statements
+
+
+def test_job_runs_and_records_its_result(ctx):
+    job = enqueue('test_echo', {'n': 1})
+    work_queue()
+    db.session.refresh(job)
+    assert (job.status, job.progress, json.loads(job.result)) == ('succeeded', 100, {'n': 1})
+
+
+def test_failed_job_is_retried_then_fails(app):
+    app.config['JOB_RETRY_DELAY'] = 0
+    calls.clear()
+    with app.app_context():
+        job = enqueue('test_flaky')
+        work_queue()
+        work_queue()
+        db.session.refresh(job)
+        assert calls == [1, 2]
+        assert job.status == 'failed' and 'RuntimeError: flaky' in job.error
+
+
+def test_stale_jobs_are_requeued_and_idle_checks_do_not_write(ctx):
+    assert writes_during(requeue_stale_jobs, 60) == (0, [])
+    job = enqueue('test_echo')
+    jobs.claim_job('gone')
+    db.session.execute(db.update(Job).where(Job.id == job.id)
+                       .values(heartbeat_at=datetime.utcnow() - timedelta(minutes=5)))
+    db.session.commit()
+    assert requeue_stale_jobs(60) == 1
+    db.session.refresh(job)
+    assert (job.status, job.worker) == ('queued', None)
+
+
+def test_periodic_jobs_are_queued_once(ctx):
+    schedule = {'test_echo': 3600}
+    schedule_periodic_jobs(schedule)
+    # A kind already queued is skipped without a write
+    assert writes_during(schedule_periodic_jobs, schedule)[1] == []
+    # Two processes past the check at once: only one of them queues it
+    assert not queue_if_idle('test_echo', datetime.utcnow())
+    assert db.session.scalar(select(func.count()).where(Job.kind == 'test_echo')) == 1
+
+    # The next run is due an interval after the last one
+    work_queue()
+    last = db.session.scalar(select(Job.run_after).where(Job.kind == 'test_echo'))
+    schedule_periodic_jobs(schedule)
+    due = db.session.scalar(select(func.max(Job.run_after)).where(Job.kind == 'test_echo', Job.status == 'queued'))
+    assert due == last + timedelta(seconds=3600)
+
+
+def test_export_job_through_the_api(app):
+    admin, _ = login(app, 'admin')
+    response = admin.post('/api/v1/exports', json={'kind': 'tasks', 'format': 'jsonl'})
+    assert response.status_code == 202
+    with app.app_context():
+        work_queue()
+    job = admin.get(response.headers['Location']).get_json()
+    assert job['status'] == 'succeeded' and job['result']['rows'] > 0
+    download = admin.get(job['download_url'])
+    assert download.status_code == 200
+    assert len(download.get_data(as_text=True).splitlines()) == job['result']['rows']
+    assert admin.post('/api/v1/exports', json={'kind': 'users'}).status_code == 422
+
+
+def test_first_request_starts_the_workers(app):
+    app.config.update(JOB_WORKERS=1, JOB_SCHEDULE={})
+    jobs.start_workers_on_first_request(app)
+    admin, _ = login(app, 'admin')
+    admin.get('/api/v1/me')
+    pool = jobs._pools.pop(app)
+    try:
+        assert pool.pid is not None and not pool.stopping.is_set()
+    finally:
+        pool.stop()
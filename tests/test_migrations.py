@@ -0,0 +1,47 @@
+from sqlalchemy import delete, inspect, text
+
+from models import db, Attendance
+from migrations import upgrade, pending_migrations, schema_migrations, MIGRATIONS
+from query_plans import full_table_scans
+
+
+def test_versions_are_unique_and_in_order():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions)) == list(range(1, len(versions) + 1))
+
+
+def test_upgrade_is_idempotent(ctx):
+    assert pending_migrations() == []
+    assert upgrade(log=lambda message: None) == 0
+
+
+def test_migration_restores_a_missing_index(ctx):
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP INDEX idx_attendance_date_status'))
+        connection.execute(delete(schema_migrations).where(schema_migrations.c.version == 1))
+    assert [version for version, _, _ in pending_migrations()] == [1]
+    applied = []
+    assert upgrade(log=applied.append) == 1
+    assert applied[0].startswith('Applied migration 1:')
+    indexes = {index['name'] for index in inspect(db.engine).get_indexes(Attendance.__tablename__)}
+    assert 'idx_attendance_date_status' in indexes
+
+
+def test_full_table_scans_are_found(ctx):
+    with db.engine.connect() as connection:
+        assert full_table_scans(connection, 'SELECT * FROM attendance WHERE remarks = ?', ('late bus',)) == [
+            'attendance']
+        assert full_table_scans(connection, 'SELECT * FROM attendance WHERE date = ? AND status = ?',
+                                ('2030-01-07', 'present')) == []
+        # Scans of a subquery's result are checked with the subquery itself
+        assert full_table_scans(connection, 'SELECT count(*) FROM (SELECT remarks FROM attendance '
+                                'WHERE date = ? UNION ALL SELECT remarks FROM archived_attendance) AS anon_1',
+                                ('2030-01-07',)) == ['archived_attendance']
+
+
+def test_benchmark_queries_use_indexes(app):
+    # The scenarios log in fresh users, so the page budgets do not apply
+    app.config.update(QUERY_BUDGET_RAISE=False, PROFILING_ENABLED=False)
+    result = app.test_cli_runner().invoke(args=['check-query-plans'])
+    assert result.exit_code == 0, result.output
+    assert 'No full table scans.' in result.output
@@ -0,0 +1,51 @@
+from datetime import date, datetime
+
+from models import db, User, Attendance
+from pagination import encode_cursor, decode_cursor, keyset_paginate
+from conftest import login
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(date(2024, 5, 1), 7)) == (date(2024, 5, 1), 7)
+    moment = datetime(2024, 5, 1, 8, 30, 15)
+    assert decode_cursor(encode_cursor(moment, 7), datetime) == (moment, 7)
+    # Names may hold the separator; the id is after the last one
+    assert decode_cursor(encode_cursor('Smith: Jo', 3), str) == ('Smith: Jo', 3)
+    for cursor in (None, '', 'garbage', '2024-13-01:1', '2024-05-01:x'):
+        assert decode_cursor(cursor) is None
+
+
+def all_pages(query, sort_column, id_column, per_page, descending):
+    pages, cursor = [], None
+    while True:
+        page = keyset_paginate(query, sort_column, id_column, cursor, per_page, descending)
+        pages.append(page.items)
+        if not page.has_next:
+            return pages
+        cursor = page.next_cursor
+
+
+def test_pages_cover_every_row_once(ctx):
+    for query, sort_column, descending in ((Attendance.query, Attendance.date, True),
+                                           (User.query.filter_by(role='student'), User.full_name, False)):
+        model = sort_column.class_
+        pages = all_pages(query, sort_column, model.id, 7, descending)
+        assert all(len(page) == 7 for page in pages[:-1]) and 0 < len(pages[-1]) <= 7
+        rows = [row for page in pages for row in page]
+        keys = [(getattr(row, sort_column.key), row.id) for row in rows]
+        assert keys == sorted(keys, reverse=descending)
+        assert len(rows) == query.count()
+
+
+def test_admin_listings_page_by_cursor(app):
+    app.config['STUDENTS_PER_PAGE'] = 5
+    client, _ = login(app, 'admin')
+    first = client.get('/admin/students')
+    assert first.status_code == 200
+    with app.app_context():
+        students = User.query.filter_by(role='student').order_by(User.full_name, User.id).all()
+        cursor = encode_cursor(students[4].full_name, students[4].id)
+    second = client.get('/admin/students', query_string={'cursor': cursor}).get_data(as_text=True)
+    assert students[5].username in second and students[4].username not in second
+    # A malformed cursor starts from the first page
+    assert client.get('/admin/students', query_string={'cursor': 'garbage'}).status_code == 200
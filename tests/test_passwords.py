@@ -0,0 +1,49 @@
+from sqlalchemy import delete
+from sqlalchemy.schema import CreateTable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import db, User
+from migrations import upgrade, schema_migrations
+from passwords import hash_passwords, needs_rehash
+
+
+def test_hash_batches_in_order(app):
+    app.config['PASSWORD_HASH_WORKERS'] = 1
+    with app.app_context():
+        # Below and above the size that goes to the process pool
+        for count in (3, 10):
+            passwords = [f'secret{n}' for n in range(count)]
+            hashes = hash_passwords(passwords)
+            assert all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+
+
+def test_hashes_of_other_settings_need_rehash(app):
+    with app.app_context():
+        assert not needs_rehash(generate_password_hash('x', method=app.config['PASSWORD_HASH_METHOD']))
+        assert needs_rehash(generate_password_hash('x', method='pbkdf2:sha256:1000'))
+
+
+def test_login_upgrades_a_120_wide_schema_to_scrypt(app):
+    with app.app_context():
+        # The user table as databases from before migration 12 have it
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('CREATE TABLE old_user AS SELECT * FROM "user"')
+            connection.exec_driver_sql('DROP TABLE "user"')
+            create = str(CreateTable(User.__table__).compile(dialect=connection.dialect))
+            connection.exec_driver_sql(create.replace('password_hash VARCHAR(256)', 'password_hash VARCHAR(120)'))
+            connection.exec_driver_sql('INSERT INTO "user" SELECT * FROM old_user')
+            connection.exec_driver_sql('DROP TABLE old_user')
+            connection.execute(delete(schema_migrations).where(schema_migrations.c.version == 12))
+        assert upgrade(log=lambda message: None) == 1
+
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+    client = app.test_client()
+    response = client.post('/api/v1/login', json={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 200
+    with app.app_context():
+        password_hash = User.query.filter_by(username='admin').one().password_hash
+        assert password_hash.startswith('scrypt:') and len(password_hash) > 120
+        assert not needs_rehash(password_hash)
+    # And again with the new hash
+    assert app.test_client().post('/api/v1/login', json={'username': 'admin', 'password': 'admin123'}).status_code == 200
+    assert app.test_client().post('/api/v1/login', json={'username': 'admin', 'password': 'wrong'}).status_code == 401
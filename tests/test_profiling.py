@@ -0,0 +1,37 @@
+import pytest
+
+from instrumentation import QueryBudgetExceeded
+from conftest import login, active_student
+
+ADMIN_PAGES = ['/admin/dashboard', '/admin/students', '/admin/tasks', '/admin/attendance', '/admin/analytics',
+               '/admin/deadlines', '/admin/cohorts', '/admin/archive', '/admin/attendance/bulk',
+               '/api/v1/tasks', '/api/v1/attendance', '/api/v1/changes?since=0', '/api/v1/check-in']
+STUDENT_PAGES = ['/student/dashboard', '/student/tasks', '/student/attendance', '/api/v1/me',
+                 '/api/v1/check-in']
+
+
+def test_pages_stay_within_query_budgets(app):
+    admin, _ = login(app, 'admin')
+    student, _ = login(app, active_student(app))
+    for client, pages in ((admin, ADMIN_PAGES), (student, STUDENT_PAGES)):
+        for page in pages:
+            # A page over its budget raises QueryBudgetExceeded here
+            assert client.get(page).status_code == 200, page
+
+
+def test_every_page_has_a_budget(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    assert set(app.config['QUERY_BUDGETS']) <= endpoints
+
+
+def test_query_budget_breach_fails(app):
+    admin, _ = login(app, 'admin')
+    app.config['QUERY_BUDGETS']['main.admin_dashboard'] = 0
+    with pytest.raises(QueryBudgetExceeded):
+        admin.get('/admin/dashboard')
+
+
+def test_server_timing_header(app):
+    admin, _ = login(app, 'admin')
+    response = admin.get('/admin/tasks')
+    assert 'sql;dur=' in response.headers['Server-Timing']
@@ -0,0 +1,74 @@
+from datetime import date
+
+from sqlalchemy import insert, update
+
+import search
+from models import db, User, Task
+from search import search_students, search_tasks, search_terms, fts_enabled
+from conftest import login, admin_id, active_student
+
+
+def add_student(username, full_name):
+    student = User(username=username, email=f'{username}@example.com', full_name=full_name, role='student')
+    student.set_password('secret1')
+    db.session.add(student)
+    db.session.commit()
+    return student
+
+
+def found_students(q):
+    return [row.username for row in search_students(q, 50)]
+
+
+def test_search_terms():
+    assert search_terms('  Jo-Ann  O\'Neil_2 ') == ['jo', 'ann', 'o', 'neil', '2']
+    assert search_terms(' '.join(['word'] * 20)) == ['word'] * search.MAX_TERMS
+    assert search_terms(None) == []
+
+
+def test_words_match_as_prefixes(ctx):
+    assert fts_enabled()
+    add_student('zsmith', 'Zoë Smithers')
+    assert found_students('smi zo') == ['zsmith']
+    # Diacritics are folded, and every word has to match
+    assert found_students('zoe') == ['zsmith']
+    assert found_students('zoe jones') == []
+
+
+def test_triggers_follow_orm_and_core_writes(ctx):
+    student = add_student('qwright', 'Quentin Wright')
+    student.full_name = 'Quinn Wainwright'
+    db.session.commit()
+    assert found_students('quinn') == ['qwright'] and found_students('quentin') == []
+
+    db.session.execute(update(User).where(User.id == student.id).values(full_name='Quill Barnes'))
+    db.session.execute(insert(Task).values(title='Xylophone practice', due_date=date(2030, 1, 7), status='pending',
+                                           priority='low', student_id=student.id, created_by=admin_id()))
+    db.session.commit()
+    assert found_students('barn') == ['qwright']
+    assert [row.title for row in search_tasks('xylo', 10)] == ['Xylophone practice']
+
+    db.session.delete(Task.query.filter_by(title='Xylophone practice').one())
+    db.session.commit()
+    assert search_tasks('xylo', 10) == []
+
+
+def test_like_fallback_finds_the_same_rows(ctx, monkeypatch):
+    add_student('vlopez', 'Valeria Lopez')
+    with_index = found_students('lop val')
+    monkeypatch.setattr(search, 'fts_enabled', lambda: False)
+    assert found_students('lop val') == with_index == ['vlopez']
+
+
+def test_search_api(app):
+    with app.app_context():
+        add_student('ynakamura', 'Yui Nakamura')
+    admin, _ = login(app, 'admin')
+    response = admin.get('/api/v1/search/students', query_string={'q': 'naka', 'limit': 5})
+    assert [row['username'] for row in response.get_json()['data']] == ['ynakamura']
+
+    student, student_id = login(app, active_student(app))
+    assert student.get('/api/v1/search/students', query_string={'q': 'naka'}).status_code == 403
+    # Students only find their own tasks, whatever student_id they ask for
+    tasks = student.get('/api/v1/search/tasks', query_string={'student_id': 0}).get_json()['data']
+    assert tasks and {task['student_id'] for task in tasks} == {student_id}
@@ -0,0 +1,58 @@
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import event, select, func
+
+from models import db, User, Cohort, Task, Attendance
+from stats import admin_dashboard_stats, student_dashboard_stats, attendance_status_counts
+from conftest import student_ids
+
+
+def queries_during(func, *args):
+    statements = []
+
+    def record(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        result = func(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return result, len(statements)
+
+
+def test_admin_counters_in_one_query(ctx):
+    today = db.session.scalar(select(func.max(Attendance.date)))
+    for cohort_id in (None, db.session.scalar(select(Cohort.id))):
+        stats, queries = queries_during(admin_dashboard_stats, today, cohort_id)
+        assert queries == 1
+        tasks = Task.query if cohort_id is None else Task.query.filter_by(cohort_id=cohort_id)
+        records = Attendance.query.filter_by(date=today)
+        students = User.query.filter_by(role='student', is_active=True)
+        if cohort_id is not None:
+            records, students = records.filter_by(cohort_id=cohort_id), students.filter_by(cohort_id=cohort_id)
+        statuses = Counter(record.status for record in records)
+        assert stats['total_students'] == students.count()
+        assert stats['total_tasks'] == tasks.count()
+        assert stats['completed_tasks'] == tasks.filter_by(status='completed').count()
+        assert (stats['present_days'], stats['absent_days'], stats['late_days']) == (
+            statuses['present'], statuses['absent'], statuses['late'])
+
+
+def test_student_counters(ctx):
+    student_id = student_ids(1)[0]
+    month = db.session.scalar(select(func.max(Attendance.date))).replace(day=1)
+    stats = student_dashboard_stats(student_id, month)
+    records = Attendance.query.filter(Attendance.student_id == student_id, Attendance.date >= month).all()
+    assert stats['total_days'] == len(records)
+    assert stats['present_days'] == sum(record.status == 'present' for record in records)
+    assert stats['total_tasks'] == Task.query.filter_by(student_id=student_id).count()
+    # No records in a month gives a rate of 0, not a division error
+    assert student_dashboard_stats(student_id, date(1999, 1, 1))['attendance_rate'] == 0
+
+
+def test_status_counts_leave_out_zeros(ctx):
+    assert attendance_status_counts(date(1999, 1, 1), date(1999, 12, 31)) == {}
+    counts = attendance_status_counts()
+    assert counts == dict(Counter(status for status, in db.session.execute(select(Attendance.status))))
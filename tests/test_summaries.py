@@ -0,0 +1,49 @@
+from datetime import date, timedelta
+
+from models import db, Attendance
+from summaries import rebuild_attendance_summaries, week_start, month_start
+from conftest import admin_id, student_ids, expected_rollups, stored_rollups
+
+
+def test_period_starts():
+    assert week_start(date(2030, 1, 13)) == date(2030, 1, 7)
+    assert week_start(date(2030, 1, 7)) == date(2030, 1, 7)
+    assert month_start(date(2030, 1, 31)) == date(2030, 1, 1)
+
+
+def test_generated_data_matches_rollups(ctx):
+    assert stored_rollups() == expected_rollups()
+
+
+def test_rollups_follow_orm_writes(ctx):
+    first, second, third = student_ids(3)
+    day = date(2030, 1, 7)
+
+    record = Attendance(date=day, student_id=first, status='present', marked_by=admin_id())
+    db.session.add(record)
+    db.session.commit()
+    assert stored_rollups() == expected_rollups()
+
+    # Each commit expires the record, so these change expired attributes
+    record.status = 'late'
+    db.session.commit()
+    record.date = day + timedelta(days=40)
+    db.session.commit()
+    assert stored_rollups() == expected_rollups()
+
+    existing = Attendance.query.filter(Attendance.date < day).order_by(Attendance.id).first()
+    db.session.commit()
+    existing.student_id = second if existing.student_id != second else third
+    existing.date = day - timedelta(days=1)
+    db.session.commit()
+    assert stored_rollups() == expected_rollups()
+
+    db.session.delete(record)
+    db.session.commit()
+    assert stored_rollups() == expected_rollups()
+
+
+def test_rebuild_matches_maintained_rollups(ctx):
+    maintained = stored_rollups()
+    rebuild_attendance_summaries()
+    assert stored_rollups() == maintained